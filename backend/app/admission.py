@@ -0,0 +1,205 @@
+# app/admission.py
+"""
+Admission control and load shedding for expensive routes (POST /search).
+
+AdmissionLimiter caps how many requests run at once (`max_concurrent`) and how
+many may wait for a slot (`max_queue`, each for at most `queue_timeout` seconds).
+Anything beyond that is rejected immediately with Overloaded, which the route turns
+into a 503 + Retry-After instead of letting it pile up on Postgres.
+
+    try:
+        await SEARCH_LIMITER.acquire()
+    except Overloaded as e:
+        ...  # serve something cheap, or 503 with Retry-After: e.retry_after
+    try:
+        ...
+    finally:
+        SEARCH_LIMITER.release()
+
+Waiters are plain futures on the caller's event loop, woken FIFO with
+call_soon_threadsafe, so one limiter works across loops and threads.
+
+CancelScope lets the event loop cancel a query running in a worker thread
+(client disconnected): the thread attaches its psycopg connection, the loop
+calls cancel(), which sends a cancel request to the server.
+
+TTLCache is a small LRU with expiry, used to serve the last good answer in
+degraded mode.
+
+Counters: app_admission_total{limiter, outcome=admitted|queued|shed|timeout}
+Gauges:   app_admission_active{limiter}, app_admission_waiting{limiter}
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Hashable, Optional, Tuple
+
+from .metrics import ADMISSION, ADMISSION_ACTIVE, ADMISSION_WAITING, record_cache
+
+
+class Overloaded(Exception):
+    """No slot and no room (or no time left) in the wait queue."""
+
+    def __init__(self, limiter: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{limiter} overloaded ({reason})")
+        self.limiter = limiter
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def _wake(fut: "asyncio.Future") -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class AdmissionLimiter:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 retry_after: float = 1.0) -> None:
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be >= 1")
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future"]] = deque()
+        self._lock = threading.Lock()
+
+    def _publish(self) -> None:
+        # caller holds self._lock
+        ADMISSION_ACTIVE.set(self._active, limiter=self.name)
+        ADMISSION_WAITING.set(len(self._waiters), limiter=self.name)
+
+    def _shed(self, reason: str) -> Overloaded:
+        ADMISSION.inc(limiter=self.name, outcome=reason)
+        return Overloaded(self.name, reason, self.retry_after)
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the bounded queue if needed. Raises Overloaded."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiters:
+                self._active += 1
+                self._publish()
+                ADMISSION.inc(limiter=self.name, outcome="admitted")
+                return
+            if len(self._waiters) >= self.max_queue:
+                raise self._shed("shed")
+            entry = (loop, loop.create_future())
+            self._waiters.append(entry)
+            self._publish()
+        ADMISSION.inc(limiter=self.name, outcome="queued")
+
+        try:
+            await asyncio.wait_for(entry[1], timeout=self.queue_timeout)
+        except BaseException as e:  # timeout or the request task was cancelled
+            with self._lock:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    self._publish()
+                    handed = False
+                else:
+                    handed = True  # release() gave us the slot just as we gave up
+            if handed:
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed("timeout") from None
+            raise
+
+    def release(self) -> None:
+        """Give the slot to the oldest waiter, or free it."""
+        with self._lock:
+            if self._waiters:
+                loop, fut = self._waiters.popleft()  # slot changes hands; _active unchanged
+                loop.call_soon_threadsafe(_wake, fut)
+            else:
+                self._active -= 1
+            self._publish()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "queue_timeout_s": self.queue_timeout,
+                "shed": int(ADMISSION.value(limiter=self.name, outcome="shed")),
+                "timeouts": int(ADMISSION.value(limiter=self.name, outcome="timeout")),
+            }
+
+
+class CancelScope:
+    """Cross-thread cancellation of the query a worker thread is running."""
+
+    def __init__(self) -> None:
+        self.cancelled = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn) -> bool:
+        """Register the connection about to run the query. False if already cancelled."""
+        with self._lock:
+            self._conn = conn
+            return not self.cancelled
+
+    def detach(self) -> None:
+        with self._lock:
+            self._conn = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            conn = self._conn
+        if conn is not None:
+            try:
+                conn.cancel()
+            except Exception:
+                pass  # connection already closed / query already finished
+
+
+class TTLCache:
+    """Thread-safe LRU whose entries expire after `ttl` seconds."""
+
+    def __init__(self, name: str, max_items: int, ttl: float) -> None:
+        self.name = name
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, age_seconds) or None."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item[0] > self.ttl:
+                del self._items[key]
+                item = None
+            if item is not None:
+                self._items.move_to_end(key)
+        record_cache(self.name, item is not None)
+        return None if item is None else (item[1], now - item[0])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,257 @@
+# app/chunk_export.py
+"""
+Streaming chunk export for /admin/documents/{id}/export-chunks.
+
+Rows come from a server-side (named) cursor in batches of `batch_size`, ordered by
+the unique key (section_path, chunk_index) with NULL sections as '', so memory stays
+flat however big the manual is. Formats:
+
+  files   -> storage/chunks/doc_<id>/<NNNN>__<safe_section>__ci_<k>.txt + chunks.json
+             (the original layout; each batch is written by a thread pool of `workers`)
+  jsonl   -> storage/chunks/doc_<id>/chunks.jsonl.gz, one JSON object per chunk.
+             Every batch is its own gzip member, so the file is valid after each batch.
+  parquet -> storage/chunks/doc_<id>/chunks.parquet, one row group per batch (needs pyarrow)
+
+Resume (files, jsonl): after every batch a checkpoint (export.checkpoint.json) records
+the last exported key, row count and, for jsonl, the committed file size. resume=True
+truncates anything written after the checkpoint and continues after that key.
+Parquet is written to a .tmp file and renamed when complete, so it always restarts.
+"""
+import gzip
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from psycopg.rows import dict_row
+
+FORMATS = ("files", "jsonl", "parquet")
+CHECKPOINT_NAME = "export.checkpoint.json"
+
+_COLUMNS = "id, document_id, section_path, level, start_page, end_page, chunk_index, content, created_at"
+# Keyset on COALESCE(section_path, ''): a row comparison with a NULL section_path is
+# NULL, so resuming after (or past) a chunk without a section would skip rows.
+_SQL_FIRST = f"""
+    SELECT {_COLUMNS}
+    FROM document_chunks
+    WHERE document_id = %s
+    ORDER BY COALESCE(section_path, '') ASC, chunk_index ASC
+"""
+_SQL_AFTER = f"""
+    SELECT {_COLUMNS}
+    FROM document_chunks
+    WHERE document_id = %s AND (COALESCE(section_path, ''), chunk_index) > (%s, %s)
+    ORDER BY COALESCE(section_path, '') ASC, chunk_index ASC
+"""
+
+
+def iter_chunk_batches(conn, doc_id: int, batch_size: int,
+                       after: Optional[Tuple[str, int]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of chunk rows (dicts) from a named cursor, resuming after `after` if given."""
+    with conn.cursor(name=f"export_chunks_{doc_id}", row_factory=dict_row) as cur:
+        cur.itersize = batch_size
+        if after is None:
+            cur.execute(_SQL_FIRST, (doc_id,))
+        else:
+            cur.execute(_SQL_AFTER, (doc_id, after[0] or "", after[1]))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+
+# -----------------------------
+# Checkpoint
+# -----------------------------
+class Checkpoint:
+    def __init__(self, out_dir: Path) -> None:
+        self.path = out_dir / CHECKPOINT_NAME
+
+    def load(self, fmt: str) -> Optional[Dict[str, Any]]:
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return state if state.get("format") == fmt else None
+
+    def save(self, **state) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, default=str), encoding="utf-8")
+        os.replace(tmp, self.path)  # atomic: a crash leaves the old or the new checkpoint
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def _key(row: Dict[str, Any]) -> List[Any]:
+    """Checkpoint key, as the export query orders it (NULL section_path -> '')."""
+    return [row["section_path"] or "", int(row["chunk_index"])]
+
+
+def _safe(name: str) -> str:
+    return "".join(c if (c.isalnum() or c in "-_.") else "_" for c in name)
+
+
+def _record(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "chunk_id": int(row["id"]),
+        "document_id": int(row["document_id"]),
+        "section_path": row["section_path"],
+        "level": int(row["level"]),
+        "start_page": int(row["start_page"]),
+        "end_page": int(row["end_page"]),
+        "chunk_index": int(row["chunk_index"]),
+        "content": row["content"] or "",
+        "created_at": row["created_at"].isoformat() if row.get("created_at") else None,
+    }
+
+
+# -----------------------------
+# Writers
+# -----------------------------
+def _export_jsonl(batches: Callable, out_dir: Path, ckpt: Checkpoint, state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    path = out_dir / "chunks.jsonl.gz"
+    rows = 0
+    after = None
+    if state and path.exists():
+        f = open(path, "r+b")
+        f.truncate(int(state["bytes"]))  # drop a half-written member from a crashed run
+        f.seek(0, os.SEEK_END)
+        rows, after = int(state["rows"]), tuple(state["last_key"])
+    else:
+        f = open(path, "wb")
+    resumed_from = rows
+    with f:
+        for batch in batches(after):
+            data = "".join(json.dumps(_record(r), ensure_ascii=False) + "\n" for r in batch)
+            f.write(gzip.compress(data.encode("utf-8"), compresslevel=6))
+            f.flush()
+            os.fsync(f.fileno())
+            rows += len(batch)
+            ckpt.save(format="jsonl", rows=rows, last_key=_key(batch[-1]), bytes=f.tell())
+    return {"path": str(path), "rows": rows, "resumed_from": resumed_from, "bytes": path.stat().st_size}
+
+
+def _export_parquet(batches: Callable, out_dir: Path) -> Dict[str, Any]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("format=parquet needs pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("chunk_id", pa.int64()), ("document_id", pa.int64()), ("section_path", pa.string()),
+        ("level", pa.int32()), ("start_page", pa.int32()), ("end_page", pa.int32()),
+        ("chunk_index", pa.int32()), ("content", pa.string()), ("created_at", pa.string()),
+    ])
+    path = out_dir / "chunks.parquet"
+    tmp = out_dir / "chunks.parquet.tmp"
+    rows = 0
+    writer = pq.ParquetWriter(str(tmp), schema, compression="zstd")
+    try:
+        for batch in batches(None):
+            writer.write_table(pa.Table.from_pylist([_record(r) for r in batch], schema=schema))
+            rows += len(batch)
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+    return {"path": str(path), "rows": rows, "resumed_from": 0, "bytes": path.stat().st_size}
+
+
+def _write_chunk_file(job: Tuple[Path, str]) -> None:
+    fpath, text = job
+    fpath.write_text(text, encoding="utf-8")
+
+
+def _export_files(batches: Callable, out_dir: Path, ckpt: Checkpoint, state: Optional[Dict[str, Any]],
+                  workers: int) -> Dict[str, Any]:
+    partial_index = out_dir / "chunks.index.jsonl"  # index entries so far; folded into chunks.json at the end
+    rows = 0
+    after = None
+    if state and partial_index.exists():
+        rows, after = int(state["rows"]), tuple(state["last_key"])
+        with open(partial_index, "r+b") as f:
+            f.truncate(int(state["index_bytes"]))
+    else:
+        partial_index.write_bytes(b"")
+    resumed_from = rows
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex, open(partial_index, "ab") as idx:
+        for batch in batches(after):
+            jobs = []
+            entries = []
+            for r in batch:
+                rows += 1
+                sec = r["section_path"] or "section"
+                ci = int(r["chunk_index"])
+                txt = r["content"] or ""
+                fpath = out_dir / f"{rows:04d}__{_safe(sec)[:80] or 'section'}__ci_{ci}.txt"
+                header = (
+                    f"--- chunk_id: {int(r['id'])}\n"
+                    f"--- section_path: {sec}\n"
+                    f"--- level: {int(r['level'])}\n"
+                    f"--- pages: {int(r['start_page'])}-{int(r['end_page'])}\n"
+                    f"--- chunk_index: {ci}\n"
+                    f"---\n\n"
+                )
+                jobs.append((fpath, header + txt))
+                entries.append({
+                    "file": str(fpath),
+                    "chunk_id": int(r["id"]),
+                    "section_path": sec,
+                    "level": int(r["level"]),
+                    "start_page": int(r["start_page"]),
+                    "end_page": int(r["end_page"]),
+                    "chunk_index": ci,
+                    "chars": len(txt),
+                })
+            list(ex.map(_write_chunk_file, jobs))  # whole batch on disk before the checkpoint moves
+            idx.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8"))
+            idx.flush()
+            ckpt.save(format="files", rows=rows, last_key=_key(batch[-1]), index_bytes=idx.tell())
+
+    index_json = out_dir / "chunks.json"
+    with open(partial_index, encoding="utf-8") as f:
+        index = [json.loads(line) for line in f if line.strip()]
+    index_json.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+    partial_index.unlink()
+    return {"files_written": rows, "rows": rows, "resumed_from": resumed_from, "index_json": str(index_json)}
+
+
+def export_chunks(get_conn: Callable, doc_id: int, out_dir: Path, fmt: str = "files", batch_size: int = 1000,
+                  workers: int = 1, resume: bool = False) -> Dict[str, Any]:
+    """
+    Stream every chunk of `doc_id` into out_dir in the given format.
+    Raises ValueError for an unknown format / missing optional dependency.
+    Returns {"rows", "resumed_from", ...}; rows == 0 means the document has no chunks.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r} (expected one of: {', '.join(FORMATS)})")
+    if batch_size < 1:
+        raise ValueError("batch_size must be >= 1")
+
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM document_chunks WHERE document_id = %s LIMIT 1", (doc_id,))
+            if cur.fetchone() is None:
+                return {"format": fmt, "dir": str(out_dir), "rows": 0, "resumed_from": 0}
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        ckpt = Checkpoint(out_dir)
+        state = ckpt.load(fmt) if resume else None
+        if not resume:
+            ckpt.clear()
+
+        def batches(after):
+            return iter_chunk_batches(conn, doc_id, batch_size, after)
+
+        if fmt == "jsonl":
+            out = _export_jsonl(batches, out_dir, ckpt, state)
+        elif fmt == "parquet":
+            out = _export_parquet(batches, out_dir)
+        else:
+            out = _export_files(batches, out_dir, ckpt, state, workers)
+    ckpt.clear()
+    return {"format": fmt, "dir": str(out_dir), **out}
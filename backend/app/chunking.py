@@ -0,0 +1,410 @@
+# app/chunking.py
+"""
+Section text assembly + chunking strategies for /chunk-toc.
+
+/chunk-toc uses iter_sections_streaming() + PageWindow: pages are read once, in
+order, and only the pages still needed by sections that have not been chunked yet
+are kept (bounded memory for very large manuals). The window keeps them in one
+text buffer with page offsets too, so a section is a single read, not a join.
+
+PageBuffer is the in-memory variant for when all pages are at hand (tools/tests):
+it concatenates all page texts ONCE (joined by blank lines, like the original
+per-section "\\n\\n".join) and remembers where every page starts/ends, so the
+text of any page range is a single slice of that buffer.
+
+Chunk strategies (ChunkStrategy protocol, picked by get_chunker / CHUNK_STRATEGY),
+fed with chunk_section(pages, start, end) from a PageBuffer or PageWindow:
+  paragraph -> the original splitter: max_chars, paragraph boundaries, no overlap;
+               takes the section as one slice (pages.section)
+  token     -> token-budgeted, sentence-aware, with overlap; consumes the section
+               page by page and yields chunks as they fill, so a huge section is
+               never held as one string
+Token counts use tiktoken (CHUNK_TOKENIZER, default cl100k_base) when installed,
+otherwise a word/punctuation regex approximation.
+"""
+import heapq
+import io
+import os
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Tuple
+
+PAGE_SEP = "\n\n"
+
+
+class PageBuffer:
+    """
+    page_map: {page_number: text}. Missing page numbers are simply skipped,
+    exactly like `[page_map[p] for p in range(a, b + 1) if p in page_map]`.
+    """
+
+    def __init__(self, page_map: Dict[int, str]) -> None:
+        self._pages: List[int] = sorted(page_map)
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        pos = 0
+        sep = len(PAGE_SEP)
+        for k, p in enumerate(self._pages):
+            if k:
+                pos += sep
+            self._starts.append(pos)
+            pos += len(page_map[p])
+            self._ends.append(pos)
+        self.text = PAGE_SEP.join(page_map[p] for p in self._pages)
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def span(self, start_page: int, end_page: int) -> tuple:
+        """(offset_from, offset_to) of pages start_page..end_page inclusive; (0, 0) if none."""
+        lo = bisect_left(self._pages, start_page)
+        hi = bisect_right(self._pages, end_page) - 1
+        if hi < lo:
+            return (0, 0)
+        return (self._starts[lo], self._ends[hi])
+
+    def section(self, start_page: int, end_page: int) -> str:
+        """Text of pages start_page..end_page (inclusive) as one slice."""
+        a, b = self.span(start_page, end_page)
+        return self.text[a:b]
+
+    def iter_section(self, start_page: int, end_page: int) -> Iterator[str]:
+        """Pages start_page..end_page one at a time (slices, no joined copy)."""
+        lo = bisect_left(self._pages, start_page)
+        hi = bisect_right(self._pages, end_page)
+        for k in range(lo, hi):
+            yield self.text[self._starts[k]:self._ends[k]]
+
+
+class PageWindow:
+    """
+    Sliding window of page texts for streaming section assembly: pages are added
+    in ascending order and dropped once no pending section needs them.
+
+    Same layout as PageBuffer, but growable: the retained pages are appended to one
+    io.StringIO (joined by blank lines) with per-page offsets, so section() is a
+    single read of a range. Evicted pages leave a dead prefix that is compacted away
+    once it outgrows the live text. (StringIO holds 4 bytes per char once read.)
+    """
+
+    def __init__(self) -> None:
+        self._reset()
+        self.peak_pages = 0
+
+    def _reset(self) -> None:
+        self._buf = io.StringIO(newline="")
+        self._size = 0
+        self._pages: List[int] = []
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._head = 0  # index of the first retained page
+
+    def __len__(self) -> int:
+        return len(self._pages) - self._head
+
+    def add(self, page: int, text: str) -> None:
+        self._buf.seek(self._size)
+        if len(self):
+            self._size += self._buf.write(PAGE_SEP)
+        self._pages.append(page)
+        self._starts.append(self._size)
+        self._size += self._buf.write(text)
+        self._ends.append(self._size)
+        if len(self) > self.peak_pages:
+            self.peak_pages = len(self)
+
+    def evict_below(self, page: int) -> None:
+        while self._head < len(self._pages) and self._pages[self._head] < page:
+            self._head += 1
+        if not len(self):
+            if self._pages:
+                self._reset()
+            return
+        base = self._starts[self._head]
+        if base > self._size - base or 2 * self._head > len(self._pages):
+            self._compact(base)
+
+    def _compact(self, base: int) -> None:
+        self._buf.seek(base)
+        live = self._buf.read(self._size - base)
+        h = self._head
+        self._buf = io.StringIO(live, newline="")
+        self._size = len(live)
+        self._pages = self._pages[h:]
+        self._starts = [x - base for x in self._starts[h:]]
+        self._ends = [x - base for x in self._ends[h:]]
+        self._head = 0
+
+    def _read(self, a: int, b: int) -> str:
+        self._buf.seek(a)
+        return self._buf.read(b - a)
+
+    def section(self, start_page: int, end_page: int) -> str:
+        """Text of retained pages start_page..end_page (inclusive) as one read."""
+        lo = bisect_left(self._pages, start_page, self._head)
+        hi = bisect_right(self._pages, end_page, self._head) - 1
+        if hi < lo:
+            return ""
+        return self._read(self._starts[lo], self._ends[hi])
+
+    def iter_section(self, start_page: int, end_page: int) -> Iterator[str]:
+        lo = bisect_left(self._pages, start_page, self._head)
+        hi = bisect_right(self._pages, end_page, self._head)
+        for k in range(lo, hi):
+            yield self._read(self._starts[k], self._ends[k])
+
+
+def iter_sections_streaming(ranges: Sequence[Any], pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[Any, PageWindow]]:
+    """
+    Pair every TOC range (anything with .start/.end) with a PageWindow that holds its
+    pages, reading `pages` ((page_number, text), ascending) only once.
+
+    A range is yielded as soon as a page past its end arrives (or the stream ends);
+    the window then only keeps pages from the lowest start among ranges still
+    pending. Peak memory is bounded by the widest pending range, not the document.
+    Ranges come out ordered by end page; consume each before advancing.
+    """
+    order = sorted(range(len(ranges)), key=lambda i: (ranges[i].end, i))
+    starts = [(r.start, i) for i, r in enumerate(ranges)]
+    heapq.heapify(starts)
+    done = [False] * len(ranges)
+    window = PageWindow()
+    k = 0
+    for page, text in pages:
+        while k < len(order) and ranges[order[k]].end < page:
+            i = order[k]
+            yield ranges[i], window
+            done[i] = True
+            k += 1
+        while starts and done[starts[0][1]]:
+            heapq.heappop(starts)
+        if not starts:
+            break  # every range emitted; the remaining pages are not needed
+        low = starts[0][0]
+        window.evict_below(low)
+        if page >= low:
+            window.add(page, text)
+    while k < len(order):
+        yield ranges[order[k]], window
+        k += 1
+
+
+# -----------------------------
+# Tokenizers
+# -----------------------------
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class RegexTokenizer:
+    """Fallback when tiktoken is missing: one token per word or punctuation mark."""
+    name = "regex"
+
+    def count(self, text: str) -> int:
+        return len(_WORD_RE.findall(text))
+
+
+class TiktokenTokenizer:
+    def __init__(self, encoding) -> None:
+        self._enc = encoding
+        self.name = f"tiktoken:{encoding.name}"
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(encoding: Optional[str] = None):
+    """tiktoken encoding if available (and loadable), else RegexTokenizer."""
+    try:
+        import tiktoken
+        return TiktokenTokenizer(tiktoken.get_encoding(encoding or os.getenv("CHUNK_TOKENIZER", "cl100k_base")))
+    except Exception:
+        return RegexTokenizer()
+
+
+# -----------------------------
+# Strategies
+# -----------------------------
+class ChunkStrategy(Protocol):
+    """Turns the pages of one section into chunk texts."""
+    name: str
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        ...
+
+    def chunk_section(self, pages: Any, start_page: int, end_page: int) -> Iterator[str]:
+        """Chunks of pages start_page..end_page of a PageBuffer / PageWindow."""
+        ...
+
+
+def split_by_paragraphs(text: str, max_chars: int) -> List[str]:
+    """
+    Split long text into chunks not exceeding max_chars, preferring paragraph
+    boundaries (double newlines). No overlap by default.
+    """
+    if len(text) <= max_chars:
+        return [text] if text else []
+    paras = [p.strip() for p in text.split("\n\n") if p.strip()]
+    chunks: List[str] = []
+    buf = ""
+    for p in paras:
+        if len(p) > max_chars:
+            if buf:
+                chunks.append(buf.strip())
+                buf = ""
+            for i in range(0, len(p), max_chars):
+                chunks.append(p[i:i+max_chars].strip())
+            continue
+        if len(buf) + (2 if buf else 0) + len(p) <= max_chars:
+            buf = f"{buf}\n\n{p}" if buf else p
+        else:
+            chunks.append(buf.strip())
+            buf = p
+    if buf:
+        chunks.append(buf.strip())
+    return chunks
+
+
+class ParagraphChunker:
+    """The original /chunk-toc behaviour (works on the whole section text)."""
+    name = "paragraph"
+
+    def __init__(self, max_chars: int = 2000) -> None:
+        self.max_chars = max_chars
+
+    def chunk_text(self, text: str) -> Iterator[str]:
+        text = text.strip()
+        if text:
+            yield from split_by_paragraphs(text, max_chars=self.max_chars)
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        return self.chunk_text(PAGE_SEP.join(segments))
+
+    def chunk_section(self, pages: Any, start_page: int, end_page: int) -> Iterator[str]:
+        return self.chunk_text(pages.section(start_page, end_page))
+
+
+_PARA_RE = re.compile(r"\n\s*\n")
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class TokenChunker:
+    """
+    Packs whole sentences into chunks of at most max_tokens, repeating the last
+    ~overlap_tokens worth of sentences at the start of the next chunk.
+    A sentence longer than the budget is cut on word boundaries (never mid-word).
+    Paragraph breaks are kept as blank lines inside a chunk; each segment (page)
+    starts a new paragraph, same as the blank-line page join.
+    """
+    name = "token"
+
+    def __init__(self, max_tokens: int = 400, overlap_tokens: int = 50, tokenizer=None) -> None:
+        if max_tokens < 1:
+            raise ValueError("max_tokens must be >= 1")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be >= 0 and < max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def _split_long(self, sentence: str) -> Iterator[Tuple[str, int]]:
+        count = self.tokenizer.count
+        words: List[str] = []
+        n = 0
+        for w in sentence.split():
+            k = count(w) + (1 if words else 0)  # rough cost of the joining space
+            if words and n + k > self.max_tokens:
+                piece = " ".join(words)
+                yield piece, count(piece)
+                words, n = [], 0
+                k = count(w)
+            words.append(w)
+            n += k
+        if words:
+            piece = " ".join(words)
+            yield piece, count(piece)
+
+    def _iter_units(self, segments: Iterable[str]) -> Iterator[Tuple[str, int, bool]]:
+        """(sentence, tokens, starts_paragraph) for every sentence of every segment."""
+        count = self.tokenizer.count
+        for seg in segments:
+            for para in _PARA_RE.split(seg):
+                first = True
+                for sent in _SENT_RE.split(para.strip()):
+                    sent = sent.strip()
+                    if not sent:
+                        continue
+                    n = count(sent)
+                    if n <= self.max_tokens:
+                        yield sent, n, first
+                        first = False
+                        continue
+                    for piece, k in self._split_long(sent):
+                        yield piece, k, first
+                        first = False
+
+    @staticmethod
+    def _render(units: List[Tuple[str, int, bool]]) -> str:
+        out: List[str] = []
+        for i, (text, _, para) in enumerate(units):
+            if i:
+                out.append(PAGE_SEP if para else " ")
+            out.append(text)
+        return "".join(out)
+
+    def chunk_section(self, pages: Any, start_page: int, end_page: int) -> Iterator[str]:
+        return self.iter_chunks(pages.iter_section(start_page, end_page))
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[str]:
+        cur: List[Tuple[str, int, bool]] = []
+        cur_tokens = 0
+        for unit in self._iter_units(segments):
+            n = unit[1]
+            if cur and cur_tokens + n > self.max_tokens:
+                yield self._render(cur)
+                # carry trailing sentences as overlap, as long as the next one still fits
+                keep = 0
+                kept = 0
+                for _, k, _ in reversed(cur):
+                    if kept + k > self.overlap_tokens or kept + k + n > self.max_tokens:
+                        break
+                    kept += k
+                    keep += 1
+                cur = cur[len(cur) - keep:] if keep else []
+                cur_tokens = kept
+            cur.append(unit)
+            cur_tokens += n
+        if cur:
+            yield self._render(cur)
+
+
+# -----------------------------
+# Registry
+# -----------------------------
+STRATEGIES: Dict[str, Callable[..., ChunkStrategy]] = {
+    "paragraph": lambda max_chars, max_tokens, overlap_tokens: ParagraphChunker(max_chars=max_chars),
+    "token": lambda max_chars, max_tokens, overlap_tokens: TokenChunker(max_tokens, overlap_tokens),
+}
+
+
+def get_chunker(name: Optional[str] = None, max_chars: int = 2000, max_tokens: Optional[int] = None,
+                overlap_tokens: Optional[int] = None) -> ChunkStrategy:
+    """
+    Select a strategy by name, or by CHUNK_STRATEGY env (default 'paragraph').
+    Token defaults: CHUNK_MAX_TOKENS (400), CHUNK_OVERLAP_TOKENS (50).
+    Raises ValueError for unknown names / bad sizes.
+    """
+    key = (name or os.getenv("CHUNK_STRATEGY") or "paragraph").lower()
+    factory = STRATEGIES.get(key)
+    if factory is None:
+        raise ValueError(f"Unknown chunk strategy {key!r} (expected one of: {', '.join(sorted(STRATEGIES))})")
+    if max_tokens is None:
+        max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+    if overlap_tokens is None:
+        overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+    return factory(max_chars, max_tokens, overlap_tokens)
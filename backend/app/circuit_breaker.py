@@ -0,0 +1,152 @@
+# app/circuit_breaker.py
+"""
+Circuit breaker for flaky dependencies (the query embedder).
+
+Every call through breaker.call(fn, ...) is recorded in a rolling window of the
+last `window` outcomes. A call counts as a failure if it raises OR takes longer
+than `slow_call_s`. States:
+
+  closed     calls go through; once the window holds >= min_calls outcomes and the
+             failure share reaches failure_rate, the breaker opens
+  open       calls fail fast with CircuitOpen (nothing is sent) for open_for_s
+  half_open  after open_for_s one probe call is let through: success closes the
+             breaker (window reset), failure re-opens it for another open_for_s
+
+Callers catch CircuitOpen (and the dependency's own errors) and degrade, e.g.
+/search answers from the full-text path. Exceptions listed in `ignore` (e.g.
+deadline.Cancelled / DeadlineExceeded: the caller gave up or its budget ran out,
+the dependency did nothing wrong) are passed through without being recorded,
+unless the call had already run longer than `slow_call_s` (then it counts as
+slow: a short client deadline alone can never open the breaker).
+
+Gauge:   app_circuit_state{breaker} (0 closed, 1 half_open, 2 open)
+Counter: app_circuit_calls_total{breaker, outcome=success|error|slow|rejected}
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Tuple, Type
+
+from .metrics import CIRCUIT_CALLS, CIRCUIT_STATE
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the dependency while the breaker is open."""
+
+    def __init__(self, breaker: str, retry_in: float) -> None:
+        super().__init__(f"circuit {breaker} is open (retry in {retry_in:.1f}s)")
+        self.breaker = breaker
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_s: float = 1.0, open_for_s: float = 10.0,
+                 ignore: Tuple[Type[BaseException], ...] = (),
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.name = name
+        self.window = max(1, window)
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.open_for_s = open_for_s
+        self.ignore = ignore
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=self.window)  # True = failure
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, breaker=name)
+
+    def _set_state(self, state: str) -> None:
+        # caller holds self._lock
+        self._state = state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state != HALF_OPEN:
+            self._probing = False
+        if state == CLOSED:
+            self._outcomes.clear()
+        CIRCUIT_STATE.set(_STATE_VALUE[state], breaker=self.name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.open_for_s:
+                self._set_state(HALF_OPEN)
+            return self._state
+
+    def _admit(self) -> bool:
+        """True if this call is the half-open probe."""
+        with self._lock:
+            if self._state == OPEN:
+                waited = self._clock() - self._opened_at
+                if waited < self.open_for_s:
+                    CIRCUIT_CALLS.inc(breaker=self.name, outcome="rejected")
+                    raise CircuitOpen(self.name, self.open_for_s - waited)
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    CIRCUIT_CALLS.inc(breaker=self.name, outcome="rejected")
+                    raise CircuitOpen(self.name, 0.0)
+                self._probing = True
+                return True
+            return False
+
+    def record(self, failed: bool, probe: bool = False) -> None:
+        with self._lock:
+            if probe or self._state == HALF_OPEN:
+                self._set_state(OPEN if failed else CLOSED)
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append(failed)
+            n = len(self._outcomes)
+            if n >= self.min_calls and sum(self._outcomes) / n >= self.failure_rate:
+                self._set_state(OPEN)
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn through the breaker. Raises CircuitOpen or whatever fn raises."""
+        probe = self._admit()
+        t0 = self._clock()
+        try:
+            result = fn(*args, **kwargs)
+        except self.ignore:
+            if self._clock() - t0 > self.slow_call_s:
+                CIRCUIT_CALLS.inc(breaker=self.name, outcome="slow")
+                self.record(True, probe)
+            elif probe:
+                with self._lock:
+                    self._probing = False  # let the next call probe instead
+            raise
+        except BaseException:
+            CIRCUIT_CALLS.inc(breaker=self.name, outcome="error")
+            self.record(True, probe)
+            raise
+        slow = self._clock() - t0 > self.slow_call_s
+        CIRCUIT_CALLS.inc(breaker=self.name, outcome="slow" if slow else "success")
+        self.record(slow, probe)
+        return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._set_state(CLOSED)
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            n = len(self._outcomes)
+            return {
+                "state": state,
+                "window_calls": n,
+                "window_failure_rate": round(sum(self._outcomes) / n, 3) if n else 0.0,
+                "failure_rate": self.failure_rate,
+                "slow_call_ms": round(self.slow_call_s * 1000.0, 1),
+                "open_for_s": self.open_for_s,
+                **{o: int(CIRCUIT_CALLS.value(breaker=self.name, outcome=o))
+                   for o in ("success", "error", "slow", "rejected")},
+            }
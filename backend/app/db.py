@@ -4,6 +4,8 @@ from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
 
+from .metrics import Gauge
+
 # Load DATABASE_URL from backend/.env
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -15,3 +17,9 @@ engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
 # Session factory we will use inside routes
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+# Pool usage, read at scrape time by GET /metrics
+Gauge("app_db_pool_checked_out", "SQLAlchemy pool connections currently in use.",
+      callback=lambda: engine.pool.checkedout())
+Gauge("app_db_pool_size", "SQLAlchemy pool configured size.",
+      callback=lambda: engine.pool.size())
@@ -0,0 +1,132 @@
+# app/deadline.py
+"""
+Request deadlines and cancellation that follow the call into downstream work.
+
+A Deadline is an absolute time.monotonic() expiry plus a cancel flag. The current
+one lives in a contextvar, so it follows the request across `await`s and into
+run_in_threadpool / copy_context().run worker threads:
+
+    with bound(3.0):                 # at most 3 s from now (and never past an outer deadline)
+        ...
+        remaining()                  # seconds left, or None when unbounded
+        check()                      # raises DeadlineExceeded / Cancelled
+
+cancel() marks a deadline and all its children cancelled and runs their on_cancel
+callbacks (e.g. close the HTTP client of an in-flight request). Children
+(child()) share the expiry but can be cancelled on their own: hedged attempts each
+get one, so the losing attempt is cancelled without touching the request.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's time budget ran out."""
+
+
+class Cancelled(Exception):
+    """The work was cancelled (client went away, or a hedged attempt lost)."""
+
+
+class Deadline:
+    def __init__(self, expires_at: Optional[float] = None, parent: Optional["Deadline"] = None) -> None:
+        if parent is not None and parent.expires_at is not None:
+            expires_at = parent.expires_at if expires_at is None else min(expires_at, parent.expires_at)
+        self.expires_at = expires_at
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        if parent is not None:
+            parent.on_cancel(self.cancel)
+
+    @classmethod
+    def after(cls, seconds: Optional[float], parent: Optional["Deadline"] = None) -> "Deadline":
+        return cls(None if seconds is None else time.monotonic() + seconds, parent)
+
+    def child(self) -> "Deadline":
+        return Deadline(parent=self)
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        left = self.remaining()
+        return left is not None and left <= 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def check(self) -> None:
+        if self._cancelled:
+            raise Cancelled("cancelled")
+        if self.expired:
+            raise DeadlineExceeded("deadline exceeded")
+
+    def on_cancel(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """Run fn on cancel (at once if already cancelled). Returns an unregister function."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(fn)
+
+                def unregister() -> None:
+                    with self._lock:
+                        if fn in self._callbacks:
+                            self._callbacks.remove(fn)
+
+                return unregister
+        fn()
+        return lambda: None
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                pass  # best effort: the resource may already be gone
+
+
+_CURRENT: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _CURRENT.get()
+
+
+def remaining() -> Optional[float]:
+    dl = _CURRENT.get()
+    return dl.remaining() if dl is not None else None
+
+
+def check() -> None:
+    dl = _CURRENT.get()
+    if dl is not None:
+        dl.check()
+
+
+@contextmanager
+def use(dl: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make `dl` the current deadline for the block."""
+    token = _CURRENT.set(dl)
+    try:
+        yield dl
+    finally:
+        _CURRENT.reset(token)
+
+
+@contextmanager
+def bound(seconds: Optional[float]) -> Iterator[Deadline]:
+    """A child of the current deadline that also expires `seconds` from now."""
+    with use(Deadline.after(seconds, parent=_CURRENT.get())) as dl:
+        yield dl
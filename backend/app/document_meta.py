@@ -0,0 +1,117 @@
+# app/document_meta.py
+"""
+Per-document PDF metadata (page_count, TOC, sha256, size, mtime) in the
+document_meta sidecar table (db/003_add_document_meta.sql).
+
+The PDF is opened once to fill it; /toc, /store-toc and /chunk-toc then read the
+row instead of reopening the file. ensure_meta() only re-reads the file when it is
+present AND its path/size/mtime no longer match the row. When the file is not on
+this host at all the stored row is trusted, so the DB-only stages can run anywhere.
+"""
+import hashlib
+import os
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import fitz  # PyMuPDF
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+
+from app.pdf_cache import PDF_CACHE
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_pdf_meta(local_path: str, pdf: Optional["fitz.Document"] = None) -> Dict[str, Any]:
+    """
+    Read metadata from the file (through the shared PDF_CACHE handle). Pass an already
+    open `pdf` to use that one instead (e.g. from /parse-pages, which holds a lease).
+    """
+    st = os.stat(local_path)
+    with (nullcontext(pdf) if pdf is not None else PDF_CACHE.open(local_path)) as doc:
+        toc = [[int(e[0]), str(e[1]).strip(), int(e[2])] for e in (doc.get_toc(simple=True) or [])]
+        page_count = doc.page_count
+    return {
+        "local_path": str(local_path),
+        "page_count": int(page_count),
+        "toc": toc,
+        "sha256": _sha256(local_path),
+        "file_size": int(st.st_size),
+        "file_mtime": float(st.st_mtime),
+    }
+
+
+def get_meta(conn, doc_id: int) -> Optional[Dict[str, Any]]:
+    with conn.cursor(row_factory=dict_row) as cur:
+        cur.execute(
+            """
+            SELECT document_id, local_path, page_count, toc, sha256, file_size, file_mtime, updated_at
+            FROM document_meta WHERE document_id = %s
+            """,
+            (doc_id,),
+        )
+        return cur.fetchone()
+
+
+def save_meta(conn, doc_id: int, meta: Dict[str, Any]) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO document_meta
+              (document_id, local_path, page_count, toc, sha256, file_size, file_mtime, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (document_id) DO UPDATE SET
+              local_path = EXCLUDED.local_path,
+              page_count = EXCLUDED.page_count,
+              toc        = EXCLUDED.toc,
+              sha256     = EXCLUDED.sha256,
+              file_size  = EXCLUDED.file_size,
+              file_mtime = EXCLUDED.file_mtime,
+              updated_at = NOW()
+            """,
+            (doc_id, meta["local_path"], meta["page_count"], Jsonb(meta["toc"]), meta["sha256"],
+             meta["file_size"], meta["file_mtime"]),
+        )
+
+
+def is_stale(meta: Dict[str, Any], local_path: Optional[str]) -> bool:
+    """True if local_path exists here and differs from what the row was built from."""
+    if not local_path or not Path(local_path).exists():
+        return False
+    if meta["local_path"] != str(local_path):
+        return True
+    st = os.stat(local_path)
+    return int(st.st_size) != int(meta["file_size"]) or float(st.st_mtime) != float(meta["file_mtime"])
+
+
+def ensure_meta(conn, doc_id: int, local_path: Optional[str], refresh: bool = False,
+                pdf: Optional["fitz.Document"] = None) -> Dict[str, Any]:
+    """
+    Stored metadata for doc_id, (re)reading the file only when missing, stale or refresh=True.
+    Commits when it writes. Raises FileNotFoundError if there is no row and no file.
+    """
+    meta = None if refresh else get_meta(conn, doc_id)
+    if meta is not None and not is_stale(meta, local_path):
+        return meta
+    if not local_path or not Path(local_path).exists():
+        if meta is not None:
+            return meta
+        raise FileNotFoundError(f"no document_meta for document {doc_id} and local_path not found: {local_path}")
+    fresh = read_pdf_meta(local_path, pdf=pdf)
+    save_meta(conn, doc_id, fresh)
+    conn.commit()
+    return {"document_id": doc_id, **fresh}
+
+
+def toc_items(meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """TOC in the /toc response shape."""
+    return [{"level": int(e[0]), "title": e[1], "page_number": int(e[2])} for e in (meta.get("toc") or [])]
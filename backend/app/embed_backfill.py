@@ -0,0 +1,168 @@
+# app/embed_backfill.py
+"""
+Corpus-wide embedding backfill.
+
+Finds every chunk without an embedding for the current provider (anti-join in
+app/embedding_store.py: missing row OR stale `model`) and runs three overlapping stages:
+
+    reader thread --(bounded queue)--> embed pool (`concurrency` batches in flight) --> writer
+
+- reader: keyset-paged SELECTs (id > last id) on its own connection, blocking on the
+  queue when the embedders fall behind (backpressure, bounded memory).
+- embed: embed_texts() per batch in a thread pool. Network providers scale with
+  concurrency; the CPU-bound FakeEmbedder mostly won't (GIL).
+- writer: one bulk upsert + commit per finished batch, in completion order.
+
+Checkpoint: batches finish out of order, so the saved position is the LOW WATERMARK,
+i.e. the highest chunk id below which every batch has been written. A crashed run
+resumes from there (anything after it is picked up again by the anti-join anyway).
+"""
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.embeddings import embed_texts, get_embedder
+from app.embedding_store import bulk_upsert_embeddings, fetch_pending
+from app.logging_utils import log_kv, setup_logger
+from app.timing import timed_block
+
+_DONE = object()
+
+
+def _load_checkpoint(path: Optional[Path], model: str) -> int:
+    if not path:
+        return 0
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return 0
+    return int(state.get("watermark", 0)) if state.get("model") == model else 0
+
+
+def _save_checkpoint(path: Optional[Path], **state) -> None:
+    if not path:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _embed_batch(rows: List[Tuple[int, str]]) -> Tuple[List[int], List[List[float]], int]:
+    ids = [cid for cid, txt in rows if (txt or "").strip()]
+    texts = [txt for cid, txt in rows if (txt or "").strip()]
+    vecs = embed_texts(texts) if texts else []
+    return ids, vecs, len(rows) - len(ids)
+
+
+def run_backfill(get_conn: Callable, batch_size: int = 64, concurrency: int = 4,
+                 checkpoint: Optional[Path] = None, resume: bool = False,
+                 max_chunks: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Embed all pending chunks. get_conn() must return a new psycopg connection.
+    Returns counters + throughput; raises the first reader/embed/write error
+    (the checkpoint then holds the last safe watermark).
+    """
+    log = setup_logger("ingestion")
+    model = get_embedder().name
+    start_after = _load_checkpoint(checkpoint, model) if resume else 0
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=max(2, concurrency * 2))
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader() -> None:
+        try:
+            with get_conn() as conn:
+                conn.autocommit = True  # plain reads; no transaction held open for the whole run
+                after, fetched = start_after, 0
+                while not stop.is_set():
+                    limit = batch_size if max_chunks is None else min(batch_size, max_chunks - fetched)
+                    if limit <= 0:
+                        break
+                    rows = fetch_pending(conn, model, after, limit)
+                    if not rows:
+                        break
+                    fetched += len(rows)
+                    after = rows[-1][0]
+                    if not _put(rows):
+                        return
+        except Exception as e:  # surfaced by the main loop
+            _put(e)
+            return
+        _put(_DONE)
+
+    stats = {"model": model, "resumed_from": start_after, "batches": 0, "scanned": 0,
+             "embedded": 0, "skipped": 0, "watermark": start_after}
+    t0 = time.perf_counter()
+    rthread = threading.Thread(target=reader, name="embed-backfill-reader", daemon=True)
+
+    with timed_block("embed-backfill", concurrency=concurrency, batch_size=batch_size) as sp:
+        rthread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="embed") as ex, \
+                    get_conn() as wconn:
+                inflight: Dict[Any, Tuple[int, int]] = {}   # future -> (seq, last chunk id)
+                finished: Dict[int, int] = {}               # seq -> last chunk id, not yet contiguous
+                seq = next_seq = 0
+                reader_done = False
+                while True:
+                    # keep `concurrency` batches in flight; only block on the reader when idle
+                    while not reader_done and len(inflight) < concurrency:
+                        try:
+                            item = q.get() if not inflight else q.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is _DONE:
+                            reader_done = True
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        inflight[ex.submit(_embed_batch, item)] = (seq, item[-1][0])
+                        stats["scanned"] += len(item)
+                        seq += 1
+                    if not inflight:
+                        break
+
+                    done, _ = wait(inflight, timeout=0.1, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        s, last_id = inflight.pop(fut)
+                        ids, vecs, skipped = fut.result()
+                        bulk_upsert_embeddings(wconn, ids, vecs, model)
+                        wconn.commit()
+                        stats["embedded"] += len(ids)
+                        stats["skipped"] += skipped
+                        stats["batches"] += 1
+                        finished[s] = last_id
+
+                    advanced = False
+                    while next_seq in finished:
+                        stats["watermark"] = finished.pop(next_seq)
+                        next_seq += 1
+                        advanced = True
+                    if advanced:
+                        _save_checkpoint(checkpoint, model=model, watermark=stats["watermark"],
+                                         embedded=stats["embedded"])
+                        log_kv(log, event="progress", stage="embed-backfill", embedded=stats["embedded"],
+                               watermark=stats["watermark"])
+        finally:
+            stop.set()
+            rthread.join(timeout=5)
+
+        elapsed = time.perf_counter() - t0
+        stats["elapsed_s"] = round(elapsed, 3)
+        stats["chunks_per_s"] = round(stats["embedded"] / elapsed, 1) if elapsed > 0 else None
+        sp.set(embedded=stats["embedded"], batches=stats["batches"])
+    return stats
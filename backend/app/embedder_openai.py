@@ -1,9 +1,10 @@
 """
 app/embedder_openai.py
-OpenAI embeddings provider (standalone, not yet wired into get_embedder()).
+OpenAI embeddings provider, selected with EMB_PROVIDER=openai (see get_embedder()).
 
-Safe to keep alongside the fake provider. Only used when we later import and
-explicitly select it (we won't do that yet).
+Deadline-aware (app/deadline.py): each HTTP request gets at most the time left on
+the current deadline, and cancelling the deadline (client gone, hedge lost) closes
+the client, which aborts the in-flight request.
 """
 
 from __future__ import annotations
@@ -12,13 +13,26 @@ import os
 import json
 import httpx
 
+from . import deadline
+
 EMBED_DIM = 1536  # matches your pgvector schema
 
+_SSL_CONTEXT = None
+
+
+def _ssl_context():
+    # Building one costs ~30 ms (CA bundle load); every request gets its own Client
+    # (so it can be closed to cancel), so share the context instead.
+    global _SSL_CONTEXT
+    if _SSL_CONTEXT is None:
+        _SSL_CONTEXT = httpx.create_ssl_context()
+    return _SSL_CONTEXT
+
 class OpenAIEmbedder:
     """
     Real embeddings via OpenAI REST API.
 
-    Env vars (only needed when we actually enable it later):
+    Env vars:
         OPENAI_API_KEY           - required (not placeholder)
         EMBEDDING_MODEL          - default 'text-embedding-3-small' (1536 dims)
         OPENAI_BASE_URL (opt)    - override base URL if using Azure/proxy
@@ -30,8 +44,7 @@ class OpenAIEmbedder:
 
     def __init__(self) -> None:
         self.api_key = os.getenv("OPENAI_API_KEY")
-        # We intentionally do NOT raise here while setting up,
-        # because we might import this class without using it yet.
+        # Do NOT raise here: a missing key is reported on the first call.
         self.model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
         self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
         self.timeout = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "40"))
@@ -57,8 +70,7 @@ class OpenAIEmbedder:
             batch = texts[i:i + self.batch_size]
             payload = {"model": self.model, "input": batch}
 
-            with httpx.Client(timeout=self.timeout) as client:
-                resp = client.post(url, headers=headers, data=json.dumps(payload))
+            resp = self._post(url, headers, payload)
 
             if resp.status_code != 200:
                 raise RuntimeError(
@@ -80,3 +92,24 @@ class OpenAIEmbedder:
             out.extend(vectors)
 
         return out
+
+    def _post(self, url: str, headers: dict, payload: dict) -> httpx.Response:
+        dl = deadline.current()
+        timeout = self.timeout
+        if dl is not None:
+            dl.check()
+            left = dl.remaining()
+            if left is not None:
+                timeout = max(0.001, min(timeout, left))
+        with httpx.Client(timeout=timeout, verify=_ssl_context()) as client:
+            unregister = dl.on_cancel(client.close) if dl is not None else (lambda: None)
+            try:
+                return client.post(url, headers=headers, data=json.dumps(payload))
+            except (httpx.HTTPError, RuntimeError) as e:
+                if dl is not None and dl.cancelled:
+                    raise deadline.Cancelled("embedding request cancelled") from e
+                if dl is not None and dl.expired:
+                    raise deadline.DeadlineExceeded("embedding request ran past the deadline") from e
+                raise
+            finally:
+                unregister()
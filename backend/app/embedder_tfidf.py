@@ -0,0 +1,204 @@
+# app/embedder_tfidf.py
+"""
+Offline CPU embedder: hashed n-gram TF-IDF + fixed sparse random projection.
+
+Selected with EMB_PROVIDER=tfidf. Unlike FakeEmbedder, texts that share words get
+nearby vectors, so retrieval quality can be measured without a network call.
+
+  features   lower-cased word unigrams, word bigrams and (optionally) boundary-marked
+             character n-grams of each word, hashed (crc32) into n_features buckets
+  weights    (1 + log tf) * idf, idf fitted from document_chunks (fit_from_db) or
+             any text iterable (fit_texts): log((1 + N) / (1 + df)) + 1
+  projection every bucket adds +-1/sqrt(s) to `s` fixed output dims drawn from
+             `seed` (sparse Johnson-Lindenstrauss), then rows are L2-normalised to
+             EMBED_DIM = 1536
+
+A batch is embedded with a handful of numpy ops (np.unique over (row, bucket) keys,
+one np.bincount for the projection); only tokenising/hashing is per text.
+Tokenising still holds the GIL: use EMBED_WORKERS to run it in the shared process
+pool (ProcessPoolEmbedder in app/embeddings.py, which uses embed_array directly).
+
+The model is a small .npz (TFIDF_MODEL_PATH, default storage/tfidf/model.npz):
+idf per bucket + the settings. Build it with:
+
+    python -m tools.fit_tfidf                      # from document_chunks
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from psycopg.rows import dict_row
+
+EMBED_DIM = 1536
+DEFAULT_MODEL_PATH = "storage/tfidf/model.npz"
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class TfidfConfig:
+    def __init__(self, n_features: int = 2 ** 18, char_ngrams: int = 3, bigrams: bool = True,
+                 nnz: int = 4, seed: int = 1536) -> None:
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.n_features = n_features
+        self.char_ngrams = char_ngrams
+        self.bigrams = bigrams
+        self.nnz = nnz
+        self.seed = seed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"n_features": self.n_features, "char_ngrams": self.char_ngrams, "bigrams": self.bigrams,
+                "nnz": self.nnz, "seed": self.seed}
+
+    def hashed(self, text: str) -> List[int]:
+        """Bucket ids of every feature occurrence in `text` (repeats = term frequency)."""
+        mask = self.n_features - 1
+        toks = _tokens(text)
+        feats = [f"w:{t}" for t in toks]
+        if self.bigrams:
+            feats += [f"b:{a} {b}" for a, b in zip(toks, toks[1:])]
+        n = self.char_ngrams
+        if n:
+            for t in toks:
+                if len(t) >= n:
+                    w = f"<{t}>"
+                    feats += [f"c:{w[i:i + n]}" for i in range(len(w) - n + 1)]
+        return [zlib.crc32(f.encode("utf-8")) & mask for f in feats]
+
+
+def _batch_keys(cfg: TfidfConfig, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(rows, buckets, counts) of the distinct (text, bucket) pairs in the batch."""
+    hashed = [cfg.hashed(t) for t in texts]
+    lengths = np.fromiter((len(h) for h in hashed), dtype=np.int64, count=len(hashed))
+    if not lengths.sum():
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    buckets = np.fromiter((b for h in hashed for b in h), dtype=np.int64, count=int(lengths.sum()))
+    keys, counts = np.unique(rows * cfg.n_features + buckets, return_counts=True)
+    return keys // cfg.n_features, keys % cfg.n_features, counts
+
+
+class TfidfEmbedder:
+    dim = EMBED_DIM
+
+    def __init__(self, cfg: TfidfConfig, idf: np.ndarray, n_docs: int, path: Optional[str] = None) -> None:
+        if idf.shape != (cfg.n_features,):
+            raise ValueError(f"idf has shape {idf.shape}, expected ({cfg.n_features},)")
+        self.cfg = cfg
+        self.idf = idf.astype(np.float32)
+        self.n_docs = n_docs
+        self.path = path
+        rng = np.random.default_rng(cfg.seed)
+        self._proj_idx = rng.integers(0, EMBED_DIM, size=(cfg.n_features, cfg.nnz), dtype=np.int64)
+        self._proj_sign = (rng.integers(0, 2, size=(cfg.n_features, cfg.nnz)) * 2 - 1).astype(np.float32)
+        self._proj_sign /= math.sqrt(cfg.nnz)
+        digest = hashlib.sha1(self.idf.tobytes() + json.dumps(cfg.to_dict(), sort_keys=True).encode()).hexdigest()
+        self.name = f"tfidf-{EMBED_DIM}-{digest[:8]}"
+
+    # ---- persistence ----
+    def save(self, path: str) -> None:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp.npz")
+        np.savez_compressed(tmp, idf=self.idf, n_docs=np.int64(self.n_docs),
+                            config=np.array(json.dumps(self.cfg.to_dict())))
+        tmp.replace(p)
+        self.path = str(p)
+
+    @classmethod
+    def load(cls, path: str) -> "TfidfEmbedder":
+        if not Path(path).exists():
+            raise RuntimeError(f"TF-IDF model not found at {path}; build it with `python -m tools.fit_tfidf`")
+        with np.load(path) as z:
+            cfg = TfidfConfig(**json.loads(str(z["config"])))
+            return cls(cfg, z["idf"], int(z["n_docs"]), path=path)
+
+    # ---- embedding ----
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), 1536) float32, rows L2-normalised (all-zero for texts without tokens)."""
+        out = np.zeros(len(texts) * EMBED_DIM, dtype=np.float32)
+        rows, buckets, counts = _batch_keys(self.cfg, texts)
+        if len(rows):
+            w = (1.0 + np.log(counts)).astype(np.float32) * self.idf[buckets]
+            flat = (rows[:, None] * EMBED_DIM + self._proj_idx[buckets]).ravel()
+            vals = (w[:, None] * self._proj_sign[buckets]).ravel()
+            out += np.bincount(flat, weights=vals, minlength=out.size).astype(np.float32)
+        out = out.reshape(len(texts), EMBED_DIM)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+
+# -----------------------------
+# Fitting
+# -----------------------------
+def fit_texts(texts: Iterable[str], cfg: Optional[TfidfConfig] = None, batch_size: int = 2000) -> TfidfEmbedder:
+    """Document frequencies over `texts` (streamed in batches) -> embedder."""
+    cfg = cfg or TfidfConfig()
+    df = np.zeros(cfg.n_features, dtype=np.int64)
+    n_docs = 0
+    batch: List[str] = []
+
+    def flush() -> None:
+        nonlocal n_docs
+        if batch:
+            _, buckets, _ = _batch_keys(cfg, batch)
+            df[:] += np.bincount(buckets, minlength=cfg.n_features)
+            n_docs += len(batch)
+            batch.clear()
+
+    for t in texts:
+        batch.append(t or "")
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    idf = np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+    return TfidfEmbedder(cfg, idf.astype(np.float32), n_docs)
+
+
+def iter_chunk_texts(conn, batch_size: int = 2000, limit: Optional[int] = None) -> Iterable[str]:
+    """document_chunks.content through a named cursor (flat memory)."""
+    sql = "SELECT content FROM document_chunks ORDER BY id" + (" LIMIT %s" if limit else "")
+    with conn.cursor(name="tfidf_fit", row_factory=dict_row) as cur:
+        cur.itersize = batch_size
+        cur.execute(sql, (limit,) if limit else None)
+        for row in cur:
+            yield row["content"] or ""
+
+
+def fit_from_db(conn, cfg: Optional[TfidfConfig] = None, batch_size: int = 2000,
+                limit: Optional[int] = None) -> TfidfEmbedder:
+    return fit_texts(iter_chunk_texts(conn, batch_size, limit), cfg, batch_size)
+
+
+# -----------------------------
+# Loading
+# -----------------------------
+_CACHE: Dict[Tuple[str, int], TfidfEmbedder] = {}
+
+
+def load_cached(path: str) -> TfidfEmbedder:
+    """One TfidfEmbedder per (path, mtime); reloaded when the file changes."""
+    mtime = Path(path).stat().st_mtime_ns if Path(path).exists() else 0
+    key = (str(path), mtime)
+    emb = _CACHE.get(key)
+    if emb is None:
+        emb = TfidfEmbedder.load(path)
+        _CACHE.clear()
+        _CACHE[key] = emb
+    return emb
@@ -0,0 +1,194 @@
+# app/embedding_store.py
+"""
+Shared chunk_embeddings reads/writes (documents + chunks routers, backfill). Every
+embedding write, single chunk included, goes through bulk_upsert_embeddings().
+
+bulk_upsert_embeddings() writes a whole batch in ONE statement: ids and vectors
+travel as two arrays, are unnest()ed server-side and joined to document_chunks
+for product_id, instead of one INSERT (+ product_id subquery) per chunk.
+
+VECTOR_METRIC=ip: every vector is scaled to unit length before it is written, so
+/search can rank by negative inner product (<#>, no sqrt, no norms) and report
+it as cosine similarity. find_unnormalized()/renormalize() fix rows written
+before the switch (python -m tools.normalize_embeddings).
+
+EMBED_PREFIX_DIMS=d (> 0): every write also fills chunk_embeddings.embedding_prefix
+with the first d dims of the vector, re-normalised to unit length (Matryoshka-style
+truncation), for /search's two-stage mode. Add the column + index with
+scripts/add_embedding_prefix_column.py first.
+"""
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg
+
+from app.embeddings import EMBED_DIM
+
+# "l2" (default): <-> distance, vectors stored as the provider returns them.
+# "ip": unit vectors on write, <#> ranking (needs vector_ip_ops indexes).
+VECTOR_METRIC = os.getenv("VECTOR_METRIC", "l2").lower()
+if VECTOR_METRIC not in ("l2", "ip"):
+    raise RuntimeError(f"VECTOR_METRIC must be 'l2' or 'ip', got {VECTOR_METRIC!r}")
+NORM_TOLERANCE = 1e-4
+
+PREFIX_DIMS = int(os.getenv("EMBED_PREFIX_DIMS", "0"))
+if not 0 <= PREFIX_DIMS < EMBED_DIM:
+    raise RuntimeError(f"EMBED_PREFIX_DIMS must be in [0, {EMBED_DIM}), got {PREFIX_DIMS}")
+
+_BULK_UPSERT = """
+    INSERT INTO chunk_embeddings (chunk_id, embedding, model, product_id)
+    SELECT v.chunk_id, v.embedding::vector, %s, c.product_id
+    FROM unnest(%s::bigint[], %s::text[]) AS v(chunk_id, embedding)
+    JOIN document_chunks c ON c.id = v.chunk_id
+    ON CONFLICT (chunk_id)
+    DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        model     = EXCLUDED.model,
+        product_id= EXCLUDED.product_id,
+        created_at= NOW()
+"""
+
+_BULK_UPSERT_PREFIX = """
+    INSERT INTO chunk_embeddings (chunk_id, embedding, embedding_prefix, model, product_id)
+    SELECT v.chunk_id, v.embedding::vector, v.prefix::vector, %s, c.product_id
+    FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS v(chunk_id, embedding, prefix)
+    JOIN document_chunks c ON c.id = v.chunk_id
+    ON CONFLICT (chunk_id)
+    DO UPDATE SET
+        embedding        = EXCLUDED.embedding,
+        embedding_prefix = EXCLUDED.embedding_prefix,
+        model            = EXCLUDED.model,
+        product_id       = EXCLUDED.product_id,
+        created_at       = NOW()
+"""
+
+# Anti-join: chunks with no embedding row, or one produced by another model
+_PENDING = """
+    SELECT c.id, c.content
+    FROM document_chunks c
+    LEFT JOIN chunk_embeddings ce ON ce.chunk_id = c.id
+    WHERE c.id > %s
+      AND (ce.chunk_id IS NULL OR ce.model IS DISTINCT FROM %s)
+    ORDER BY c.id ASC
+    LIMIT %s
+"""
+
+
+def unit_vector(vec: Sequence[float]) -> List[float]:
+    """vec / ||vec||; all-zero vectors are returned unchanged."""
+    norm = math.sqrt(sum(float(x) * float(x) for x in vec))
+    if norm == 0.0:
+        return [float(x) for x in vec]
+    return [float(x) / norm for x in vec]
+
+
+def storage_vector(vec: Sequence[float]) -> Sequence[float]:
+    """The vector as it should be stored under VECTOR_METRIC."""
+    return unit_vector(vec) if VECTOR_METRIC == "ip" else vec
+
+
+def prefix_vector(vec: Sequence[float], dims: int) -> List[float]:
+    """First `dims` components, re-normalised to unit length."""
+    return unit_vector(vec[:dims])
+
+
+def vector_literal(vec: Sequence[float]) -> str:
+    """pgvector text form '[x,y,...]' (unit length under VECTOR_METRIC=ip); refuses wrong-dimension vectors."""
+    if len(vec) != EMBED_DIM:
+        raise RuntimeError(
+            f"Refusing to save embedding of length {len(vec)} (expected {EMBED_DIM}). "
+            "Check EMBEDDING_MODEL."
+        )
+    return "[" + ",".join(repr(float(x)) for x in storage_vector(vec)) + "]"
+
+
+def bulk_upsert_embeddings(conn, chunk_ids: Sequence[int], vecs: Sequence[Sequence[float]], model_name: str) -> int:
+    """Upsert all (chunk_id, vector) pairs in one statement. Returns rows written (caller commits)."""
+    if not chunk_ids:
+        return 0
+    literals = [vector_literal(v) for v in vecs]
+    with conn.cursor() as cur:
+        if PREFIX_DIMS:
+            prefixes = ["[" + ",".join(repr(x) for x in prefix_vector(v, PREFIX_DIMS)) + "]" for v in vecs]
+            cur.execute(_BULK_UPSERT_PREFIX, (model_name, list(chunk_ids), literals, prefixes))
+        else:
+            cur.execute(_BULK_UPSERT, (model_name, list(chunk_ids), literals))
+        return cur.rowcount
+
+
+def fetch_pending(conn, model_name: str, after_id: int, limit: int) -> List[Tuple[int, str]]:
+    """Next `limit` chunks (by id, after after_id) that have no embedding for model_name."""
+    with conn.cursor() as cur:
+        cur.execute(_PENDING, (after_id, model_name, limit))
+        return [_pair(r) for r in cur.fetchall()]
+
+
+def fetch_texts(conn, chunk_ids: Sequence[int]) -> Dict[int, Optional[str]]:
+    """
+    {chunk_id: text} for the given ids (unknown ids are absent): `content`, or the
+    `text` column where content is empty, like _fetch_chunk_text in
+    app/routers/chunks.py. One query, plus one for the empty rows if there are any.
+    """
+    if not chunk_ids:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, content FROM document_chunks WHERE id = ANY(%s)", (list(chunk_ids),))
+        texts = dict(_pair(r) for r in cur.fetchall())
+    empty = [cid for cid, txt in texts.items() if not txt]
+    if empty:
+        try:
+            # savepoint: a schema without a `text` column must not abort the transaction
+            with conn.transaction(), conn.cursor() as cur:
+                cur.execute("SELECT id, text AS content FROM document_chunks WHERE id = ANY(%s)", (empty,))
+                texts.update((cid, txt) for cid, txt in map(_pair, cur.fetchall()) if txt)
+        except psycopg.errors.UndefinedColumn:
+            pass
+    return texts
+
+
+_UNNORMALIZED = """
+    SELECT chunk_id, vector_norm(embedding) AS norm, embedding::text AS embedding
+    FROM chunk_embeddings
+    WHERE chunk_id > %s
+      AND abs(vector_norm(embedding) - 1.0) > %s
+    ORDER BY chunk_id ASC
+    LIMIT %s
+"""
+
+_RENORMALIZE = """
+    UPDATE chunk_embeddings ce
+    SET embedding = v.embedding::vector
+    FROM unnest(%s::bigint[], %s::text[]) AS v(chunk_id, embedding)
+    WHERE ce.chunk_id = v.chunk_id
+"""
+
+
+def find_unnormalized(conn, after_id: int, limit: int,
+                      tolerance: float = NORM_TOLERANCE) -> List[Tuple[int, float, List[float]]]:
+    """Next `limit` rows (by chunk_id, after after_id) whose norm is off 1 by more than tolerance."""
+    with conn.cursor() as cur:
+        cur.execute(_UNNORMALIZED, (after_id, tolerance, limit))
+        out = []
+        for r in cur.fetchall():
+            cid, norm, text = (r["chunk_id"], r["norm"], r["embedding"]) if isinstance(r, dict) else r
+            out.append((int(cid), float(norm), [float(x) for x in text.strip("[]").split(",")]))
+        return out
+
+
+def renormalize(conn, rows: Sequence[Tuple[int, float, Sequence[float]]]) -> int:
+    """Rewrite the given (chunk_id, norm, vector) rows at unit length; zero vectors are skipped (caller commits)."""
+    fix = [(cid, vec) for cid, norm, vec in rows if norm > 0.0]
+    if not fix:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute(_RENORMALIZE, ([cid for cid, _ in fix],
+                                   ["[" + ",".join(repr(x) for x in unit_vector(v)) + "]" for _, v in fix]))
+        return cur.rowcount
+
+
+def _pair(row: Any) -> Tuple[int, str]:
+    # works for tuple rows and dict_row cursors
+    if isinstance(row, dict):
+        return int(row["id"]), row["content"]
+    return int(row[0]), row[1]
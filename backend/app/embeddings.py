@@ -2,26 +2,61 @@
 app/embeddings.py
 Pluggable embedding interface.
 
-- Start with a deterministic FAKE provider (no network, no API keys).
-- Later we’ll add a real provider (e.g., OpenAI) behind the same interface.
+- fake   deterministic FAKE provider (no network, no API keys, no semantics)
+- tfidf  offline hashed TF-IDF + random projection (app/embedder_tfidf.py)
+- openai OpenAI REST API (app/embedder_openai.py)
 
 Public API you can import elsewhere:
     get_embedder() -> Embedder
     embed_one(text: str) -> list[float]
     embed_texts(texts: list[str]) -> list[list[float]]
+(both coalesce identical concurrent calls, see app/singleflight.py)
+
+embed_one() is the query-time path (/search) and also runs through EMBED_BREAKER
+(app/circuit_breaker.py): errors and calls slower than EMBED_BREAKER_SLOW_MS trip it,
+and while it is open embed_one raises CircuitOpen at once so search can degrade.
+Bulk embed_texts() is left out: batch latency grows with batch size.
+
+embed_one() also goes through EMBED_HEDGER (app/hedging.py): it never waits past the
+current request deadline (app/deadline.py), and with EMBED_HEDGE=1 a duplicate call
+is fired once the first is slower than the EMBED_HEDGE_PERCENTILE of recent calls.
+
+CPU-bound providers (fake, tfidf) hold the GIL for the whole batch. With EMBED_WORKERS=N
+(N > 0) get_embedder() wraps them in a ProcessPoolEmbedder: batches of at least
+EMBED_POOL_MIN_BATCH texts are split over N persistent worker processes, which write
+their rows straight into one shared-memory block, so the calling thread only waits.
+Smaller calls (embed_one) stay inline. The wrapper keeps the provider's name and vectors.
 
 All vectors are length 1536 to match your pgvector schema.
 """
 
 from __future__ import annotations
-from typing import List, Protocol, Literal
+from typing import Callable, Dict, List, Optional, Protocol, Literal
+import atexit
 import os
 import math
 import hashlib
+import multiprocessing as mp
 import struct
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import chain
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+
+from .circuit_breaker import CircuitBreaker
+from . import deadline
+from .deadline import Cancelled, DeadlineExceeded
+from .embedder_openai import OpenAIEmbedder
+from .hedging import Hedger
+from .metrics import EMBED_BATCH_SIZE, EMBED_LATENCY, EMBED_POOL_BATCHES
+from .singleflight import SingleFlight
 
 EMBED_DIM = 1536
-ProviderName = Literal["fake", "openai"]  # we’ll add "openai" later
+ProviderName = Literal["fake", "tfidf", "openai"]
 
 
 class Embedder(Protocol):
@@ -62,29 +97,221 @@ class FakeEmbedder:
         return [v / norm for v in vals]
 
 
+# -----------------------------------
+# Process-pool executor (CPU-bound providers)
+# -----------------------------------
+_WORKER_EMBEDDER: Optional[Embedder] = None
+
+
+def _init_pool_worker(factory: Callable[[], Embedder]) -> None:
+    global _WORKER_EMBEDDER
+    _WORKER_EMBEDDER = factory()
+
+
+def _worker_embedder(name: str) -> Embedder:
+    emb = _WORKER_EMBEDDER
+    if emb is None or emb.name != name:  # e.g. the tfidf model was refitted under us
+        raise RuntimeError(f"embed pool worker has {getattr(emb, 'name', None)}, expected {name}")
+    return emb
+
+
+def _pool_embed_shm(name: str, shm_name: str, row: int, texts: List[str]) -> int:
+    """Embed `texts` into float64 rows row.. of the shared block; returns the row count."""
+    emb = _worker_embedder(name)
+    shm = SharedMemory(name=shm_name)
+    try:
+        embed_array = getattr(emb, "embed_array", None)  # numpy providers skip Python floats
+        if embed_array is not None:
+            data = memoryview(embed_array(texts).astype("float64")).cast("B")
+        else:
+            data = memoryview(array("d", chain.from_iterable(emb.embed_texts(texts)))).cast("B")
+        start = row * emb.dim * 8
+        shm.buf[start:start + data.nbytes] = data
+    finally:
+        shm.close()
+    return len(texts)
+
+
+def _pool_embed_pickled(name: str, texts: List[str]) -> List[List[float]]:
+    return _worker_embedder(name).embed_texts(texts)
+
+
+class ProcessPoolEmbedder:
+    """
+    Runs a CPU-bound provider's embed_texts() in a persistent process pool.
+
+    `factory` is a picklable zero-argument callable returning the provider; it is
+    called once in the parent (name/dim, small batches) and once per worker process.
+    A batch of >= min_batch texts is cut into `workers` slices; each worker writes its
+    rows into one SharedMemory block of float64 (bit-identical to the inline path), so
+    only texts are pickled. shared_memory=False returns pickled lists instead (kept
+    for tools/bench_embed_pool.py).
+    """
+
+    def __init__(self, factory: Callable[[], Embedder], workers: int, min_batch: int = 16,
+                 shared_memory: bool = True, inner: Optional[Embedder] = None) -> None:
+        self.factory = factory
+        self.inner = inner or factory()
+        self.name = self.inner.name
+        self.dim = self.inner.dim
+        self.workers = max(1, workers)
+        self.min_batch = max(1, min_batch)
+        self.shared_memory = shared_memory
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=mp.get_context("spawn"),
+                    initializer=_init_pool_worker, initargs=(self.factory,),
+                )
+            return self._pool
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) < self.min_batch:
+            EMBED_POOL_BATCHES.inc(provider=self.name, path="inline")
+            return self.inner.embed_texts(texts)
+        try:
+            out = self._embed_pooled(texts)
+        except BrokenProcessPool:
+            self.shutdown()  # a worker died (OOM kill, ...): respawn on the next call
+            EMBED_POOL_BATCHES.inc(provider=self.name, path="fallback")
+            return self.inner.embed_texts(texts)
+        EMBED_POOL_BATCHES.inc(provider=self.name, path="pool")
+        return out
+
+    def _embed_pooled(self, texts: List[str]) -> List[List[float]]:
+        pool = self._get_pool()
+        step = math.ceil(len(texts) / self.workers)
+        starts = range(0, len(texts), step)
+        if not self.shared_memory:
+            futs = [pool.submit(_pool_embed_pickled, self.name, texts[i:i + step]) for i in starts]
+            return [v for f in futs for v in f.result()]
+
+        dim = self.dim
+        shm = SharedMemory(create=True, size=len(texts) * dim * 8)
+        try:
+            futs = [pool.submit(_pool_embed_shm, self.name, shm.name, i, texts[i:i + step]) for i in starts]
+            for f in futs:
+                f.result()
+            flat = shm.buf.cast("d")
+            try:
+                return [flat[i * dim:(i + 1) * dim].tolist() for i in range(len(texts))]
+            finally:
+                flat.release()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_POOLED: Dict[str, ProcessPoolEmbedder] = {}
+_POOLED_LOCK = threading.Lock()
+
+
+def _pooled(provider: str, factory: Callable[[], Embedder], workers: int, min_batch: int) -> Embedder:
+    """One ProcessPoolEmbedder per provider, replaced when the model or settings change."""
+    inner = factory()
+    with _POOLED_LOCK:
+        emb = _POOLED.get(provider)
+        if emb is not None and (emb.name, emb.workers, emb.min_batch) == (inner.name, workers, min_batch):
+            return emb
+        if emb is not None:
+            emb.shutdown()
+        emb = _POOLED[provider] = ProcessPoolEmbedder(factory, workers, min_batch, inner=inner)
+        return emb
+
+
+def shutdown_embed_pools(wait: bool = False) -> None:
+    with _POOLED_LOCK:
+        pooled = list(_POOLED.values())
+        _POOLED.clear()
+    for emb in pooled:
+        emb.shutdown(wait)
+
+
+atexit.register(shutdown_embed_pools)
+
+
 # -----------------------------------
 # Provider selection & convenience API
 # -----------------------------------
 def get_embedder() -> Embedder:
     """
     Select provider by EMB_PROVIDER env var (defaults to 'fake').
-    Future: add OpenAI when ready.
+    CPU-bound providers run in a process pool when EMBED_WORKERS > 0.
     """
     provider: ProviderName = (os.getenv("EMB_PROVIDER") or "fake").lower()  # type: ignore
-    if provider == "fake":
-        return FakeEmbedder()
-    # Placeholder for future real provider:
     if provider == "openai":
-        raise NotImplementedError(
-            "OpenAI provider not wired yet. We'll add this in the next steps."
-        )
-    # Fallback
-    return FakeEmbedder()
+        return OpenAIEmbedder()
+    if provider == "tfidf":
+        from .embedder_tfidf import DEFAULT_MODEL_PATH, load_cached  # needs numpy
+
+        factory: Callable[[], Embedder] = partial(load_cached, os.getenv("TFIDF_MODEL_PATH", DEFAULT_MODEL_PATH))
+    else:
+        provider = "fake"  # also the fallback
+        factory = FakeEmbedder
+    workers = int(os.getenv("EMBED_WORKERS", "0"))
+    if workers <= 0:
+        return factory()
+    return _pooled(provider, factory, workers, int(os.getenv("EMBED_POOL_MIN_BATCH", "16")))
+
+
+def _embed_with_metrics(embedder: Embedder, texts: List[str]) -> List[List[float]]:
+    EMBED_BATCH_SIZE.observe(len(texts), provider=embedder.name)
+    t0 = perf_counter()
+    try:
+        return embedder.embed_texts(texts)
+    finally:
+        EMBED_LATENCY.observe(perf_counter() - t0, provider=embedder.name)
+
+
+# Identical concurrent calls (same provider + same text(s)) share one embedder call.
+EMBED_FLIGHT = SingleFlight("embed")
+
+EMBED_BREAKER = CircuitBreaker(
+    "embed",
+    window=int(os.getenv("EMBED_BREAKER_WINDOW", "20")),
+    min_calls=int(os.getenv("EMBED_BREAKER_MIN_CALLS", "5")),
+    failure_rate=float(os.getenv("EMBED_BREAKER_FAILURE_RATE", "0.5")),
+    slow_call_s=int(os.getenv("EMBED_BREAKER_SLOW_MS", "1000")) / 1000.0,
+    open_for_s=float(os.getenv("EMBED_BREAKER_OPEN_S", "10")),
+    ignore=(Cancelled, DeadlineExceeded),
+)
+
+EMBED_HEDGER = Hedger(
+    "embed",
+    enabled=os.getenv("EMBED_HEDGE", "0") == "1",
+    percentile=float(os.getenv("EMBED_HEDGE_PERCENTILE", "95")),
+    max_hedges=int(os.getenv("EMBED_HEDGE_MAX", "1")),
+    min_samples=int(os.getenv("EMBED_HEDGE_MIN_SAMPLES", "20")),
+)
 
 
 def embed_one(text: str) -> List[float]:
-    return get_embedder().embed_texts([text])[0]
+    """
+    Query embedding. Raises CircuitOpen while EMBED_BREAKER is open, DeadlineExceeded
+    when the current deadline runs out, Cancelled when it is cancelled.
+    """
+    emb = get_embedder()
+    key = (emb.name, text)
+    try:
+        return EMBED_FLIGHT.do(key, EMBED_BREAKER.call, EMBED_HEDGER.call, _embed_with_metrics, emb, [text])[0]
+    except (Cancelled, DeadlineExceeded):
+        # Coalesced callers share the leader's outcome, which ran under the leader's
+        # deadline. Give up if our own deadline is done; otherwise run once more
+        # (as leader or behind a fresh flight) and let that outcome stand.
+        deadline.check()
+    return EMBED_FLIGHT.do(key, EMBED_BREAKER.call, EMBED_HEDGER.call, _embed_with_metrics, emb, [text])[0]
 
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
-    return get_embedder().embed_texts(texts)
+    emb = get_embedder()
+    return EMBED_FLIGHT.do((emb.name, tuple(texts)), _embed_with_metrics, emb, texts)
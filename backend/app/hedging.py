@@ -0,0 +1,154 @@
+# app/hedging.py
+"""
+Deadline-aware, optionally hedged calls for the query embedder.
+
+Hedger.call(fn, *args) runs fn in a small dedicated thread pool and waits for it
+no longer than the current deadline (app/deadline.py). With hedging on, if the
+first attempt has not answered after the `percentile` latency of recent
+attempts, one duplicate is fired (up to `max_hedges`) and the first success wins.
+The losers' Deadline children are cancelled, which aborts their in-flight HTTP
+request (see OpenAIEmbedder).
+
+The hedge delay comes from a rolling window of the last `window` attempt
+latencies (a cancelled loser counts with its time so far); until `min_samples`
+are seen there is no hedging. A duplicate costs
+provider quota, so at p95 expect ~5% extra calls.
+
+    hedger.call(fn, *args)  -> fn's result
+    raises DeadlineExceeded (budget ran out), Cancelled (request cancelled) or the
+    error of the last failing attempt.
+
+Counter: app_hedge_attempts_total{hedger, kind=primary|hedge, outcome=win|error|cancelled}
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from . import deadline
+from .metrics import HEDGE_ATTEMPTS
+
+
+def _run_attempt(dl: deadline.Deadline, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    with deadline.use(dl):
+        dl.check()
+        result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+class Hedger:
+    def __init__(self, name: str, enabled: bool = False, percentile: float = 95.0, max_hedges: int = 1,
+                 window: int = 200, min_samples: int = 20, min_delay_s: float = 0.005, pool_size: int = 16) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.percentile = percentile
+        self.max_hedges = max(0, max_hedges)
+        self.min_samples = max(1, min_samples)
+        self.min_delay_s = min_delay_s
+        self._samples: Deque[float] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f"hedge-{name}")
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None (disabled / not enough samples yet)."""
+        if not self.enabled or self.max_hedges == 0:
+            return None
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            s = sorted(self._samples)
+        k = max(0, min(len(s) - 1, math.ceil(self.percentile / 100.0 * len(s)) - 1))
+        return max(self.min_delay_s, s[k])
+
+    def call(self, fn: Callable[..., Any], *args) -> Any:
+        parent = deadline.current()
+        hedge_after = self.hedge_delay()
+        if parent is None and hedge_after is None:
+            t0 = time.perf_counter()  # nothing to bound or race: call inline
+            result = fn(*args)
+            self.observe(time.perf_counter() - t0)
+            return result
+        return self._race(parent or deadline.Deadline(), fn, args, hedge_after)
+
+    def _race(self, parent: deadline.Deadline, fn: Callable[..., Any], args: Tuple[Any, ...],
+              hedge_after: Optional[float]) -> Any:
+        parent.check()
+        cancelled: Future = Future()
+        unregister = parent.on_cancel(lambda: cancelled.done() or cancelled.set_result(None))
+        attempts: List[Tuple[Future, deadline.Deadline, str, float]] = []
+
+        def launch(kind: str) -> None:
+            child = parent.child()
+            ctx = contextvars.copy_context()  # keeps the current trace span as parent
+            fut = self._pool.submit(ctx.run, _run_attempt, child, fn, args)
+            attempts.append((fut, child, kind, time.perf_counter()))
+
+        def finish(winner: Optional[Future]) -> None:
+            unregister()
+            for fut, child, kind, t_launch in attempts:
+                if fut is winner:
+                    continue
+                if not fut.done():
+                    child.cancel()
+                    HEDGE_ATTEMPTS.inc(hedger=self.name, kind=kind, outcome="cancelled")
+                    # a lower bound of its latency; dropping it would pull the percentile down
+                    self.observe(time.perf_counter() - t_launch)
+
+        launch("primary")
+        started = time.monotonic()
+        failed: List[Future] = []
+        try:
+            while True:
+                can_hedge = hedge_after is not None and len(attempts) <= self.max_hedges
+                for fut, _, kind, _ in attempts:
+                    if not fut.done() or fut in failed:
+                        continue
+                    if fut.exception() is None:
+                        result, took = fut.result()
+                        self.observe(took)
+                        HEDGE_ATTEMPTS.inc(hedger=self.name, kind=kind, outcome="win")
+                        finish(fut)
+                        return result
+                    HEDGE_ATTEMPTS.inc(hedger=self.name, kind=kind, outcome="error")
+                    failed.append(fut)
+                pending = [a[0] for a in attempts if a[0] not in failed]  # done ones are picked up next turn
+
+                parent.check()  # cancelled, or the budget ran out
+                if not pending and not can_hedge:
+                    raise failed[-1].exception()  # every attempt failed
+                if can_hedge and (not pending or time.monotonic() - started >= hedge_after * len(attempts)):
+                    launch("hedge")
+                    continue
+
+                waits = [w for w in (parent.remaining(),) if w is not None]
+                if can_hedge:
+                    waits.append(hedge_after * len(attempts) - (time.monotonic() - started))
+                timeout = max(0.0, min(waits)) if waits else None
+                wait(pending + [cancelled], timeout=timeout, return_when=FIRST_COMPLETED)
+        except BaseException:
+            finish(None)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self.hedge_delay()
+        with self._lock:
+            samples = len(self._samples)
+        out: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "max_hedges": self.max_hedges,
+            "samples": samples,
+            "hedge_after_ms": round(delay * 1000.0, 2) if delay is not None else None,
+        }
+        for kind in ("primary", "hedge"):
+            for outcome in ("win", "error", "cancelled"):
+                out[f"{kind}_{outcome}"] = int(HEDGE_ATTEMPTS.value(hedger=self.name, kind=kind, outcome=outcome))
+        return out
@@ -1,7 +1,15 @@
 # app/logging_utils.py
 import os
+import copy
+import json
+import atexit
+import queue
 import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict
 
 _LEVELS = {
     "CRITICAL": logging.CRITICAL,
@@ -11,43 +19,143 @@ _LEVELS = {
     "DEBUG": logging.DEBUG,
 }
 
-def setup_logger(name: str) -> logging.Logger:
+# name -> configured logger / its background writer
+_LOGGERS: Dict[str, logging.Logger] = {}
+_LISTENERS: Dict[str, QueueListener] = {}
+_LOCK = threading.Lock()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    One valid JSON object per line. Structured fields passed via
+    log_kv(...) (record.kv) are emitted as top-level keys.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        doc = {
+            "t": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "lv": record.levelname,
+            "lg": record.name,
+            "msg": record.getMessage(),
+        }
+        kv = getattr(record, "kv", None)
+        if kv:
+            for k, v in kv.items():
+                doc.setdefault(k, v)
+        if record.exc_text:  # traceback rendered by _TracebackQueueHandler
+            doc["exc"] = record.exc_text
+        elif record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+
+class _TracebackQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare() folds the traceback into msg and drops exc_info. Keep
+    msg as the bare message and hand the traceback over as record.exc_text, so the
+    listener's formatter decides: plain/raw append it, JSON puts it in "exc".
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+def setup_logger(name: str, raw: bool = False) -> logging.Logger:
     """
     Create or return a logger that writes to logs/<name>.log using env settings:
-      LOG_DIR (default 'logs'), LOG_LEVEL (default 'INFO'), LOG_FORMAT ('plain' or 'json')
+      LOG_DIR (default 'logs'), LOG_LEVEL (default 'INFO'), LOG_FORMAT ('plain' or 'json'),
+      LOG_MAX_BYTES (default 10 MB), LOG_BACKUP_COUNT (default 5)
+
+    Built once per name: env lookups, mkdir and handler wiring only happen on the
+    first call. Callers only enqueue records; a background QueueListener thread does
+    the formatting + file I/O (rotating at LOG_MAX_BYTES), so hot paths never block on disk.
+
+    raw=True writes messages verbatim (caller already produced the full line, e.g. JSON spans).
     """
-    log_dir = os.getenv("LOG_DIR", "logs")
-    log_level = _LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
-    log_format = os.getenv("LOG_FORMAT", "plain").lower()
+    logger = _LOGGERS.get(name)
+    if logger is not None:
+        return logger
 
-    Path(log_dir).mkdir(parents=True, exist_ok=True)
-    logfile = Path(log_dir) / f"{name}.log"
+    with _LOCK:
+        logger = _LOGGERS.get(name)
+        if logger is not None:
+            return logger
 
-    logger = logging.getLogger(name)
-    logger.setLevel(log_level)
-    logger.propagate = False  # avoid duplicate lines from root
+        log_dir = os.getenv("LOG_DIR", "logs")
+        log_level = _LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+        log_format = os.getenv("LOG_FORMAT", "plain").lower()
+        max_bytes = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+        backup_count = int(os.getenv("LOG_BACKUP_COUNT", "5"))
 
-    # If handler already attached (hot-reload), don't add another
-    if not any(isinstance(h, logging.FileHandler) and getattr(h, "_app_logfile", None) == str(logfile) for h in logger.handlers):
-        fh = logging.FileHandler(logfile, encoding="utf-8")
-        fh._app_logfile = str(logfile)  # mark for dedup
+        Path(log_dir).mkdir(parents=True, exist_ok=True)
+        logfile = Path(log_dir) / f"{name}.log"
 
-        if log_format == "json":
-            # Minimal JSON lines; easy to expand later
-            fmt = '{"t":"%(asctime)s","lv":"%(levelname)s","lg":"%(name)s","msg":"%(message)s"}'
-        else:
-            fmt = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+        logger = logging.getLogger(name)
+        logger.setLevel(log_level)
+        logger.propagate = False  # avoid duplicate lines from root
+
+        # Hot-reload: drop a handler left behind by a previous import of this module
+        for h in list(logger.handlers):
+            if getattr(h, "_app_logfile", None) is not None:
+                logger.removeHandler(h)
 
-        fh.setFormatter(logging.Formatter(fmt))
+        fh = RotatingFileHandler(logfile, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        if raw:
+            fh.setFormatter(logging.Formatter("%(message)s"))
+        elif log_format == "json":
+            fh.setFormatter(JsonLineFormatter())
+        else:
+            fh.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s"))
         fh.setLevel(log_level)
-        logger.addHandler(fh)
 
-    return logger
+        q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        qh = _TracebackQueueHandler(q)
+        qh._app_logfile = str(logfile)  # mark for dedup
+        logger.addHandler(qh)
+
+        listener = QueueListener(q, fh, respect_handler_level=True)
+        listener.start()
+
+        _LISTENERS[name] = listener
+        _LOGGERS[name] = logger
+        return logger
+
+
+def shutdown_logging() -> None:
+    """
+    Drain queues, stop writer threads and close files. Registered with atexit;
+    the next setup_logger() call rebuilds the pipeline.
+    """
+    with _LOCK:
+        for name, listener in list(_LISTENERS.items()):
+            listener.stop()
+            for h in listener.handlers:
+                h.close()
+            logger = _LOGGERS.get(name)
+            if logger is not None:
+                for h in list(logger.handlers):
+                    if getattr(h, "_app_logfile", None) is not None:
+                        logger.removeHandler(h)
+        _LISTENERS.clear()
+        _LOGGERS.clear()
+
+
+atexit.register(shutdown_logging)
+
 
 def log_kv(logger: logging.Logger, **kv):
     """
     Convenience: logs a single line with key=val pairs.
     Example: log_kv(log, stage="parse-pages", doc_id=1, elapsed_ms=1234)
+    In JSON mode the pairs are also emitted as real JSON fields.
     """
+    if not logger.isEnabledFor(logging.INFO):
+        return
     parts = [f"{k}={v}" for k, v in kv.items()]
-    logger.info(" ".join(parts))
+    logger.info(" ".join(parts), extra={"kv": kv})
@@ -1,8 +1,12 @@
 ﻿# app/main.py
 from __future__ import annotations
 
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+from time import perf_counter
+
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel, constr
@@ -11,16 +15,28 @@ from pydantic import BaseModel, constr
 from .db import SessionLocal            # SQLAlchemy session factory
 from .db_check import check_db          # existing DB health helper
 from .models import Product             # ORM model for products
+from . import metrics                   # in-process metrics registry (/metrics)
+from .timing import span, set_request_id, reset_request_id
+from .pdf_cache import PDF_CACHE                # open PyMuPDF handles (closed on shutdown)
+from .embeddings import shutdown_embed_pools    # EMBED_WORKERS process pools (stopped on shutdown)
 
 # Routers
 from app.routers import chunks as chunks_router         # /admin/chunks/...
 from app.routers import documents as documents_router   # /admin/documents/...
 from app.routers import search as search_router         # /search
+from app.routers import traces as traces_router         # /admin/traces
 
 # ---------------------------
 # Create FastAPI app FIRST
 # ---------------------------
-app = FastAPI(title="APP Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    yield
+    PDF_CACHE.close_all()  # release cached PDF handles before the process exits
+    shutdown_embed_pools()
+
+
+app = FastAPI(title="APP Backend", version="0.1.0", lifespan=lifespan)
 
 # ---------------------------
 # CORS for local dev (frontend on :3000)
@@ -37,12 +53,58 @@ app.add_middleware(
     allow_headers=["*"],   # Content-Type, Authorization, etc.
 )
 
+# ---------------------------
+# Per-route request metrics
+# ---------------------------
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Count requests and observe latency per route *template* (e.g. /admin/documents/{doc_id}/toc)
+    so label cardinality stays bounded.
+    """
+    start = perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+        metrics.HTTP_LATENCY.observe(perf_counter() - start, method=request.method, route=path)
+
+# ---------------------------
+# Request id + root span
+# ---------------------------
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """
+    Bind a request id (incoming X-Request-ID or a fresh one) and open the root span.
+    Both live in contextvars, so spans opened inside routes (including sync routes
+    running in the threadpool) become children of this one.
+    """
+    incoming = (request.headers.get("x-request-id") or "")[:64] or None
+    token = set_request_id(incoming)
+    try:
+        with span(f"{request.method} {request.url.path}", method=request.method) as root:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if getattr(route, "path", None):
+                root.name = f"{request.method} {route.path}"
+            root.set(status=response.status_code)
+            response.headers["X-Request-ID"] = root.trace_id
+            return response
+    finally:
+        reset_request_id(token)
+
 # ---------------------------
 # Register routers
 # ---------------------------
 app.include_router(chunks_router.router)       # /admin/chunks/...
 app.include_router(documents_router.router)    # /admin/documents/...
 app.include_router(search_router.router)       # /search
+app.include_router(traces_router.router)       # /admin/traces
 
 # ---------------------------
 # Per-request DB session dep
@@ -84,6 +146,11 @@ def ping():
 def health_db():
     return check_db()
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus text exposition of app/metrics.py REGISTRY."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # ---------------------------
 # Product CRUD (minimal)
 # ---------------------------
@@ -0,0 +1,285 @@
+"""
+app/metrics.py
+Tiny in-process metrics registry with Prometheus text exposition.
+
+No external dependency: counters, gauges and histograms keyed by label values,
+each guarded by its own lock (an observe() is a dict lookup + bisect + a few adds),
+cheap enough to leave on in production.
+
+Public API you can import elsewhere:
+    REGISTRY                      -> default Registry rendered at GET /metrics
+    Counter / Gauge / Histogram   -> metric types (registered on creation)
+    record_cache(cache, hit)      -> shared cache hit/miss counter
+    render() -> str               -> exposition text for REGISTRY
+
+Pre-declared metrics used across the app live at the bottom of this module.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_num(x: float) -> str:
+    if x == math.inf:
+        return "+Inf"
+    if float(x).is_integer():
+        return str(int(x))
+    return repr(float(x))
+
+
+class Registry:
+    """Holds metrics in registration order and renders them."""
+
+    def __init__(self) -> None:
+        self._metrics: List["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"metric already registered: {metric.name}")
+            self._metrics.append(metric)
+
+    def get(self, name: str) -> Optional["_Metric"]:
+        for m in self._metrics:
+            if m.name == name:
+                return m
+        return None
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in list(self._metrics):
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), registry: Optional[Registry] = REGISTRY) -> None:
+        self.name = name
+        self.help = help
+        self.label_names: Tuple[str, ...] = tuple(labels)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def samples(self) -> List[str]:  # pragma: no cover - overridden
+        return []
+
+
+class Counter(_Metric):
+    """Monotonic counter. Name should end in _total."""
+    kind = "counter"
+
+    def __init__(self, *a, **kw) -> None:
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    Point-in-time value. Either set()/inc()/dec() it, or pass `callback`
+    (no labels) to read the value lazily at scrape time.
+    """
+    kind = "gauge"
+
+    def __init__(self, *a, callback: Optional[Callable[[], float]] = None, **kw) -> None:
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        if self._callback is not None:
+            return float(self._callback())
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                return [f"{self.name} {_fmt_num(float(self._callback()))}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.label_names, k)} {_fmt_num(v)}" for k, v in items]
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram (per label set: bucket counts, sum, count)."""
+    kind = "histogram"
+
+    def __init__(self, *a, buckets: Sequence[float] = DEFAULT_BUCKETS, **kw) -> None:
+        super().__init__(*a, **kw)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = state
+            state[0][idx] += 1
+            state[1][0] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        out: List[str] = []
+        for key, (counts, total) in items:
+            running = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                running += c
+                le = 'le="' + _fmt_num(bound) + '"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {running}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_num(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {running}")
+        return out
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# -----------------------------
+# Shared metrics
+# -----------------------------
+HTTP_REQUESTS = Counter(
+    "app_http_requests_total", "HTTP requests by route template and status.",
+    labels=("method", "route", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "app_http_request_duration_seconds", "HTTP request latency by route template.",
+    labels=("method", "route"),
+)
+STAGE_LATENCY = Histogram(
+    "app_stage_duration_seconds", "Duration of timed ingestion/search stages.",
+    labels=("stage",),
+)
+STAGE_RUNS = Counter(
+    "app_stage_runs_total", "Timed stage executions by outcome.",
+    labels=("stage", "outcome"),
+)
+EMBED_BATCH_SIZE = Histogram(
+    "app_embedder_batch_size", "Texts per embedder call.",
+    labels=("provider",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+EMBED_LATENCY = Histogram(
+    "app_embedder_duration_seconds", "Embedder call latency.",
+    labels=("provider",),
+)
+EMBED_POOL_BATCHES = Counter(
+    "app_embed_pool_batches_total", "embed_texts calls through the process pool by path (pool, inline = batch too small, fallback = pool broke).",
+    labels=("provider", "path"),
+)
+DB_CONNECTIONS = Counter(
+    "app_db_connections_opened_total", "psycopg connections opened by module.",
+    labels=("module",),
+)
+CACHE_REQUESTS = Counter(
+    "app_cache_requests_total", "Cache lookups by cache name and result (hit/miss).",
+    labels=("cache", "result"),
+)
+
+COALESCED = Counter(
+    "app_singleflight_calls_total", "Single-flight calls by group and role (leader ran it, follower shared it).",
+    labels=("group", "role"),
+)
+ADMISSION = Counter(
+    "app_admission_total", "Admission decisions by limiter (admitted, queued, shed = queue full, timeout = waited too long).",
+    labels=("limiter", "outcome"),
+)
+ADMISSION_ACTIVE = Gauge(
+    "app_admission_active", "Requests currently holding an admission slot.",
+    labels=("limiter",),
+)
+ADMISSION_WAITING = Gauge(
+    "app_admission_waiting", "Requests waiting in the admission queue.",
+    labels=("limiter",),
+)
+SEARCH_DEGRADED = Counter(
+    "app_search_degraded_total", "/search responses served in degraded mode, by reason and source.",
+    labels=("reason", "source"),
+)
+CIRCUIT_STATE = Gauge(
+    "app_circuit_state", "Circuit breaker state (0 closed, 1 half_open, 2 open).",
+    labels=("breaker",),
+)
+CIRCUIT_CALLS = Counter(
+    "app_circuit_calls_total", "Calls through a circuit breaker by outcome (success, error, slow, rejected).",
+    labels=("breaker", "outcome"),
+)
+HEDGE_ATTEMPTS = Counter(
+    "app_hedge_attempts_total", "Hedged-call attempts by kind (primary, hedge) and outcome (win, error, cancelled).",
+    labels=("hedger", "kind", "outcome"),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,147 @@
+# app/pdf_cache.py
+"""
+Bounded LRU of open PyMuPDF documents, shared by the TOC / page endpoints.
+
+Key: (resolved path, mtime_ns, size) -- a rewritten file gets a new key, and the
+old handle ages out. Bounds (env):
+  PDF_CACHE_MAX_DOCS (default 8)   -> max open handles
+  PDF_CACHE_MAX_MB   (default 256) -> max sum of file sizes (proxy for MuPDF memory)
+  0 for either disables caching (every lease opens + closes).
+
+A fitz.Document must not be used from two threads at once, so callers lease it:
+
+    with PDF_CACHE.open(path) as pdf:
+        pdf.load_page(0) ...
+
+The lease holds that entry's lock. Entries evicted while leased are closed when the
+lease ends. close_all() runs on app shutdown (and atexit).
+"""
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+import fitz  # PyMuPDF
+
+from .metrics import Gauge, record_cache
+
+Key = Tuple[str, int, int]
+
+
+class _Entry:
+    __slots__ = ("key", "doc", "size", "lock", "leases", "evicted")
+
+    def __init__(self, key: Key, doc: "fitz.Document", size: int) -> None:
+        self.key = key
+        self.doc = doc
+        self.size = size
+        self.lock = threading.Lock()
+        self.leases = 0
+        self.evicted = False
+
+
+class PdfCache:
+    def __init__(self, max_docs: int = 8, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(path: str) -> Key:
+        p = Path(path).resolve()
+        st = p.stat()
+        return (str(p), st.st_mtime_ns, st.st_size)
+
+    def _close(self, entry: _Entry) -> None:
+        # caller holds self._lock; close now if idle, else when the last lease ends
+        entry.evicted = True
+        if entry.leases == 0 and not entry.doc.is_closed:
+            entry.doc.close()
+
+    def _evict_locked(self) -> None:
+        while self._entries and (len(self._entries) > self.max_docs or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._close(entry)
+
+    @contextmanager
+    def open(self, path: str) -> Iterator["fitz.Document"]:
+        """Lease an open document for `path` (opened on miss). Raises like fitz.open / os.stat."""
+        key = self.key_for(path)
+        if self.max_docs <= 0 or self.max_bytes <= 0:
+            record_cache("pdf", False)
+            doc = fitz.open(key[0])
+            try:
+                yield doc
+            finally:
+                doc.close()
+            return
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.leases += 1
+        record_cache("pdf", entry is not None)
+
+        if entry is None:
+            doc = fitz.open(key[0])  # outside the global lock: opening can be slow
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = _Entry(key, doc, key[2])
+                    self._entries[key] = entry
+                    self._bytes += entry.size
+                    entry.leases += 1
+                    self._evict_locked()  # may mark this very entry (file larger than the budget)
+                else:  # another thread opened it meanwhile
+                    self._entries.move_to_end(key)
+                    entry.leases += 1
+                    doc.close()
+
+        try:
+            with entry.lock:
+                yield entry.doc
+        finally:
+            with self._lock:
+                entry.leases -= 1
+                if entry.evicted and entry.leases == 0 and not entry.doc.is_closed:
+                    entry.doc.close()
+
+    def invalidate(self, path: str) -> None:
+        """Drop every cached handle for `path` (any mtime/size)."""
+        p = str(Path(path).resolve())
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == p]:
+                entry = self._entries.pop(key)
+                self._bytes -= entry.size
+                self._close(entry)
+
+    def close_all(self) -> None:
+        with self._lock:
+            while self._entries:
+                _, entry = self._entries.popitem(last=False)
+                self._close(entry)
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"docs": len(self._entries), "bytes": self._bytes,
+                    "max_docs": self.max_docs, "max_bytes": self.max_bytes}
+
+
+PDF_CACHE = PdfCache(
+    max_docs=int(os.getenv("PDF_CACHE_MAX_DOCS", "8")),
+    max_bytes=int(float(os.getenv("PDF_CACHE_MAX_MB", "256")) * 1024 * 1024),
+)
+atexit.register(PDF_CACHE.close_all)
+
+Gauge("app_pdf_cache_docs", "Open PyMuPDF documents held by the PDF cache.",
+      callback=lambda: len(PDF_CACHE._entries))
+Gauge("app_pdf_cache_bytes", "Sum of file sizes of cached PDF documents.",
+      callback=lambda: PDF_CACHE._bytes)
@@ -1,16 +1,19 @@
 # app/routers/chunks.py
 from __future__ import annotations
 from fastapi import APIRouter, HTTPException
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import os
 import time
 import logging
 
 import psycopg
 from psycopg.rows import dict_row
+from pydantic import BaseModel, Field
 
-from app.embeddings import embed_one, get_embedder
-from app.timing import timed_block
+from app.embeddings import embed_one, embed_texts, get_embedder
+from app.embedding_store import bulk_upsert_embeddings, fetch_texts
+from app.timing import timed_block, span
+from app.metrics import DB_CONNECTIONS
 
 router = APIRouter(prefix="/admin/chunks", tags=["chunks"])
 
@@ -21,6 +24,7 @@ if not DATABASE_URL:
 log = logging.getLogger(__name__)
 
 def _get_conn():
+    DB_CONNECTIONS.inc(module="chunks")
     return psycopg.connect(DATABASE_URL, row_factory=dict_row)
 
 def _fetch_chunk_text(conn, chunk_id: int) -> str:
@@ -42,26 +46,6 @@ def _fetch_chunk_text(conn, chunk_id: int) -> str:
             return row["text"]
     raise HTTPException(status_code=404, detail=f"Chunk {chunk_id} not found or has no text/content.")
 
-def _upsert_embedding(conn, chunk_id: int, vec, model_name: str) -> None:
-    """
-    Upsert into chunk_embeddings.
-    We pass the vector as a Postgres array literal and cast to vector.
-    """
-    array_literal = "{" + ",".join(str(float(x)) for x in vec) + "}"
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO chunk_embeddings (chunk_id, embedding, model)
-            VALUES (%s, %s::float8[]::vector, %s)
-            ON CONFLICT (chunk_id)
-            DO UPDATE SET
-                embedding = EXCLUDED.embedding,
-                model     = EXCLUDED.model,
-                created_at= NOW();
-            """,
-            (chunk_id, array_literal, model_name),
-        )
-
 @router.post("/{chunk_id}/embed")
 def embed_chunk(chunk_id: int) -> Dict[str, Any]:
     """
@@ -73,7 +57,7 @@ def embed_chunk(chunk_id: int) -> Dict[str, Any]:
     with timed_block("embed_chunk"), _get_conn() as conn:
         text = _fetch_chunk_text(conn, chunk_id)
         vec = embed_one(text)
-        _upsert_embedding(conn, chunk_id, vec, provider)
+        bulk_upsert_embeddings(conn, [chunk_id], [vec], provider)  # same write path as the bulk routes
         conn.commit()
 
     elapsed_ms = int((time.perf_counter() - t0) * 1000)
@@ -85,3 +69,72 @@ def embed_chunk(chunk_id: int) -> Dict[str, Any]:
         "elapsed_ms": elapsed_ms,
         "saved": True,
     }
+
+
+MAX_BULK_IDS = 10000
+
+
+class BulkEmbedIn(BaseModel):
+    chunk_ids: Optional[List[int]] = None   # explicit ids...
+    id_from: Optional[int] = None           # ...or an inclusive id range
+    id_to: Optional[int] = None
+    batch_size: int = Field(default=64, ge=1, le=1024)
+
+
+@router.post("/embed")
+def embed_chunks_bulk(payload: BulkEmbedIn) -> Dict[str, Any]:
+    """
+    Embed many chunks at once: one query for all texts, embedder calls per batch_size,
+    one bulk upsert per batch. Per-id status: embedded | not_found | empty.
+    """
+    if payload.chunk_ids:
+        ids = list(dict.fromkeys(payload.chunk_ids))  # dedupe, keep order
+    elif payload.id_from is not None and payload.id_to is not None:
+        if payload.id_to < payload.id_from:
+            raise HTTPException(status_code=400, detail="id_to must be >= id_from")
+        ids = list(range(payload.id_from, payload.id_to + 1))
+    else:
+        raise HTTPException(status_code=400, detail="Provide chunk_ids or id_from + id_to")
+    if len(ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_IDS} chunk ids per request")
+
+    provider = get_embedder().name
+    t0 = time.perf_counter()
+    status: Dict[int, str] = {}
+    with timed_block("embed_chunks_bulk", requested=len(ids)), _get_conn() as conn:
+        with span("embed_chunks_bulk.fetch"):
+            texts = fetch_texts(conn, ids)
+
+        todo: List[int] = []
+        for cid in ids:
+            txt = texts.get(cid)
+            if cid not in texts:
+                status[cid] = "not_found"
+            elif not (txt or "").strip():
+                status[cid] = "empty"
+            else:
+                todo.append(cid)
+
+        for i in range(0, len(todo), payload.batch_size):
+            batch = todo[i:i + payload.batch_size]
+            with span("embed_chunks_bulk.embed", batch=len(batch)):
+                vecs = embed_texts([texts[cid] for cid in batch])
+            with span("embed_chunks_bulk.upsert", rows=len(batch)):
+                bulk_upsert_embeddings(conn, batch, vecs, provider)
+                conn.commit()
+            for cid in batch:
+                status[cid] = "embedded"
+
+    elapsed_ms = int((time.perf_counter() - t0) * 1000)
+    counts: Dict[str, int] = {}
+    for s in status.values():
+        counts[s] = counts.get(s, 0) + 1
+    log.info("embed_chunks_bulk requested=%s embedded=%s provider=%s elapsed_ms=%s",
+             len(ids), counts.get("embedded", 0), provider, elapsed_ms)
+    return {
+        "provider": provider,
+        "requested": len(ids),
+        "counts": counts,
+        "elapsed_ms": elapsed_ms,
+        "results": [{"chunk_id": cid, "status": status[cid]} for cid in ids],
+    }
@@ -1,5 +1,6 @@
 # app/routers/documents.py
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import Response
 from pydantic import BaseModel, AnyHttpUrl
 from typing import Optional, List, Tuple, Dict, Any
 import os
@@ -12,8 +13,15 @@ import time
 import logging
 
 from app.text_utils import normalize_text
-from app.timing import timed_block
+from app.toc_utils import compute_toc_ranges, leaf_ranges
+from app.chunking import get_chunker, iter_sections_streaming
+from app.chunk_export import export_chunks
+from app.embedding_store import bulk_upsert_embeddings
+from app.document_meta import ensure_meta, toc_items
+from app.pdf_cache import PDF_CACHE
+from app.timing import timed_block, span
 from app.embeddings import get_embedder, embed_texts  # <-- pluggable provider
+from app.metrics import DB_CONNECTIONS
 
 import psycopg
 from psycopg.rows import dict_row
@@ -24,6 +32,10 @@ import fitz  # PyMuPDF  <-- used for TOC + page text extraction
 router = APIRouter(prefix="/admin/documents", tags=["documents"])
 logger = logging.getLogger(__name__)
 
+# Streaming sizes for large documents (rows per server-side fetch / per write batch)
+PAGE_FETCH = 64
+CHUNK_WRITE_BATCH = 500
+
 # --- DB connection helper ---
 def get_conn():
     """
@@ -33,6 +45,7 @@ def get_conn():
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL is not set")
+    DB_CONNECTIONS.inc(module="documents")
     # default row_factory per-cursor; we set dict_row on cursor usages
     return psycopg.connect(url)
 
@@ -43,33 +56,6 @@ def _safe_filename(name: str) -> str:
     """
     return "".join(c if (c.isalnum() or c in "-_.") else "_" for c in name)
 
-def _split_by_paragraphs(text: str, max_chars: int) -> List[str]:
-    """
-    Split long text into chunks not exceeding max_chars, preferring paragraph
-    boundaries (double newlines). No overlap by default.
-    """
-    if len(text) <= max_chars:
-        return [text] if text else []
-    paras = [p.strip() for p in text.split("\n\n") if p.strip()]
-    chunks: List[str] = []
-    buf = ""
-    for p in paras:
-        if len(p) > max_chars:
-            if buf:
-                chunks.append(buf.strip())
-                buf = ""
-            for i in range(0, len(p), max_chars):
-                chunks.append(p[i:i+max_chars].strip())
-            continue
-        if len(buf) + (2 if buf else 0) + len(p) <= max_chars:
-            buf = f"{buf}\n\n{p}" if buf else p
-        else:
-            chunks.append(buf.strip())
-            buf = p
-    if buf:
-        chunks.append(buf.strip())
-    return chunks
-
 # --- Pydantic input models ---
 class DocumentIn(BaseModel):
     product_id: int
@@ -274,11 +260,12 @@ def set_local_path(doc_id: int, payload: LocalPathIn):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to set local_path: {e}")
 
-# --------- TOC (on-the-fly from PDF) ----------
+# --------- TOC (from document_meta; PDF read only on first use / change) ----------
 @router.get("/{doc_id}/toc")
 def get_document_toc(doc_id: int):
     """
-    Read the PDF at documents.local_path and return the TOC.
+    Return the PDF's TOC. Served from document_meta; the PDF at documents.local_path
+    is only opened when the metadata row is missing or the file changed.
     """
     sql = "SELECT id, title, local_path FROM documents WHERE id = %s"
     try:
@@ -288,42 +275,86 @@ def get_document_toc(doc_id: int):
                 doc_row = cur.fetchone()
                 if not doc_row:
                     raise HTTPException(status_code=404, detail="document not found")
-                local_path = doc_row["local_path"]
-                if not local_path:
-                    raise HTTPException(status_code=400, detail="local_path is empty; set it first")
-                if not Path(local_path).exists():
-                    raise HTTPException(status_code=400, detail=f"local_path not found on disk: {local_path}")
+            meta = _load_meta(conn, doc_id, doc_row["local_path"])
 
-        try:
-            pdf = fitz.open(local_path)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"failed to open PDF: {e}")
+        return {"document_id": doc_id, "title": doc_row["title"], "toc": toc_items(meta)}
 
-        toc = pdf.get_toc(simple=False)  # list of [level, title, page]
-        pdf.close()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read TOC: {e}")
 
-        if not toc:
-            return {"document_id": doc_id, "title": doc_row["title"], "toc": []}
+# --------- Document metadata (page_count, TOC, hash, mtime) ----------
+def _load_meta(conn, doc_id: int, local_path: Optional[str], refresh: bool = False, pdf=None) -> Dict[str, Any]:
+    """ensure_meta() with the HTTP errors the routes expect."""
+    try:
+        return ensure_meta(conn, doc_id, local_path, refresh=refresh, pdf=pdf)
+    except FileNotFoundError:
+        if not local_path:
+            raise HTTPException(status_code=400, detail="local_path is empty; set it first")
+        raise HTTPException(status_code=400, detail=f"local_path not found on disk: {local_path}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"failed to open/read PDF: {e}")
 
-        items = []
-        for entry in toc:
-            level = int(entry[0]) if len(entry) > 0 else 1
-            title = str(entry[1]).strip() if len(entry) > 1 else ""
-            page = int(entry[2]) if len(entry) > 2 else 1
-            items.append({"level": level, "title": title, "page_number": page})
+@router.get("/{doc_id}/meta")
+def get_document_meta(doc_id: int, refresh: bool = False):
+    """
+    Stored PDF metadata (page_count, toc, sha256, file_size, file_mtime).
+    Filled on first use; refresh=true re-reads the file.
+    """
+    try:
+        with get_conn() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute("SELECT local_path FROM documents WHERE id = %s", (doc_id,))
+                doc_row = cur.fetchone()
+                if not doc_row:
+                    raise HTTPException(status_code=404, detail="document not found")
+            meta = _load_meta(conn, doc_id, doc_row["local_path"], refresh=refresh)
+        return {**meta, "document_id": doc_id, "toc_entries": len(meta.get("toc") or [])}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read document meta: {e}")
 
-        return {"document_id": doc_id, "title": doc_row["title"], "toc": items}
+@router.get("/{doc_id}/pages/{page_number}/render")
+def render_page(doc_id: int, page_number: int, zoom: float = 1.5):
+    """
+    Render one page (1-based) to PNG for previews. Uses the shared PDF handle cache,
+    so a dashboard paging through a hot document does not reparse it per request.
+    """
+    if not 0.1 <= zoom <= 4.0:
+        raise HTTPException(status_code=400, detail="zoom must be between 0.1 and 4.0")
+    try:
+        with get_conn() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute("SELECT local_path FROM documents WHERE id = %s", (doc_id,))
+                doc_row = cur.fetchone()
+        if not doc_row:
+            raise HTTPException(status_code=404, detail="document not found")
+        local_path = doc_row["local_path"]
+        if not local_path or not Path(local_path).exists():
+            raise HTTPException(status_code=400, detail="valid local_path required")
+
+        with span("render-page", document_id=doc_id, page=page_number), PDF_CACHE.open(local_path) as pdf:
+            if not 1 <= page_number <= pdf.page_count:
+                raise HTTPException(status_code=404, detail=f"page {page_number} out of range 1..{pdf.page_count}")
+            pix = pdf.load_page(page_number - 1).get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            png = pix.tobytes("png")
+        return Response(content=png, media_type="image/png")
 
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read TOC: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to render page: {e}")
 
 # --------- Store TOC to DB ----------
 @router.post("/{doc_id}/store-toc")
 def store_document_toc(doc_id: int):
     """
-    Read the PDF's TOC and persist it into document_toc.
+    Persist the PDF's TOC (from document_meta) into document_toc,
+    including page_to (end of range) and raw_path (section path).
     """
     sql_doc = "SELECT id, title, local_path FROM documents WHERE id = %s"
     try:
@@ -333,27 +364,26 @@ def store_document_toc(doc_id: int):
                 doc = cur.fetchone()
                 if not doc:
                     raise HTTPException(status_code=404, detail="document not found")
+            meta = _load_meta(conn, doc_id, doc["local_path"])
 
-        lp = doc["local_path"]
-        if not lp or not Path(lp).exists():
-            raise HTTPException(status_code=400, detail="valid local_path required")
-
-        try:
-            pdf = fitz.open(lp)
-            toc = pdf.get_toc(simple=False) or []
-            pdf.close()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"failed to open/read PDF: {e}")
+        toc = meta["toc"]
+        page_count = int(meta["page_count"])
 
         if not toc:
             return {"document_id": doc_id, "stored": 0, "note": "No TOC found in PDF."}
 
-        rows = []
+        entries: List[Tuple[int, str, int, int]] = []
         for i, entry in enumerate(toc, start=1):
             level = int(entry[0]) if len(entry) > 0 else 1
             title = str(entry[1]).strip() if len(entry) > 1 else ""
             page_from = int(entry[2]) if len(entry) > 2 else 1
-            rows.append((doc_id, level, title, page_from, None, i, None))
+            entries.append((level, title, page_from, i))
+
+        # page_to + raw_path (section path) from the same single-pass builder /chunk-toc uses
+        rows = [
+            (doc_id, r.level, r.title, r.start, r.end, r.order_index, r.path)
+            for r in compute_toc_ranges(entries, page_count)
+        ]
 
         with get_conn() as conn:
             with conn.cursor() as cur:
@@ -379,7 +409,7 @@ def get_stored_toc(doc_id: int, limit: int = 2000):
     List the TOC previously stored in document_toc for this document.
     """
     sql = """
-        SELECT level, title, page_from, page_to, order_index, created_at
+        SELECT level, title, page_from, page_to, order_index, raw_path, created_at
         FROM document_toc
         WHERE document_id = %s
         ORDER BY order_index ASC
@@ -418,23 +448,22 @@ def parse_pages(doc_id: int):
         if not Path(local_path).exists():
             raise HTTPException(status_code=400, detail=f"local_path not found: {local_path}")
 
-        # 2) Open PDF and extract text per page
-        try:
-            pdf = fitz.open(local_path)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"failed to open PDF: {e}")
-
-        with timed_block("parse-pages"):
-            records = []
-            empty_pages = 0
-            for i, page in enumerate(pdf, start=1):
-                text = page.get_text("text") or ""
-                text = text.replace("\x00", "")
-                text = normalize_text(text)
-                if not text.strip():
-                    empty_pages += 1
-                records.append((doc_id, i, text))
-            pdf.close()
+        # 2) Lease the PDF from the shared handle cache and extract text per page
+        with PDF_CACHE.open(local_path) as pdf:
+            with get_conn() as conn:
+                _load_meta(conn, doc_id, local_path, pdf=pdf)  # fills/refreshes document_meta from the same handle
+
+            with timed_block("parse-pages", document_id=doc_id) as sp:
+                records = []
+                empty_pages = 0
+                for i, page in enumerate(pdf, start=1):
+                    text = page.get_text("text") or ""
+                    text = text.replace("\x00", "")
+                    text = normalize_text(text)
+                    if not text.strip():
+                        empty_pages += 1
+                    records.append((doc_id, i, text))
+                sp.set(pages=len(records), empty_pages=empty_pages)
 
         # 3) Upsert into document_pages
         upsert_sql = """
@@ -443,7 +472,7 @@ def parse_pages(doc_id: int):
             ON CONFLICT (document_id, page_number)
             DO UPDATE SET content = EXCLUDED.content
         """
-        with get_conn() as conn:
+        with span("parse-pages.upsert", rows=len(records)), get_conn() as conn:
             with conn.cursor() as cur:
                 cur.executemany(upsert_sql, records)
                 conn.commit()
@@ -468,33 +497,53 @@ def parse_pages(doc_id: int):
 
 # --------- Chunk by stored TOC ----------
 @router.post("/{doc_id}/chunk-toc")
-def chunk_by_toc(doc_id: int, max_chars: int = 2000):
+def chunk_by_toc(
+    doc_id: int,
+    max_chars: int = 2000,
+    leaf_only: bool = False,
+    strategy: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+):
     """
     Build section chunks using the STORED TOC (document_toc) + cleaned page text (document_pages).
     - For each TOC entry, compute its page range (until the next entry of same-or-higher level).
-    - Concatenate the text of those pages from document_pages.
-    - If the section text exceeds max_chars, split it into multiple chunks on paragraph boundaries.
-    - Upsert into document_chunks (document_id, section_path, chunk_index) as unique key.
+    - Stream document_pages in page order from a server-side cursor through a sliding
+      window; a section is chunked as soon as its last page has been read, and pages
+      no pending section needs are dropped (memory ~ widest open section, not the document).
+    - leaf_only=true: each entry keeps only the pages before its first child, so parents
+      don't duplicate their children's text (previously stored parent chunks are not deleted).
+    - Split each section with a chunk strategy (app/chunking.py; default CHUNK_STRATEGY or 'paragraph'):
+        paragraph -> max_chars, paragraph boundaries (original behaviour)
+        token     -> max_tokens per chunk, whole sentences, overlap_tokens repeated between chunks
+    - Upsert into document_chunks (document_id, section_path, chunk_index) as unique key,
+      stamping the document's product_id so search can filter without a JOIN; written
+      in batches of CHUNK_WRITE_BATCH rows, each committed.
     """
     try:
-        # 1) Get document + PDF page_count (to bound ranges)
-        sql_get_doc = "SELECT id, title, local_path FROM documents WHERE id = %s"
+        chunker = get_chunker(strategy, max_chars=max_chars, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # 1) Get document + page_count (to bound ranges) from document_meta -- pure DB, no PDF open
+        sql_get_doc = """
+            SELECT d.id, d.product_id, d.title, d.local_path, m.page_count
+            FROM documents d
+            LEFT JOIN document_meta m ON m.document_id = d.id
+            WHERE d.id = %s
+        """
         with get_conn() as conn:
             with conn.cursor(row_factory=dict_row) as cur:
                 cur.execute(sql_get_doc, (doc_id,))
                 doc_row = cur.fetchone()
                 if not doc_row:
                     raise HTTPException(status_code=404, detail="document not found")
-                local_path = doc_row["local_path"]
-                if not local_path or not Path(local_path).exists():
-                    raise HTTPException(status_code=400, detail="valid local_path required")
-
-        try:
-            pdf = fitz.open(local_path)
-            page_count = pdf.page_count
-            pdf.close()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"failed to open PDF: {e}")
+                product_id = doc_row["product_id"]
+            page_count = doc_row["page_count"]
+            if page_count is None:  # documents ingested before document_meta existed
+                page_count = _load_meta(conn, doc_id, doc_row["local_path"])["page_count"]
+            page_count = int(page_count)
 
         # 2) Read STORED TOC (ordered)
         sql_toc = """
@@ -504,7 +553,7 @@ def chunk_by_toc(doc_id: int, max_chars: int = 2000):
             ORDER BY order_index ASC
         """
         entries: List[Tuple[int, str, int, int]] = []
-        with get_conn() as conn:
+        with span("chunk-toc.load-toc"), get_conn() as conn:
             with conn.cursor(row_factory=dict_row) as cur:
                 cur.execute(sql_toc, (doc_id,))
                 for r in cur.fetchall():
@@ -513,88 +562,74 @@ def chunk_by_toc(doc_id: int, max_chars: int = 2000):
         if not entries:
             return {"document_id": doc_id, "title": doc_row["title"], "chunks_created": 0, "note": "No stored TOC found. Run /store-toc first."}
 
-        # 3) Compute page ranges by "next same-or-higher"
-        ranges: List[Tuple[int, str, int, int, int]] = []
-        for idx, (lvl, title, start, oi) in enumerate(entries):
-            end = page_count
-            for j in range(idx + 1, len(entries)):
-                nlvl, _, nstart, _ = entries[j]
-                if nlvl <= lvl:
-                    end = max(nstart - 1, start)
-                    break
-            ranges.append((lvl, title, start, end, oi))
-
-        # 4) Build hierarchical section paths
-        paths: List[str] = []
-        stack: List[str] = []
-        for lvl, title, _, _, _ in ranges:
-            if len(stack) < lvl:
-                stack += [""] * (lvl - len(stack))
-            stack = stack[:lvl]
-            stack[lvl - 1] = title
-            paths.append(" > ".join(s for s in stack if s))
-
-        # 5) Page text map
-        sql_pages = "SELECT page_number, content FROM document_pages WHERE document_id = %s"
-        page_map = {}
-        with get_conn() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                cur.execute(sql_pages, (doc_id,))
-                for row in cur.fetchall():
-                    page_map[int(row["page_number"])] = row["content"] or ""
-
-        # 6) Build chunks + upsert (timed)
-        with timed_block("chunk-toc"):
-            chunks_rows = []
-            total_sections = 0
-            total_chunks = 0
-            for (lvl, title, start, end, oi), section_path in zip(ranges, paths):
-                total_sections += 1
-                pages_text = [page_map[p] for p in range(start, end + 1) if p in page_map]
-                full_text = "\n\n".join(pages_text).strip()
-                if not full_text:
-                    continue
-
-                pieces = _split_by_paragraphs(full_text, max_chars=max_chars)
-                for ci, piece in enumerate(pieces):
-                    chunks_rows.append((doc_id, section_path, lvl, start, end, ci, piece))
-                    total_chunks += 1
-
-            if not chunks_rows:
-                return {"document_id": doc_id, "title": doc_row["title"], "chunks_created": 0, "note": "No text found for TOC ranges. Ensure /parse-pages ran."}
-
-            # Upsert into document_chunks
-            upsert = """
-                INSERT INTO document_chunks
-                    (document_id, section_path, level, start_page, end_page, chunk_index, content)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (document_id, section_path, chunk_index)
-                DO UPDATE SET
-                    level = EXCLUDED.level,
-                    start_page = EXCLUDED.start_page,
-                    end_page = EXCLUDED.end_page,
-                    content = EXCLUDED.content
-            """
-            with get_conn() as conn:
-                with conn.cursor() as cur:
-                    cur.executemany(upsert, chunks_rows)
-                    conn.commit()
+        # 3+4) Page ranges ("until next same-or-higher") + hierarchical section paths, one pass
+        ranges = compute_toc_ranges(entries, page_count)
+        if leaf_only:
+            ranges = leaf_ranges(ranges)
 
-        # 7) Sample preview
+        # 5+6) Stream pages (named cursor, page order) through a sliding window, chunk each
+        #      section once its last page has been read, upsert in fixed-size batches
+        sql_pages = """
+            SELECT page_number, content FROM document_pages
+            WHERE document_id = %s
+            ORDER BY page_number ASC
+        """
+        upsert = """
+            INSERT INTO document_chunks
+                (document_id, product_id, section_path, level, start_page, end_page, chunk_index, content)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (document_id, section_path, chunk_index)
+            DO UPDATE SET
+                product_id = EXCLUDED.product_id,
+                level = EXCLUDED.level,
+                start_page = EXCLUDED.start_page,
+                end_page = EXCLUDED.end_page,
+                content = EXCLUDED.content
+        """
         sample = []
-        for row in chunks_rows[:3]:
-            _, section_path, lvl, start, end, ci, content = row
-            sample.append({
-                "section_path": section_path,
-                "level": lvl,
-                "range": f"{start}-{end}",
-                "chunk_index": ci,
-                "preview": content[:300] + ("…" if len(content) > 300 else "")
-            })
+        total_sections = 0
+        total_chunks = 0
+        pending: List[Tuple[Any, ...]] = []
+        with timed_block("chunk-toc", document_id=doc_id, strategy=chunker.name) as sp, \
+                get_conn() as rconn, get_conn() as wconn:
+
+            def flush() -> None:
+                if pending:
+                    with span("chunk-toc.upsert", rows=len(pending)), wconn.cursor() as wcur:
+                        wcur.executemany(upsert, pending)
+                    wconn.commit()
+                    pending.clear()
+
+            with rconn.cursor(name=f"chunk_toc_pages_{doc_id}") as cur:
+                cur.itersize = PAGE_FETCH
+                cur.execute(sql_pages, (doc_id,))
+                page_rows = ((int(pn), content or "") for pn, content in cur)
+                for (lvl, title, start, end, oi, section_path), window in iter_sections_streaming(ranges, page_rows):
+                    total_sections += 1
+                    for ci, piece in enumerate(chunker.chunk_section(window, start, end)):
+                        if len(sample) < 3:
+                            sample.append({
+                                "section_path": section_path,
+                                "level": lvl,
+                                "range": f"{start}-{end}",
+                                "chunk_index": ci,
+                                "preview": piece[:300] + ("…" if len(piece) > 300 else "")
+                            })
+                        pending.append((doc_id, product_id, section_path, lvl, start, end, ci, piece))
+                        total_chunks += 1
+                        if len(pending) >= CHUNK_WRITE_BATCH:
+                            flush()
+                sp.set(window_peak_pages=window.peak_pages if total_sections else 0)
+            flush()
+
+        if not total_chunks:
+            return {"document_id": doc_id, "title": doc_row["title"], "chunks_created": 0, "note": "No text found for TOC ranges. Ensure /parse-pages ran."}
 
         return {
             "document_id": doc_id,
             "title": doc_row["title"],
+            "leaf_only": leaf_only,
+            "strategy": chunker.name,
             "sections_seen": total_sections,
             "chunks_created": total_chunks,
             "sample": sample
@@ -607,80 +642,30 @@ def chunk_by_toc(doc_id: int, max_chars: int = 2000):
 
 # --------- Export chunks to files ----------
 @router.post("/{doc_id}/export-chunks")
-def export_chunks_to_files(doc_id: int):
+def export_chunks_to_files(doc_id: int, format: str = "files", batch_size: int = 1000, workers: int = 4,
+                           resume: bool = False):
     """
-    Export all chunks for a document to the filesystem:
-      - storage/chunks/doc_<id>/<NNNN>__<safe_section>__ci_<k>.txt  (one file per chunk)
-      - storage/chunks/doc_<id>/chunks.json                         (summary index)
-    """
-    sql = """
-        SELECT id, document_id, section_path, level, start_page, end_page, chunk_index, content, created_at
-        FROM document_chunks
-        WHERE document_id = %s
-        ORDER BY section_path ASC, chunk_index ASC
+    Export all chunks for a document to storage/chunks/doc_<id>/, streaming rows from a
+    server-side cursor (see app/chunk_export.py):
+      - format=files   -> <NNNN>__<safe_section>__ci_<k>.txt per chunk (written by `workers` threads)
+                          + chunks.json (summary index)
+      - format=jsonl   -> chunks.jsonl.gz (single compressed artifact)
+      - format=parquet -> chunks.parquet (requires pyarrow)
+      - resume=true    -> continue an interrupted files/jsonl export from its checkpoint
     """
     try:
-        with get_conn() as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
-                cur.execute(sql, (doc_id,))
-                rows = cur.fetchall()
-
-        if not rows:
+        out_dir = Path("storage/chunks").resolve() / f"doc_{doc_id}"
+        with timed_block("export-chunks", document_id=doc_id, format=format) as sp:
+            try:
+                result = export_chunks(get_conn, doc_id, out_dir, fmt=format, batch_size=batch_size,
+                                       workers=workers, resume=resume)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            sp.set(rows=result["rows"], resumed_from=result["resumed_from"])
+
+        if not result["rows"]:
             raise HTTPException(status_code=404, detail="No chunks found for this document. Run /chunk-toc first.")
-
-        base_dir = Path("storage/chunks").resolve()
-        out_dir = base_dir / f"doc_{doc_id}"
-        out_dir.mkdir(parents=True, exist_ok=True)
-
-        def _safe(name: str) -> str:
-            return "".join(c if (c.isalnum() or c in "-_.") else "_" for c in name)
-
-        with timed_block("export-chunks"):
-            index = []
-            for i, r in enumerate(rows, start=1):
-                sid = int(r["id"])
-                sec = r["section_path"] or "section"
-                lvl = int(r["level"])
-                sp, ep = int(r["start_page"]), int(r["end_page"])
-                ci = int(r["chunk_index"])
-                txt = r["content"] or ""
-
-                safe = _safe(sec)[:80] or "section"
-                fname = f"{i:04d}__{safe}__ci_{ci}.txt"
-                fpath = out_dir / fname
-
-                header = (
-                    f"--- chunk_id: {sid}\n"
-                    f"--- section_path: {sec}\n"
-                    f"--- level: {lvl}\n"
-                    f"--- pages: {sp}-{ep}\n"
-                    f"--- chunk_index: {ci}\n"
-                    f"---\n\n"
-                )
-                fpath.write_text(header + txt, encoding="utf-8")
-
-                index.append({
-                    "file": str(fpath),
-                    "chunk_id": sid,
-                    "section_path": sec,
-                    "level": lvl,
-                    "start_page": sp,
-                    "end_page": ep,
-                    "chunk_index": ci,
-                    "chars": len(txt)
-                })
-
-            (out_dir / "chunks.json").write_text(
-                json.dumps(index, ensure_ascii=False, indent=2),
-                encoding="utf-8"
-            )
-
-        return {
-            "document_id": doc_id,
-            "dir": str(out_dir),
-            "files_written": len(index),
-            "index_json": str(out_dir / "chunks.json")
-        }
+        return {"document_id": doc_id, **result}
 
     except HTTPException:
         raise
@@ -688,32 +673,6 @@ def export_chunks_to_files(doc_id: int):
         raise HTTPException(status_code=500, detail=f"Failed to export chunks: {e}")
 
 # --------- NEW: Embed all chunks for one document ----------
-def _upsert_embedding(conn, chunk_id: int, vec: List[float], model_name: str) -> None:
-    """
-    Upsert helper for chunk_embeddings table.
-    """
-    # --- SAFETY CHECK: prevent wrong-dimension vectors from being saved ---
-    if len(vec) != 1536:
-        raise RuntimeError(
-            f"Refusing to save embedding of length {len(vec)} (expected 1536). "
-            "Check EMBEDDING_MODEL."
-        )
-
-    array_literal = "{" + ",".join(str(float(x)) for x in vec) + "}"
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO chunk_embeddings (chunk_id, embedding, model)
-            VALUES (%s, %s::float8[]::vector, %s)
-            ON CONFLICT (chunk_id)
-            DO UPDATE SET
-                embedding = EXCLUDED.embedding,
-                model     = EXCLUDED.model,
-                created_at= NOW();
-            """,
-            (chunk_id, array_literal, model_name),
-        )
-
 @router.post("/{document_id}/embed")
 def embed_document(document_id: int, batch_size: int = 32) -> Dict[str, Any]:
     """
@@ -727,9 +686,11 @@ def embed_document(document_id: int, batch_size: int = 32) -> Dict[str, Any]:
     skipped = 0
     total = 0
 
-    with timed_block("embed_document"), get_conn() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            # Fetch chunk ids + text for this document
+    # Read through a server-side cursor, batch_size rows at a time, on its own connection
+    # (its transaction stays open while the write connection commits per batch).
+    with timed_block("embed_document", document_id=document_id), get_conn() as rconn, get_conn() as conn:
+        with rconn.cursor(name=f"embed_document_{document_id}", row_factory=dict_row) as cur:
+            cur.itersize = batch_size
             cur.execute(
                 """
                 SELECT id, content
@@ -739,36 +700,35 @@ def embed_document(document_id: int, batch_size: int = 32) -> Dict[str, Any]:
                 """,
                 (document_id,),
             )
-            rows: List[Dict[str, Any]] = cur.fetchall()
-            total = len(rows)
+            while True:
+                with span("embed_document.fetch"):
+                    batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                total += len(batch)
+
+                # Filter out empty text
+                batch_pairs: List[Tuple[int, str]] = [
+                    (int(r["id"]), (r.get("content") or ""))
+                    for r in batch
+                ]
+                ids = [cid for cid, txt in batch_pairs if txt.strip()]
+                texts = [txt for cid, txt in batch_pairs if txt.strip()]
+                empty_count = len(batch_pairs) - len(ids)
+                skipped += empty_count
+
+                if ids:
+                    with span("embed_document.embed", batch=len(ids)):
+                        vecs = embed_texts(texts)  # one call for the whole batch
+                    with span("embed_document.upsert", rows=len(ids)):
+                        bulk_upsert_embeddings(conn, ids, vecs, provider_name)  # one statement per batch
+                        embedded += len(ids)
+                        conn.commit()  # commit per batch to avoid long transactions
+                    logger.info("embed_document doc=%s batch_done embedded=%s skipped_in_batch=%s", document_id, len(ids), empty_count)
 
         if total == 0:
             raise HTTPException(status_code=404, detail=f"No chunks found for document {document_id}")
 
-        # Prepare batches
-        def batched(seq: List[Dict[str, Any]], n: int):
-            for i in range(0, len(seq), n):
-                yield seq[i : i + n]
-
-        for batch in batched(rows, batch_size):
-            # Filter out empty text
-            batch_pairs: List[Tuple[int, str]] = [
-                (int(r["id"]), (r.get("content") or ""))
-                for r in batch
-            ]
-            ids = [cid for cid, txt in batch_pairs if txt.strip()]
-            texts = [txt for cid, txt in batch_pairs if txt.strip()]
-            empty_count = len(batch_pairs) - len(ids)
-            skipped += empty_count
-
-            if ids:
-                vecs = embed_texts(texts)  # one call for the whole batch
-                for cid, vec in zip(ids, vecs):
-                    _upsert_embedding(conn, cid, vec, provider_name)
-                embedded += len(ids)
-                conn.commit()  # commit per batch to avoid long transactions
-                logger.info("embed_document doc=%s batch_done embedded=%s skipped_in_batch=%s", document_id, len(ids), empty_count)
-
     elapsed_ms = int((time.perf_counter() - t0) * 1000)
     return {
         "document_id": document_id,
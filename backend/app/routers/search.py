@@ -1,16 +1,29 @@
 # app/routers/search.py
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional, List, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, Any, Literal, Optional, List, Tuple
+import asyncio
+import math
 import os
 import re
+import json
+from time import perf_counter
 
 import psycopg
 from psycopg.rows import dict_row
 
-from app.embeddings import embed_one
+from app import deadline
+from app.admission import AdmissionLimiter, CancelScope, Overloaded, TTLCache
+from app.circuit_breaker import CircuitOpen
+from app.embeddings import EMBED_BREAKER, EMBED_FLIGHT, EMBED_HEDGER, embed_one
+from app.embedding_store import PREFIX_DIMS, VECTOR_METRIC, prefix_vector, unit_vector
+from app.singleflight import SingleFlight
+from app.metrics import DB_CONNECTIONS, SEARCH_DEGRADED
+from app.rerank import from_vector_send, mmr
+from app.timing import span
 from app.text_utils import normalize_text
 
 router = APIRouter(prefix="/search", tags=["search"])
@@ -22,31 +35,55 @@ def _get_conn():
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL is not set")
+    DB_CONNECTIONS.inc(module="search")
     # Inline ARRAY[...]::vector is used, so no pgvector adapter required.
     return psycopg.connect(url, row_factory=dict_row)
 
+def _set_statement_timeout(cur, ms: int) -> None:
+    """Transaction-local statement_timeout (0 = no limit)."""
+    cur.execute("SELECT set_config('statement_timeout', %s, true)", (f"{int(ms)}ms",))
+
 # -------------------------------
 # Request model
 # -------------------------------
+# Deepest a request may page into the ranking (offset + top_k), and the most
+# candidate rows any query fetches (MMR pool, product k-NN LIMIT).
+MAX_CANDIDATES = 1000
+
 class SearchIn(BaseModel):
     text: str = Field(..., min_length=1)
     top_k: int = Field(5, ge=1, le=50)
 
     # Filters
     document_id: Optional[int] = None
-    product_id: Optional[int] = None  # reserved for later JOIN-based filtering
+    product_id: Optional[int] = None  # uses denormalized chunk_embeddings.product_id (no JOIN)
     exclude_section_exact: List[str] = Field(
         default_factory=lambda: ["Dummy PDF file"]
     )
     min_chars: int = 60
 
     # Pagination
-    offset: int = Field(0, ge=0)
+    offset: int = Field(0, ge=0, le=MAX_CANDIDATES - 1)
+
+    # Diversity. "section": keep the best max_per_section (default 1) chunks per
+    # (document_id, section_path). "mmr": re-rank the candidate_pool nearest chunks
+    # by maximal marginal relevance (app/rerank.py), optionally capped per section.
+    # Unset fields fall back to SEARCH_DIVERSITY / SEARCH_MMR_LAMBDA / SEARCH_MMR_POOL.
+    diversity: Optional[Literal["section", "mmr"]] = None
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    candidate_pool: Optional[int] = Field(None, ge=1, le=MAX_CANDIDATES)
+    max_per_section: Optional[int] = Field(None, ge=1, le=50)
 
     # Output options
     clean_preview: bool = False
     highlight_terms: bool = True
 
+    @model_validator(mode="after")
+    def _bounded_page(self) -> "SearchIn":
+        if self.offset + self.top_k > MAX_CANDIDATES:
+            raise ValueError(f"offset + top_k must be <= {MAX_CANDIDATES}")
+        return self
+
 # Utility: light markdown highlighter for matched words (client-side polish)
 def _mk_highlighter(q: str):
     # very light tokenizer: split on non-letters/digits, keep 3+ length tokens
@@ -62,31 +99,35 @@ def _mk_highlighter(q: str):
     return hi
 
 # -------------------------------
-# MAIN: semantic search with:
-#  • L2 distance
-#  • diversity (best per section_path)
-#  • lexical boost (simple LIKE)
-#  • pagination (LIMIT/OFFSET + next_offset)
-#  • optional cleaning + term highlighting
-#  • page_url (source_url#page=N)
+# Query building blocks (shared by /search and /search/_explain)
 # -------------------------------
-@router.post("")
-def semantic_search(payload: SearchIn) -> Dict[str, Any]:
+def _vector_sql(q_vec: List[float]) -> str:
+    """Inline a query vector as ARRAY[...]::float8[]::vector (unit length under VECTOR_METRIC=ip)."""
+    if VECTOR_METRIC == "ip":
+        q_vec = unit_vector(q_vec)
+    return "ARRAY[" + ",".join(f"{v}" for v in q_vec) + "]::float8[]::vector"
+
+def _prefix_sql(q_vec: List[float]) -> str:
+    """The query's truncated, re-normalised prefix (EMBED_PREFIX_DIMS) as an inline vector."""
+    return "ARRAY[" + ",".join(f"{v}" for v in prefix_vector(q_vec, PREFIX_DIMS)) + "]::float8[]::vector"
+
+def _distance_sql(qarr_sql: str, column: str = "ce.embedding") -> str:
     """
-    One-shot enhanced semantic search:
-      - embeds the query and inlines ARRAY[... ]::float8[]::vector
-      - computes L2 distance (<->),
-      - adds a simple lexical boost when content contains the query text,
-      - enforces diversity: pick the top chunk per (document_id, section_path),
-      - supports pagination via LIMIT/OFFSET and returns next_offset,
-      - returns page_url built from source_url + '#page=start_page',
-      - optionally cleans + highlights previews.
+    Ranking expression, lower = closer: L2 distance (<->), or under VECTOR_METRIC=ip
+    the negative inner product (<#>), which for unit vectors is -cosine similarity.
     """
-    # 1) Embed query and build inline vector literal
-    q_vec = list(map(float, embed_one(payload.text)))
-    qarr_sql = "ARRAY[" + ",".join(f"{v}" for v in q_vec) + "]::float8[]::vector"
+    op = "<#>" if VECTOR_METRIC == "ip" else "<->"
+    return f"({column} {op} {qarr_sql})"
+
+def _score(dist: float, metric: str) -> float:
+    """Higher = better: cosine similarity for ip, 1/(1+dist) otherwise."""
+    return -dist if metric == "ip" else 1.0 / (1.0 + dist)
 
-    # 2) Optional WHERE fragments
+def _filter_sql(payload: SearchIn, product_col: Optional[str] = "ce.product_id") -> Tuple[str, List[Any]]:
+    """
+    WHERE fragment + params for the SearchIn filters (c = document_chunks).
+    product_col=None leaves the product out (already applied by _product_knn_sql).
+    """
     where_clauses: List[str] = []
     params: List[Any] = []
 
@@ -94,6 +135,12 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
         where_clauses.append("c.document_id = %s")
         params.append(payload.document_id)
 
+    # Product scope: filter on the vector table itself so the predicate matches
+    # the per-product partial indexes (scripts/create_product_vector_indexes.py)
+    if payload.product_id is not None and product_col is not None:
+        where_clauses.append(f"{product_col} = %s")
+        params.append(payload.product_id)
+
     # Basic content quality guard
     if payload.min_chars > 0:
         where_clauses.append("char_length(c.content) >= %s")
@@ -104,16 +151,80 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
         where_clauses.append("NOT (COALESCE(c.section_path, '') = ANY(%s))")
         params.append(payload.exclude_section_exact)
 
-    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+    return (" AND ".join(where_clauses) if where_clauses else "1=1"), params
 
-    # 3) Lexical boost (very simple)
+# Lexical boost (very simple): chunks containing the query text get this much
+# closer (distance) / more relevant (MMR)
+LEXICAL_BOOST = 0.05  # small, conservative boost
+
+def _product_candidates(payload: SearchIn, pool: int = 0) -> int:
+    return min(max(SEARCH_PRODUCT_CANDIDATES, pool, payload.offset + payload.top_k), MAX_CANDIDATES)
+
+def _product_knn_sql(payload: SearchIn, qarr_sql: str, pool: int = 0) -> str:
+    """
+    Innermost step of a product-scoped search: the nearest chunk_embeddings rows of
+    ONE product, nothing else in the WHERE. The product id is inlined (an int) so the
+    predicate matches that product's partial HNSW index
+    (scripts/create_product_vector_indexes.py) when the plan is made; the ORDER BY
+    distance LIMIT is then an index scan over that product's graph only.
+    """
+    return f"""product_knn AS (
+      SELECT ce.chunk_id
+      FROM chunk_embeddings ce
+      WHERE ce.product_id = {int(payload.product_id)}
+      ORDER BY {_distance_sql(qarr_sql)}
+      LIMIT {_product_candidates(payload, pool)}
+    )"""
+
+def _source_sql(payload: SearchIn, qprefix_sql: Optional[str], qarr_sql: Optional[str] = None,
+                pool: int = 0) -> Tuple[Optional[str], List[Any], str, List[Any]]:
+    """
+    Where the ranked rows come from: (candidates CTE or None, its params, FROM ... sql,
+    params of that FROM). Plain mode scans the filtered chunk_embeddings; with
+    `qprefix_sql` (two-stage mode) a `candidates` CTE first takes the
+    SEARCH_PREFIX_CANDIDATES nearest filtered chunks by embedding_prefix (small
+    vectors, own HNSW index) and only those rows get full-vector distances.
+    With product_id (single-stage), the `product_knn` CTE takes that product's
+    SEARCH_PRODUCT_CANDIDATES nearest vectors first and the other filters apply to
+    those.
+    """
+    if qprefix_sql is None and qarr_sql is not None and payload.product_id is not None:
+        where_sql, params = _filter_sql(payload, product_col=None)
+        return _product_knn_sql(payload, qarr_sql, pool), [], f"""FROM product_knn k
+      JOIN chunk_embeddings ce ON ce.chunk_id = k.chunk_id
+      JOIN document_chunks c ON c.id = ce.chunk_id
+      LEFT JOIN documents d  ON d.id = c.document_id
+      WHERE {where_sql}""", params
+    where_sql, params = _filter_sql(payload)
+    if qprefix_sql is None:
+        return None, [], f"""FROM chunk_embeddings ce
+      JOIN document_chunks c ON c.id = ce.chunk_id
+      LEFT JOIN documents d  ON d.id = c.document_id
+      WHERE {where_sql}""", params
+    cte = f"""candidates AS (
+      SELECT ce.chunk_id
+      FROM chunk_embeddings ce
+      JOIN document_chunks c ON c.id = ce.chunk_id
+      WHERE {where_sql}
+      ORDER BY {_distance_sql(qprefix_sql, "ce.embedding_prefix")}
+      LIMIT {int(SEARCH_PREFIX_CANDIDATES)}
+    )"""
+    return cte, params, """FROM candidates k
+      JOIN chunk_embeddings ce ON ce.chunk_id = k.chunk_id
+      JOIN document_chunks c ON c.id = ce.chunk_id
+      LEFT JOIN documents d  ON d.id = c.document_id""", []
+
+def _search_ctes(payload: SearchIn, qarr_sql: str, qprefix_sql: Optional[str] = None) -> Tuple[str, List[Any]]:
+    """
+    Build the candidate/diversity CTEs ([candidates ->] rank_by -> scored ->
+    best_per_section) and their params. Callers append their own final SELECT.
+    """
+    cte, head_params, from_sql, tail_params = _source_sql(payload, qprefix_sql, qarr_sql)
+    head = f"WITH {cte},\n    rank_by AS (" if cte else "WITH rank_by AS ("
     like_term = f"%{payload.text.lower()}%"
-    boost_coef = 0.05  # small, conservative boost
-    params_for_like = [like_term]
 
-    # 4) SQL with diversity (best per section_path) and STABLE global sort
-    sql_full = f"""
-    WITH rank_by AS (
+    ctes = f"""
+    {head}
       SELECT
         c.id                          AS chunk_id,
         c.document_id                 AS document_id,
@@ -124,20 +235,17 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
         c.start_page                  AS start_page,
         c.end_page                    AS end_page,
         LEFT(c.content, 300)          AS preview,
-        (ce.embedding <-> {qarr_sql}) AS dist,
+        {_distance_sql(qarr_sql)} AS dist,
         CASE
           WHEN LOWER(c.content) LIKE %s THEN 1
           ELSE 0
         END                           AS lexical_hit
-      FROM chunk_embeddings ce
-      JOIN document_chunks c ON c.id = ce.chunk_id
-      LEFT JOIN documents d  ON d.id = c.document_id
-      WHERE {where_sql}
+      {from_sql}
     ),
     scored AS (
       SELECT
         *,
-        (dist - {boost_coef} * lexical_hit) AS combined
+        (dist - {LEXICAL_BOOST} * lexical_hit) AS combined
       FROM rank_by
     ),
     best_per_section AS (
@@ -146,13 +254,21 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
         ORDER BY combined ASC, dist ASC, chunk_id ASC
       ) AS rn
       FROM scored
-    ),
+    )"""
+    return ctes, head_params + [like_term] + tail_params
+
+def _build_search_sql(payload: SearchIn, qarr_sql: str, qprefix_sql: Optional[str] = None,
+                      max_per_section: int = 1) -> Tuple[str, Tuple[Any, ...]]:
+    """Full ranked + diversified (max_per_section per section) + paginated query and its params."""
+    ctes, params = _search_ctes(payload, qarr_sql, qprefix_sql)
+    sql_full = f"""
+    {ctes.strip()},
     final AS (
       SELECT
         chunk_id, dist, document_id, document_title, source_url, section_path,
         chunk_index, start_page, end_page, preview, lexical_hit, combined
       FROM best_per_section
-      WHERE rn = 1
+      WHERE rn <= {int(max_per_section)}
       ORDER BY
         combined ASC,
         dist ASC,
@@ -162,25 +278,122 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
     )
     SELECT * FROM final;
     """.strip()
+    return sql_full, tuple(params + [int(payload.top_k), int(payload.offset)])
 
-    # For debug visibility
-    debug: Dict[str, Any] = {
-        "sql_first": re.sub(r"\s+", " ", sql_full.strip()),
-        "params_types_first": [type(p).__name__ for p in (params_for_like + params + [int(payload.top_k), int(payload.offset)])],
-    }
+def _build_mmr_sql(payload: SearchIn, qarr_sql: str, pool: int,
+                   qprefix_sql: Optional[str] = None) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Candidate pool for diversity="mmr": the `pool` nearest filtered chunks by a plain
+    ORDER BY distance LIMIT (an HNSW index can serve it; no window over every row),
+    with their vectors in pgvector's binary form for app/rerank.py.
+    """
+    cte, head_params, from_sql, tail_params = _source_sql(payload, qprefix_sql, qarr_sql, pool)
+    dist_sql = _distance_sql(qarr_sql)
+    sql = f"""
+    {f"WITH {cte}" if cte else ""}
+    SELECT
+      c.id                       AS chunk_id,
+      c.document_id              AS document_id,
+      d.title                    AS document_title,
+      d.source_url               AS source_url,
+      c.section_path             AS section_path,
+      c.chunk_index              AS chunk_index,
+      c.start_page               AS start_page,
+      c.end_page                 AS end_page,
+      LEFT(c.content, 300)       AS preview,
+      {dist_sql} AS dist,
+      CASE
+        WHEN LOWER(c.content) LIKE %s THEN 1
+        ELSE 0
+      END                        AS lexical_hit,
+      vector_send(ce.embedding)  AS embedding
+    {from_sql}
+    ORDER BY {dist_sql}
+    LIMIT %s::int
+    """.strip()
+    like_term = f"%{payload.text.lower()}%"
+    return sql, tuple(head_params + [like_term] + tail_params + [int(pool)])
+
+def _diversity(payload: SearchIn) -> Dict[str, Any]:
+    """Effective diversity settings for a request (payload fields over SEARCH_* defaults)."""
+    if (payload.diversity or SEARCH_DIVERSITY) == "mmr":
+        return {
+            "mode": "mmr",
+            "lambda": SEARCH_MMR_LAMBDA if payload.mmr_lambda is None else payload.mmr_lambda,
+            "pool": min(max(payload.candidate_pool or SEARCH_MMR_POOL, payload.offset + payload.top_k),
+                        MAX_CANDIDATES),
+            "max_per_section": payload.max_per_section,
+        }
+    return {"mode": "section", "max_per_section": payload.max_per_section or 1}
+
+def _build_query(payload: SearchIn, q_vec: List[float], div: Dict[str, Any]) -> Tuple[str, Tuple[Any, ...]]:
+    """The vector query for `payload` under the diversity settings `div`."""
+    qarr_sql, qprefix_sql = _vector_sql(q_vec), _query_prefix_sql(q_vec)
+    if div["mode"] == "mmr":
+        return _build_mmr_sql(payload, qarr_sql, div["pool"], qprefix_sql)
+    return _build_search_sql(payload, qarr_sql, qprefix_sql, div["max_per_section"])
+
+def _mmr_rerank(payload: SearchIn, q_vec: List[float], rows: List[Dict[str, Any]],
+                div: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """MMR order of the candidate rows, paginated like the SQL path."""
+    order = mmr(
+        q_vec,
+        from_vector_send([r["embedding"] for r in rows]),
+        payload.offset + payload.top_k,
+        lam=div["lambda"],
+        boost=[LEXICAL_BOOST * int(r.get("lexical_hit") or 0) for r in rows],
+        groups=[(r.get("document_id"), r.get("section_path") or "") for r in rows],
+        max_per_group=div["max_per_section"],
+    )
+    return [rows[i] for i in order[payload.offset:]]
 
-    rows: List[Dict[str, Any]] = []
-    try:
-        with _get_conn() as conn, conn.cursor() as cur:
-            full_params: Tuple[Any, ...] = tuple(
-                params_for_like + params + [int(payload.top_k), int(payload.offset)]
-            )
-            cur.execute(sql_full, full_params)
-            rows = cur.fetchall()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"search failed: {e}")
+def _build_lexical_sql(payload: SearchIn) -> Tuple[str, Tuple[Any, ...]]:
+    """
+    Degraded-mode query: Postgres full-text match over document_chunks only (no
+    embedding, no vector scan), same filters and per-section diversity as /search.
+    `dist` is a stand-in derived from ts_rank_cd so _postprocess_rows still orders
+    scores sensibly; it is not comparable with vector distances.
+    """
+    where_sql, params = _filter_sql(payload, product_col="d.product_id")
+    sql = f"""
+    WITH q AS (SELECT websearch_to_tsquery(%s::regconfig, %s) AS tsq),
+    hits AS (
+      SELECT
+        c.id                  AS chunk_id,
+        c.document_id         AS document_id,
+        d.title               AS document_title,
+        d.source_url          AS source_url,
+        c.section_path        AS section_path,
+        c.chunk_index         AS chunk_index,
+        c.start_page          AS start_page,
+        c.end_page            AS end_page,
+        LEFT(c.content, 300)  AS preview,
+        ts_rank_cd(to_tsvector(%s::regconfig, c.content), q.tsq) AS rank
+      FROM document_chunks c
+      CROSS JOIN q
+      LEFT JOIN documents d ON d.id = c.document_id
+      WHERE to_tsvector(%s::regconfig, c.content) @@ q.tsq AND {where_sql}
+    ),
+    best_per_section AS (
+      SELECT *, ROW_NUMBER() OVER (
+        PARTITION BY document_id, COALESCE(section_path, '')
+        ORDER BY rank DESC, chunk_id ASC
+      ) AS rn
+      FROM hits
+    )
+    SELECT
+      chunk_id, 1.0 / (1.0 + rank) AS dist, document_id, document_title, source_url,
+      section_path, chunk_index, start_page, end_page, preview
+    FROM best_per_section
+    WHERE rn = 1
+    ORDER BY rank DESC, chunk_id ASC
+    LIMIT %s::int OFFSET %s::int
+    """.strip()
+    cfg = SEARCH_FTS_CONFIG
+    return sql, tuple([cfg, payload.text, cfg, cfg] + params + [int(payload.top_k), int(payload.offset)])
 
-    # 5) Post-process results
+def _postprocess_rows(payload: SearchIn, rows: List[Dict[str, Any]], metric: str = "l2") -> List[Dict[str, Any]]:
+    """Score, page_url, cleaned/highlighted previews for raw SQL rows (`metric` says what `dist` is)."""
     hi_fn = _mk_highlighter(payload.text) if payload.highlight_terms else None
 
     out_rows: List[Dict[str, Any]] = []
@@ -192,7 +405,7 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
             page_url = f"{src}#page={start_page}"
 
         dist = float(r.get("dist") or 0.0)
-        score = 1.0 / (1.0 + dist)
+        score = _score(dist, metric)
 
         preview_raw = r.get("preview") or ""
         preview_clean = normalize_text(preview_raw).replace("Â©", "©")
@@ -223,10 +436,238 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
                 "preview_marked": preview_marked if payload.highlight_terms else None,
             }
         )
+    return out_rows
 
-    # 6) Pagination helper
-    next_offset = payload.offset + len(out_rows) if len(out_rows) == payload.top_k else None
+# -------------------------------
+# MAIN: semantic search with:
+#  • L2 distance, or inner product on unit vectors (VECTOR_METRIC=ip)
+#  • diversity (best per section_path, or MMR over a candidate pool)
+#  • lexical boost (simple LIKE)
+#  • pagination (LIMIT/OFFSET + next_offset)
+#  • optional cleaning + term highlighting
+#  • page_url (source_url#page=N)
+# -------------------------------
+# Identical concurrent SearchIn payloads share one embed + SQL run
+SEARCH_FLIGHT = SingleFlight("search")
+
+# Admission control (see app/admission.py). Beyond SEARCH_MAX_CONCURRENT running and
+# SEARCH_MAX_QUEUE waiting (each for at most SEARCH_QUEUE_TIMEOUT_MS), requests are
+# shed: the last good answer for the same payload if SEARCH_CACHE has one, else 503.
+SEARCH_LIMITER = AdmissionLimiter(
+    "search",
+    max_concurrent=int(os.getenv("SEARCH_MAX_CONCURRENT", "8")),
+    max_queue=int(os.getenv("SEARCH_MAX_QUEUE", "16")),
+    queue_timeout=int(os.getenv("SEARCH_QUEUE_TIMEOUT_MS", "500")) / 1000.0,
+    retry_after=float(os.getenv("SEARCH_RETRY_AFTER_S", "1")),
+)
+SEARCH_CACHE = TTLCache(
+    "search",
+    max_items=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL_S", "300")),
+)
+SEARCH_STATEMENT_TIMEOUT_MS = int(os.getenv("SEARCH_STATEMENT_TIMEOUT_MS", "2000"))
+SEARCH_LEXICAL_TIMEOUT_MS = int(os.getenv("SEARCH_LEXICAL_TIMEOUT_MS", "500"))
+# /search/_explain runs the query up to three times (EXPLAIN ANALYZE, plain, counts);
+# each statement gets this cap
+SEARCH_EXPLAIN_TIMEOUT_MS = int(os.getenv("SEARCH_EXPLAIN_TIMEOUT_MS", "10000"))
+SEARCH_FTS_CONFIG = os.getenv("SEARCH_FTS_CONFIG", "english")
+# Whole-request budget (queueing + embedding + SQL). A client may ask for less with
+# the X-Request-Deadline-Ms header; the embedder call and statement_timeout never
+# run past what is left.
+SEARCH_DEADLINE_MS = int(os.getenv("SEARCH_DEADLINE_MS", "5000"))
+# Two-stage retrieval (EMBED_PREFIX_DIMS + scripts/add_embedding_prefix_column.py):
+# SEARCH_PREFIX_CANDIDATES nearest by the truncated prefix, reranked by the full vector.
+SEARCH_TWO_STAGE = os.getenv("SEARCH_TWO_STAGE", "0") == "1" and PREFIX_DIMS > 0
+SEARCH_PREFIX_CANDIDATES = int(os.getenv("SEARCH_PREFIX_CANDIDATES", "200"))
+# Product-scoped search: nearest vectors of the product taken before the other
+# filters and the per-section diversity (_product_knn_sql)
+SEARCH_PRODUCT_CANDIDATES = int(os.getenv("SEARCH_PRODUCT_CANDIDATES", "200"))
+# Default diversity rule ("section" | "mmr") and MMR settings; a request may override them
+SEARCH_DIVERSITY = os.getenv("SEARCH_DIVERSITY", "section")
+SEARCH_MMR_LAMBDA = float(os.getenv("SEARCH_MMR_LAMBDA", "0.7"))
+SEARCH_MMR_POOL = int(os.getenv("SEARCH_MMR_POOL", "100"))
+DEADLINE_HEADER = "x-request-deadline-ms"
+DISCONNECT_POLL_S = 0.05
+
+
+def _payload_key(payload: SearchIn) -> str:
+    return json.dumps(payload.model_dump(), sort_keys=True, default=str)
+
+
+def _flight_key(payload: SearchIn, budget_ms: Optional[int] = None) -> str:
+    """
+    SEARCH_FLIGHT key: the payload plus the request budget, so a caller only shares
+    a run (and the deadline-driven lexical fallback it may end in) with callers that
+    have the same time budget.
+    """
+    return json.dumps([payload.model_dump(), budget_ms], sort_keys=True, default=str)
+
+
+def _unavailable(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(SEARCH_LIMITER.retry_after)))},
+    )
 
+
+def _request_budget_s(request: Request) -> float:
+    budget_ms = SEARCH_DEADLINE_MS
+    raw = request.headers.get(DEADLINE_HEADER)
+    if raw:
+        try:
+            budget_ms = min(budget_ms, max(1, int(raw)))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{DEADLINE_HEADER} must be an integer (ms)")
+    return budget_ms / 1000.0
+
+
+def _query_prefix_sql(q_vec: List[float]) -> Optional[str]:
+    return _prefix_sql(q_vec) if SEARCH_TWO_STAGE else None
+
+
+def _set_candidate_search(cur, payload: Optional[SearchIn] = None, pool: int = 0) -> None:
+    """An HNSW scan yields at most hnsw.ef_search rows: let the candidate step see all its candidates."""
+    if SEARCH_TWO_STAGE:
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(max(40, SEARCH_PREFIX_CANDIDATES)),))
+    elif payload is not None and payload.product_id is not None:
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, true)",
+                    (str(max(40, _product_candidates(payload, pool))),))
+
+
+def _sql_timeout_ms(configured: int) -> int:
+    """statement_timeout for the next query: the configured cap or what is left of the deadline."""
+    left = deadline.remaining()
+    if left is None:
+        return configured
+    return max(1, min(configured, int(left * 1000)))
+
+
+def _cancel_unless_shared(scope: CancelScope, dl: deadline.Deadline, key: str) -> None:
+    # Coalesced followers still want the leader's answer
+    if SEARCH_FLIGHT.followers(key) == 0:
+        scope.cancel()
+        dl.cancel()
+
+
+async def _cancel_on_disconnect(request: Request, scope: CancelScope, dl: deadline.Deadline, key: str) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_S)
+    _cancel_unless_shared(scope, dl, key)
+
+
+@router.post("")
+async def semantic_search(payload: SearchIn, request: Request) -> Dict[str, Any]:
+    """
+    POST /search, behind SEARCH_LIMITER and a request deadline (SEARCH_DEADLINE_MS or
+    the X-Request-Deadline-Ms header, whichever is shorter):
+      - saturated -> the cached answer for this payload (degraded) or 503 + Retry-After,
+      - admitted  -> run_search() in the threadpool; if the client disconnects, its
+        embedder call and query are cancelled.
+    """
+    budget_s = _request_budget_s(request)
+    with deadline.bound(budget_s) as dl:
+        return await _admitted_search(payload, request, dl, int(budget_s * 1000))
+
+
+async def _admitted_search(payload: SearchIn, request: Request, dl: deadline.Deadline,
+                           budget_ms: int) -> Dict[str, Any]:
+    try:
+        await SEARCH_LIMITER.acquire()
+    except Overloaded as e:
+        cached = SEARCH_CACHE.get(_payload_key(payload))
+        if cached is None:
+            raise HTTPException(
+                status_code=503,
+                detail=f"search overloaded ({e.reason}), retry later",
+                headers={"Retry-After": e.retry_after_header},
+            )
+        result, age = cached
+        SEARCH_DEGRADED.inc(reason=e.reason, source="cache")
+        return {**result, "degraded": {"reason": e.reason, "source": "cache", "age_s": round(age, 1)}}
+
+    key = _flight_key(payload, budget_ms)
+    scope = CancelScope()
+    watcher = asyncio.ensure_future(_cancel_on_disconnect(request, scope, dl, key))
+    try:
+        return await run_in_threadpool(run_search, payload, scope, budget_ms)
+    except asyncio.CancelledError:
+        _cancel_unless_shared(scope, dl, key)
+        raise
+    finally:
+        watcher.cancel()
+        SEARCH_LIMITER.release()
+
+
+@router.get("/_coalescing")
+def search_coalescing() -> Dict[str, Any]:
+    """Single-flight counters for /search and the embedder."""
+    return {"search": SEARCH_FLIGHT.stats(), "embed": EMBED_FLIGHT.stats()}
+
+
+@router.get("/_admission")
+def search_admission() -> Dict[str, Any]:
+    """Admission limiter, deadline, embedder breaker/hedging and degraded-mode settings for /search."""
+    return {
+        "limiter": SEARCH_LIMITER.stats(),
+        "cache": {"items": len(SEARCH_CACHE), "max_items": SEARCH_CACHE.max_items, "ttl_s": SEARCH_CACHE.ttl},
+        "statement_timeout_ms": SEARCH_STATEMENT_TIMEOUT_MS,
+        "explain_timeout_ms": SEARCH_EXPLAIN_TIMEOUT_MS,
+        "lexical_timeout_ms": SEARCH_LEXICAL_TIMEOUT_MS,
+        "deadline_ms": SEARCH_DEADLINE_MS,
+        "two_stage": {"enabled": SEARCH_TWO_STAGE, "prefix_dims": PREFIX_DIMS,
+                      "candidates": SEARCH_PREFIX_CANDIDATES},
+        "diversity": {"default": SEARCH_DIVERSITY, "mmr_lambda": SEARCH_MMR_LAMBDA,
+                      "mmr_pool": SEARCH_MMR_POOL},
+        "embedder_breaker": EMBED_BREAKER.stats(),
+        "embedder_hedging": EMBED_HEDGER.stats(),
+    }
+
+
+def _embed_query(payload: SearchIn, scope: Optional[CancelScope] = None) -> Tuple[Optional[List[float]], Optional[str]]:
+    """
+    The query vector, or (None, reason) when the embedder can't give one: its breaker
+    is open, it failed, or it missed the request deadline. A cancelled scope -> 499.
+    """
+    try:
+        with span("search.embed", chars=len(payload.text)):
+            return list(map(float, embed_one(payload.text))), None
+    except CircuitOpen:
+        return None, "embedder_open"
+    except deadline.Cancelled:
+        if scope is not None and scope.cancelled:
+            raise HTTPException(status_code=499, detail="client closed request")
+        return None, "embedder_error"
+    except deadline.DeadlineExceeded:
+        return None, "embedder_deadline"
+    except Exception:
+        return None, "embedder_error"
+
+
+def run_search(payload: SearchIn, scope: Optional[CancelScope] = None,
+               budget_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Synchronous search without admission control (tools, in-process benchmarks).
+    Concurrent identical payloads with the same budget are coalesced (single-flight):
+    one caller runs _semantic_search, the others wait and share its result. A
+    follower whose leader was cancelled (its client went away between our joining
+    and the leader's followers check) runs the search once more itself.
+    """
+    key = _flight_key(payload, budget_ms)
+    try:
+        return SEARCH_FLIGHT.do(key, _semantic_search, payload, scope)
+    except HTTPException as e:
+        if e.status_code != 499 or (scope is not None and scope.cancelled):
+            raise
+    return SEARCH_FLIGHT.do(key, _semantic_search, payload, scope)
+
+
+def _response(payload: SearchIn, out_rows: List[Dict[str, Any]], debug: Dict[str, Any],
+              degraded: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Pagination helper
+    next_offset = payload.offset + len(out_rows) if len(out_rows) == payload.top_k else None
+    if next_offset is not None and next_offset + payload.top_k > MAX_CANDIDATES:
+        next_offset = None  # end of the pageable window
     return {
         "query": payload.text,
         "top_k": payload.top_k,
@@ -235,9 +676,238 @@ def semantic_search(payload: SearchIn) -> Dict[str, Any]:
         "document_filter": payload.document_id,
         "product_filter": payload.product_id,
         "results": out_rows,
+        "degraded": degraded,
         "debug": debug,
     }
 
+
+def _lexical_search(payload: SearchIn, reason: str) -> Dict[str, Any]:
+    """Full-text-only answer under a tight statement_timeout; 503 if even that fails."""
+    sql, params = _build_lexical_sql(payload)
+    debug = {"sql_lexical": re.sub(r"\s+", " ", sql)}
+    try:
+        with span("search.lexical", reason=reason) as sp:
+            with _get_conn() as conn, conn.cursor() as cur:
+                _set_statement_timeout(cur, _sql_timeout_ms(SEARCH_LEXICAL_TIMEOUT_MS))
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+            sp.set(rows=len(rows))
+    except psycopg.Error as e:
+        raise _unavailable(f"search degraded ({reason}) and lexical fallback failed: {e}")
+    SEARCH_DEGRADED.inc(reason=reason, source="lexical")
+    return _response(payload, _postprocess_rows(payload, rows), debug,
+                     degraded={"reason": reason, "source": "lexical"})
+
+
+def _semantic_search(payload: SearchIn, scope: Optional[CancelScope] = None) -> Dict[str, Any]:
+    """
+    One-shot enhanced semantic search:
+      - embeds the query and inlines ARRAY[... ]::float8[]::vector
+      - computes L2 distance (<->), or with VECTOR_METRIC=ip the negative inner
+        product (<#>) and reports cosine similarity as the score,
+      - adds a simple lexical boost when content contains the query text,
+      - enforces diversity: the top max_per_section chunks per (document_id,
+        section_path), or (diversity="mmr") MMR over the candidate_pool nearest
+        chunks (app/rerank.py), optionally with the same per-section cap,
+      - supports pagination via LIMIT/OFFSET and returns next_offset,
+      - returns page_url built from source_url + '#page=start_page',
+      - optionally cleans + highlights previews.
+    Degrades to _lexical_search when the embedder breaker is open, the embedder
+    fails or misses the request deadline, or the SQL exceeds SEARCH_STATEMENT_TIMEOUT_MS
+    (capped by the deadline). `scope` lets the caller cancel the query.
+    """
+    # 1) Embed query and build inline vector literal
+    q_vec, reason = _embed_query(payload, scope)
+    if q_vec is None:
+        return _lexical_search(payload, reason=reason)
+
+    # 2) SQL with diversity (best per section_path) and STABLE global sort,
+    #    or the MMR candidate pool
+    div = _diversity(payload)
+    sql_full, full_params = _build_query(payload, q_vec, div)
+
+    # For debug visibility
+    debug: Dict[str, Any] = {
+        "metric": VECTOR_METRIC,
+        "two_stage": SEARCH_TWO_STAGE,
+        "diversity": div,
+        "sql_first": re.sub(r"\s+", " ", sql_full.strip()),
+        "params_types_first": [type(p).__name__ for p in full_params],
+    }
+
+    rows: List[Dict[str, Any]] = []
+    try:
+        with span("search.connect"):
+            conn = _get_conn()
+        if scope is not None and not scope.attach(conn):
+            conn.close()
+            raise HTTPException(status_code=499, detail="client closed request")
+        try:
+            with conn, conn.cursor() as cur, span("search.sql", top_k=payload.top_k) as sp:
+                _set_statement_timeout(cur, _sql_timeout_ms(SEARCH_STATEMENT_TIMEOUT_MS))
+                _set_candidate_search(cur, payload, div.get("pool", 0))
+                cur.execute(sql_full, full_params)
+                rows = cur.fetchall()
+                sp.set(rows=len(rows))
+        finally:
+            if scope is not None:
+                scope.detach()
+    except HTTPException:
+        raise
+    except psycopg.errors.QueryCanceled:
+        if scope is not None and scope.cancelled:
+            raise HTTPException(status_code=499, detail="client closed request")
+        return _lexical_search(payload, reason="statement_timeout")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"search failed: {e}")
+
+    # 3) MMR re-rank of the candidate pool + post-process results
+    if div["mode"] == "mmr":
+        with span("search.mmr", candidates=len(rows)):
+            rows = _mmr_rerank(payload, q_vec, rows, div)
+    with span("search.post", rows=len(rows)):
+        out_rows = _postprocess_rows(payload, rows, VECTOR_METRIC)
+
+    out = _response(payload, out_rows, debug)
+    SEARCH_CACHE.put(_payload_key(payload), out)
+    return out
+
+# -------------------------------
+# Profiling: EXPLAIN ANALYZE + per-stage timings for one SearchIn
+# -------------------------------
+def _summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Walk an EXPLAIN (FORMAT JSON) plan tree and pull out what we track for
+    regressions: node types, index usage and shared buffer counters.
+    """
+    node_types: List[str] = []
+    indexes: List[str] = []
+    seq_scans: List[str] = []
+
+    def walk(node: Dict[str, Any]) -> None:
+        ntype = node.get("Node Type", "")
+        node_types.append(ntype)
+        if node.get("Index Name"):
+            indexes.append(node["Index Name"])
+        if ntype == "Seq Scan" and node.get("Relation Name"):
+            seq_scans.append(node["Relation Name"])
+        for child in node.get("Plans", []) or []:
+            walk(child)
+
+    root = plan.get("Plan") or {}
+    if root:
+        walk(root)
+    return {
+        "uses_index": bool(indexes),
+        "indexes": sorted(set(indexes)),
+        "seq_scans": sorted(set(seq_scans)),
+        "node_types": node_types,
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+        "planning_time_ms": plan.get("Planning Time"),
+        "execution_time_ms": plan.get("Execution Time"),
+    }
+
+@router.post("/_explain")
+def search_explain(payload: SearchIn, analyze: bool = True) -> Dict[str, Any]:
+    """
+    Run the same query as POST /search under EXPLAIN (ANALYZE, BUFFERS) and report:
+      - the JSON plan plus a short summary (index usage, buffers, plan/exec time),
+      - per-stage wall times: embedding, SQL, post-processing,
+      - candidate counts before and after the per-section diversity filter
+        (diversity="mmr": the candidate pool and what MMR kept from it).
+    analyze=false returns the estimated plan only (query is not executed twice).
+    Every statement runs under SEARCH_EXPLAIN_TIMEOUT_MS; past it -> 504. An
+    embedder that is open or failing -> 503, one that misses the deadline -> 504.
+    """
+    t_total = perf_counter()
+
+    t0 = perf_counter()
+    q_vec, reason = _embed_query(payload)
+    if q_vec is None:
+        # Nothing to explain without a query vector (no lexical fallback here)
+        if reason == "embedder_deadline":
+            raise HTTPException(status_code=504, detail="embedder missed the deadline")
+        raise _unavailable(f"embedder unavailable ({reason})")
+    embed_ms = (perf_counter() - t0) * 1000.0
+
+    qarr_sql = _vector_sql(q_vec)
+    qprefix_sql = _query_prefix_sql(q_vec)
+    div = _diversity(payload)
+    sql_full, full_params = _build_query(payload, q_vec, div)
+    ctes, cte_params = _search_ctes(payload, qarr_sql, qprefix_sql)
+    sql_counts = f"""
+    {ctes.strip()}
+    SELECT
+      (SELECT COUNT(*) FROM scored)                      AS before_diversity,
+      (SELECT COUNT(*) FROM best_per_section WHERE rn <= {int(div["max_per_section"] or 1)}) AS after_diversity;
+    """.strip()
+
+    explain_opts = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            _set_statement_timeout(cur, SEARCH_EXPLAIN_TIMEOUT_MS)
+            _set_candidate_search(cur, payload, div.get("pool", 0))
+            t0 = perf_counter()
+            cur.execute(f"EXPLAIN ({explain_opts}) {sql_full}", full_params)
+            explain_row = cur.fetchone()
+            explain_ms = (perf_counter() - t0) * 1000.0
+
+            t0 = perf_counter()
+            cur.execute(sql_full, full_params)
+            rows = cur.fetchall()
+            sql_ms = (perf_counter() - t0) * 1000.0
+
+            t0 = perf_counter()
+            if div["mode"] == "mmr":
+                counts = {"before_diversity": len(rows)}
+            else:
+                cur.execute(sql_counts, tuple(cte_params))
+                counts = cur.fetchone() or {}
+            counts_ms = (perf_counter() - t0) * 1000.0
+    except psycopg.errors.QueryCanceled:
+        raise HTTPException(status_code=504,
+                            detail=f"explain exceeded SEARCH_EXPLAIN_TIMEOUT_MS={SEARCH_EXPLAIN_TIMEOUT_MS}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"explain failed: {e}")
+
+    t0 = perf_counter()
+    if div["mode"] == "mmr":
+        rows = _mmr_rerank(payload, q_vec, rows, div)
+        counts["after_diversity"] = payload.offset + len(rows)
+    out_rows = _postprocess_rows(payload, rows, VECTOR_METRIC)
+    post_ms = (perf_counter() - t0) * 1000.0
+
+    # psycopg returns the json column already decoded: [ {Plan: ..., ...} ]
+    plan_doc = next(iter(explain_row.values())) if explain_row else []
+    if isinstance(plan_doc, str):
+        plan_doc = json.loads(plan_doc)
+    plan = plan_doc[0] if plan_doc else {}
+
+    return {
+        "query": payload.text,
+        "analyze": analyze,
+        "metric": VECTOR_METRIC,
+        "timings_ms": {
+            "embed": round(embed_ms, 3),
+            "sql": round(sql_ms, 3),
+            "post": round(post_ms, 3),
+            "explain": round(explain_ms, 3),
+            "counts": round(counts_ms, 3),
+            "total": round((perf_counter() - t_total) * 1000.0, 3),
+        },
+        "candidates": {
+            "before_diversity": counts.get("before_diversity"),
+            "after_diversity": counts.get("after_diversity"),
+            "returned": len(out_rows),
+        },
+        "summary": _summarize_plan(plan),
+        "plan": plan,
+        "two_stage": SEARCH_TWO_STAGE,
+        "diversity": div,
+        "sql": re.sub(r"\s+", " ", sql_full.replace(qarr_sql, "<INLINE_VECTOR>").replace(qprefix_sql or "\0", "<INLINE_PREFIX>")),
+    }
+
 # -------------------------------
 # Quick sanity: self-distance should be 0.0 (L2)
 # -------------------------------
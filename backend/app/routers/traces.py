@@ -0,0 +1,38 @@
+# app/routers/traces.py
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException
+from typing import Dict, Any
+
+from app.timing import RING, get_trace, recent_traces
+
+router = APIRouter(prefix="/admin/traces", tags=["traces"])
+
+
+@router.get("")
+def list_traces(limit: int = 50) -> Dict[str, Any]:
+    """
+    Most recent traces held in the in-memory ring buffer (newest first):
+    trace_id (= request id), root span name, total duration, span/error counts.
+    """
+    items = recent_traces(limit=max(1, min(limit, 500)))
+    return {"count": len(items), "traces": items}
+
+
+@router.get("/{trace_id}")
+def show_trace(trace_id: str) -> Dict[str, Any]:
+    """
+    All spans buffered for one trace, in start order, with parent ids so the
+    client can rebuild the tree (embed -> sql -> post, etc.).
+    """
+    spans = get_trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="trace not found (expired from ring buffer?)")
+    return {"trace_id": trace_id, "spans": spans}
+
+
+@router.delete("")
+def clear_traces() -> Dict[str, Any]:
+    """Drop everything in the ring buffer."""
+    RING.clear()
+    return {"cleared": True}
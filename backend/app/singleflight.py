@@ -0,0 +1,102 @@
+# app/singleflight.py
+"""
+Single-flight request coalescing.
+
+While a call for `key` is running, identical calls wait for it and get the same
+result (or the same exception) instead of running it again. Nothing is cached
+afterwards: the next call after completion starts a new flight.
+
+Works across threads (sync routes run in Starlette's threadpool) and asyncio tasks:
+the shared slot is a concurrent.futures.Future, which sync followers block on and
+async followers await through asyncio.wrap_future().
+
+    SEARCH_FLIGHT.do(key, fn, *args)            # sync
+    await SEARCH_FLIGHT.do_async(key, coro_fn)  # async
+
+Followers share the leader's result object -- treat it as read-only.
+followers(key) tells the leader whether anyone else depends on its run (e.g. before
+cancelling it because its own client went away).
+Counters: app_singleflight_calls_total{group, role=leader|follower}.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .metrics import COALESCED
+from .timing import current_span
+
+
+class SingleFlight:
+    def __init__(self, group: str) -> None:
+        self.group = group
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                leader = False
+                fut.followers += 1
+            else:
+                fut = Future()
+                fut.followers = 0
+                self._calls[key] = fut
+                leader = True
+        role = "leader" if leader else "follower"
+        COALESCED.inc(group=self.group, role=role)
+        sp = current_span()
+        if sp is not None:
+            sp.set(**{f"singleflight.{self.group}": role})
+        return fut, leader
+
+    def _finish(self, key: Hashable, fut: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, fut)
+            fut.set_exception(e)
+            raise
+        self._finish(key, fut)
+        fut.set_result(result)
+        return result
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        fut, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(fut)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, fut)
+            fut.set_exception(e)
+            raise
+        self._finish(key, fut)
+        fut.set_result(result)
+        return result
+
+    def followers(self, key: Hashable) -> int:
+        """How many callers joined the flight currently running for `key` (0 if none)."""
+        with self._lock:
+            fut = self._calls.get(key)
+            return fut.followers if fut is not None else 0
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight(),
+            "leaders": int(COALESCED.value(group=self.group, role="leader")),
+            "followers": int(COALESCED.value(group=self.group, role="follower")),
+        }
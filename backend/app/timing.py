@@ -1,43 +1,292 @@
 # app/timing.py
-from time import perf_counter
-from functools import wraps
+"""
+Timing + lightweight tracing.
+
+- timeit / timed_block: stage timers (ingestion.log start/end lines + stage metrics),
+  now also recorded as spans.
+- span / traced: nested spans. The current request id and parent span live in
+  contextvars, so they follow the call across `await`s, asyncio tasks and
+  Starlette's threadpool (sync routes) without being passed around.
+- Finished spans go to the exporters picked by TRACE_EXPORTERS (comma list):
+    ring  -> in-memory ring buffer (TRACE_RING_SIZE, default 2048), served by /admin/traces
+    file  -> JSON lines in logs/traces.log through the queue-backed logger
+    none  -> disable export (spans still time + nest)
+  Default: "ring".
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
 from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
 from .logging_utils import setup_logger, log_kv
+from .metrics import STAGE_LATENCY, STAGE_RUNS
+
+# -----------------------------
+# Spans + context propagation
+# -----------------------------
+_REQUEST_ID: ContextVar[Optional[str]] = ContextVar("app_request_id", default=None)
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("app_current_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ts: float  # epoch seconds
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    duration_ms: Optional[float] = None
+    status: str = "ok"
+    thread: str = ""
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ts": self.start_ts,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "thread": self.thread,
+            "attrs": self.attrs,
+        }
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def get_request_id() -> Optional[str]:
+    return _REQUEST_ID.get()
+
+
+def set_request_id(request_id: Optional[str] = None):
+    """Bind a request id to the current context; returns a token for reset_request_id()."""
+    return _REQUEST_ID.set(request_id or new_request_id())
+
+
+def reset_request_id(token) -> None:
+    _REQUEST_ID.reset(token)
+
+
+def current_span() -> Optional[Span]:
+    return _CURRENT_SPAN.get()
+
+
+# -----------------------------
+# Exporters
+# -----------------------------
+class RingBufferExporter:
+    """Keeps the last N finished spans in memory (deque appends are thread-safe)."""
+
+    def __init__(self, size: int = 2048) -> None:
+        self._spans: Deque[Dict[str, Any]] = deque(maxlen=size)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span.to_dict())
+
+    def spans(self) -> List[Dict[str, Any]]:
+        return list(self._spans)
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+class JsonFileExporter:
+    """One JSON object per finished span, written by the background log writer."""
+
+    def __init__(self, name: str = "traces") -> None:
+        self.name = name
+
+    def export(self, span: Span) -> None:
+        # setup_logger is a cached lookup; calling it here survives shutdown_logging()
+        setup_logger(self.name, raw=True).info(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+
+_EXPORTERS: Optional[List[Any]] = None
+_EXPORTERS_LOCK = threading.Lock()
+RING = RingBufferExporter(int(os.getenv("TRACE_RING_SIZE", "2048")))
+
+
+def _exporters() -> List[Any]:
+    global _EXPORTERS
+    if _EXPORTERS is None:
+        with _EXPORTERS_LOCK:
+            if _EXPORTERS is None:
+                names = {n.strip().lower() for n in os.getenv("TRACE_EXPORTERS", "ring").split(",") if n.strip()}
+                exps: List[Any] = []
+                if "ring" in names:
+                    exps.append(RING)
+                if "file" in names:
+                    exps.append(JsonFileExporter())
+                _EXPORTERS = exps
+    return _EXPORTERS
+
+
+def _export(span: Span) -> None:
+    for exp in _exporters():
+        try:
+            exp.export(span)
+        except Exception:
+            pass  # tracing must never break the traced code
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """
+    Open a child of the current span (or a root span for the current request id).
+    Usable from sync code and inside async functions:
+        with span("search.sql", top_k=5) as sp:
+            ...
+            sp.set(rows=len(rows))
+    """
+    parent = _CURRENT_SPAN.get()
+    trace_id = parent.trace_id if parent else (_REQUEST_ID.get() or new_request_id())
+    sp = Span(
+        name=name,
+        trace_id=trace_id,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        start_ts=time.time(),
+        attrs=dict(attrs),
+        thread=threading.current_thread().name,
+    )
+    token = _CURRENT_SPAN.set(sp)
+    start = perf_counter()
+    try:
+        yield sp
+    except BaseException as e:
+        sp.status = "error"
+        sp.attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        sp.duration_ms = round((perf_counter() - start) * 1000.0, 3)
+        _CURRENT_SPAN.reset(token)
+        _export(sp)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of span(); works for plain and async functions."""
+    def _decorator(fn):
+        span_name = name or fn.__qualname__
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def _awrapped(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return _awrapped
+
+        @wraps(fn)
+        def _wrapped(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return _wrapped
+    return _decorator
+
+
+def recent_traces(limit: int = 50) -> List[Dict[str, Any]]:
+    """Summaries of the most recent traces in the ring buffer (newest first)."""
+    by_trace: Dict[str, Dict[str, Any]] = {}
+    for s in RING.spans():
+        t = by_trace.setdefault(s["trace_id"], {"trace_id": s["trace_id"], "spans": 0, "root": None,
+                                                "duration_ms": None, "start_ts": s["start_ts"], "errors": 0})
+        t["spans"] += 1
+        t["start_ts"] = min(t["start_ts"], s["start_ts"])
+        if s["status"] == "error":
+            t["errors"] += 1
+        if s["parent_id"] is None:
+            t["root"] = s["name"]
+            t["duration_ms"] = s["duration_ms"]
+    out = sorted(by_trace.values(), key=lambda t: t["start_ts"], reverse=True)
+    return out[:limit]
+
+
+def get_trace(trace_id: str) -> List[Dict[str, Any]]:
+    """All buffered spans for one trace, in start order."""
+    return sorted((s for s in RING.spans() if s["trace_id"] == trace_id), key=lambda s: s["start_ts"])
+
+
+# -----------------------------
+# Stage timers (log + metrics + span)
+# -----------------------------
+def _finish_stage(log, stage: str, elapsed: float, outcome: str) -> None:
+    STAGE_LATENCY.observe(elapsed, stage=stage)
+    STAGE_RUNS.inc(stage=stage, outcome=outcome)
+    log_kv(log, event="end", stage=stage, elapsed_ms=int(elapsed * 1000), request_id=get_request_id())
+
 
 def timeit(stage: str):
     """
     Decorator to time a function call and log start/end + elapsed_ms
     to logs/ingestion.log under the shared 'ingestion' logger.
+    Also feeds app_stage_duration_seconds / app_stage_runs_total (see app/metrics.py)
+    and records a span named after the stage. Works on async functions too.
     Usage:
         @timeit("parse-pages")
         def parse_pages(...): ...
     """
     def _decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def _awrapped(*args, **kwargs):
+                log = setup_logger("ingestion")
+                log_kv(log, event="start", stage=stage, request_id=get_request_id())
+                start = perf_counter()
+                outcome = "error"
+                try:
+                    with span(stage):
+                        result = await fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    _finish_stage(log, stage, perf_counter() - start, outcome)
+            return _awrapped
+
         @wraps(fn)
         def _wrapped(*args, **kwargs):
             log = setup_logger("ingestion")
-            log_kv(log, event="start", stage=stage)
+            log_kv(log, event="start", stage=stage, request_id=get_request_id())
             start = perf_counter()
+            outcome = "error"
             try:
-                return fn(*args, **kwargs)
+                with span(stage):
+                    result = fn(*args, **kwargs)
+                outcome = "ok"
+                return result
             finally:
-                elapsed_ms = int((perf_counter() - start) * 1000)
-                log_kv(log, event="end", stage=stage, elapsed_ms=elapsed_ms)
+                _finish_stage(log, stage, perf_counter() - start, outcome)
         return _wrapped
     return _decorator
 
 @contextmanager
-def timed_block(stage: str):
+def timed_block(stage: str, **attrs):
     """
     Context manager for ad-hoc blocks:
         with timed_block("chunk-toc"):
             ... do work ...
+    Yields the stage's Span so callers can attach attributes.
     """
     log = setup_logger("ingestion")
-    log_kv(log, event="start", stage=stage)
+    log_kv(log, event="start", stage=stage, request_id=get_request_id())
     start = perf_counter()
+    outcome = "error"
     try:
-        yield
+        with span(stage, **attrs) as sp:
+            yield sp
+        outcome = "ok"
     finally:
-        elapsed_ms = int((perf_counter() - start) * 1000)
-        log_kv(log, event="end", stage=stage, elapsed_ms=elapsed_ms)
+        _finish_stage(log, stage, perf_counter() - start, outcome)
@@ -0,0 +1,76 @@
+# app/toc_utils.py
+"""
+TOC helpers shared by /store-toc and /chunk-toc.
+
+compute_toc_ranges() turns an ordered TOC into page ranges + section paths in a
+single pass: an entry's range ends right before the next entry of the same or a
+higher level (or at page_count). Open entries sit on a stack whose levels are
+strictly increasing, so each entry is pushed and popped once -> O(n) overall,
+instead of scanning forward from every entry (O(n^2) for deep/wide TOCs).
+"""
+from typing import List, NamedTuple, Sequence, Tuple
+
+
+class TocRange(NamedTuple):
+    level: int
+    title: str
+    start: int
+    end: int
+    order_index: int
+    path: str  # "Chapter > Section > Subsection"
+
+
+def compute_toc_ranges(entries: Sequence[Tuple[int, str, int, int]], page_count: int) -> List[TocRange]:
+    """
+    entries: (level, title, page_from, order_index), already in TOC order.
+    Returns one TocRange per entry, same order.
+    """
+    n = len(entries)
+    ends = [page_count] * n
+    paths: List[str] = [""] * n
+
+    open_idx: List[int] = []    # entries still waiting for their end page...
+    open_lvl: List[int] = []    # ...and their levels (strictly increasing bottom -> top)
+    titles: List[str] = []      # title per level (index = level - 1), "" for skipped levels
+
+    for i, (lvl, title, start, _) in enumerate(entries):
+        if lvl < 1:
+            lvl = 1
+
+        # Close every open entry of the same or a deeper level
+        while open_lvl and open_lvl[-1] >= lvl:
+            open_lvl.pop()
+            j = open_idx.pop()
+            j_start = entries[j][2]
+            ends[j] = start - 1 if start - 1 > j_start else j_start
+        open_idx.append(i)
+        open_lvl.append(lvl)
+
+        # Section path: keep ancestors, pad skipped levels, replace this level
+        depth = len(titles)
+        if depth < lvl:
+            titles.extend([""] * (lvl - depth))
+        elif depth > lvl:
+            del titles[lvl:]
+        titles[lvl - 1] = title
+        paths[i] = " > ".join(filter(None, titles))
+
+    make = TocRange._make
+    return [make((e[0], e[1], e[2], ends[i], e[3], paths[i])) for i, e in enumerate(entries)]
+
+
+def leaf_ranges(ranges: Sequence[TocRange]) -> List[TocRange]:
+    """
+    Trim every entry to the pages it owns before its first child starts, so
+    parent and child chunks do not repeat the same pages. Entries left with no
+    pages of their own (child starts on the parent's first page) are dropped.
+    """
+    out: List[TocRange] = []
+    for i, r in enumerate(ranges):
+        nxt = ranges[i + 1] if i + 1 < len(ranges) else None
+        end = r.end
+        if nxt is not None and nxt.level > r.level:  # first child
+            end = min(end, nxt.start - 1)
+        if end >= r.start:
+            out.append(r._replace(end=end))
+    return out
@@ -0,0 +1,11 @@
+-- Per-document PDF metadata, read once from the file (see app/document_meta.py)
+CREATE TABLE IF NOT EXISTS document_meta (
+    document_id BIGINT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    local_path TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    toc JSONB NOT NULL DEFAULT '[]'::jsonb,   -- [[level, title, page], ...] as PyMuPDF returns it
+    sha256 TEXT NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_mtime DOUBLE PRECISION NOT NULL,     -- os.stat().st_mtime
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,70 @@
+# scripts/add_embedding_prefix_column.py
+"""
+Add chunk_embeddings.embedding_prefix for /search's two-stage mode:
+
+    embedding_prefix vector(<dims>)  = l2_normalize(subvector(embedding, 1, <dims>))
+
+backfill it for existing rows (batches of --batch-size, one commit each) and build
+an HNSW index on it with the operator class of VECTOR_METRIC. New rows get it from
+bulk_upsert_embeddings once EMBED_PREFIX_DIMS=<dims> is set;
+then turn on SEARCH_TWO_STAGE=1.
+
+Needs pgvector >= 0.7 (subvector, l2_normalize). Changing --dims means dropping
+the column first. Safe to re-run.
+"""
+import argparse
+import os
+
+from sqlalchemy import text
+from app.db import SessionLocal
+from app.embedding_store import VECTOR_METRIC
+
+def main():
+    parser = argparse.ArgumentParser(description="Add + backfill + index chunk_embeddings.embedding_prefix")
+    parser.add_argument("--dims", type=int, default=int(os.getenv("EMBED_PREFIX_DIMS") or 256))
+    parser.add_argument("--batch-size", type=int, default=5000, dest="batch_size")
+    parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    parser.add_argument("--ef-construction", type=int, default=64, dest="ef_construction")
+    args = parser.parse_args()
+    dims = int(args.dims)
+    ops = "vector_ip_ops" if VECTOR_METRIC == "ip" else "vector_l2_ops"
+
+    db = SessionLocal()
+    try:
+        db.execute(text(f"ALTER TABLE chunk_embeddings ADD COLUMN IF NOT EXISTS embedding_prefix vector({dims})"))
+        db.commit()
+
+        filled = 0
+        while True:
+            n = db.execute(text(f"""
+                UPDATE chunk_embeddings ce
+                SET embedding_prefix = l2_normalize(subvector(ce.embedding, 1, {dims}))
+                WHERE ce.chunk_id IN (
+                    SELECT chunk_id FROM chunk_embeddings
+                    WHERE embedding_prefix IS NULL
+                    ORDER BY chunk_id
+                    LIMIT :n
+                )
+            """), {"n": args.batch_size}).rowcount
+            db.commit()
+            filled += n
+            if n < args.batch_size:
+                break
+            print(f"backfilled {filled} rows")
+
+        db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_chunk_embeddings_prefix_hnsw "
+            f"ON chunk_embeddings USING hnsw (embedding_prefix {ops}) "
+            f"WITH (m = {int(args.m)}, ef_construction = {int(args.ef_construction)})"
+        ))
+        db.commit()
+        print(f"SUCCESS: embedding_prefix vector({dims}) ensured, {filled} row(s) backfilled, {ops} index ensured.")
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: failed to add embedding_prefix: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
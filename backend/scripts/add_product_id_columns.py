@@ -0,0 +1,48 @@
+# scripts/add_product_id_columns.py
+from sqlalchemy import text
+from app.db import SessionLocal
+
+# Denormalize documents.product_id onto the chunk + vector tables so /search can
+# filter by product without joining documents on the hot path.
+SQL_STEPS = [
+    "ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS product_id BIGINT",
+    "ALTER TABLE chunk_embeddings ADD COLUMN IF NOT EXISTS product_id BIGINT",
+
+    # Backfill from the source of truth (documents)
+    """
+    UPDATE document_chunks c
+    SET product_id = d.product_id
+    FROM documents d
+    WHERE d.id = c.document_id
+      AND c.product_id IS DISTINCT FROM d.product_id
+    """,
+    """
+    UPDATE chunk_embeddings ce
+    SET product_id = c.product_id
+    FROM document_chunks c
+    WHERE c.id = ce.chunk_id
+      AND ce.product_id IS DISTINCT FROM c.product_id
+    """,
+
+    # Plain btree for the filter itself; per-product ANN indexes are created by
+    # scripts/create_product_vector_indexes.py
+    "CREATE INDEX IF NOT EXISTS idx_document_chunks_product ON document_chunks(product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chunk_embeddings_product ON chunk_embeddings(product_id)",
+]
+
+def main():
+    db = SessionLocal()
+    try:
+        for sql in SQL_STEPS:
+            db.execute(text(sql))
+        db.commit()
+        print("SUCCESS: product_id ensured + backfilled on document_chunks and chunk_embeddings.")
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: failed to alter schema: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# scripts/create_document_meta_table.py
+from pathlib import Path
+
+from sqlalchemy import text
+from app.db import SessionLocal
+
+# Same DDL as db/003_add_document_meta.sql
+SQL = (Path(__file__).resolve().parents[1] / "db" / "003_add_document_meta.sql").read_text(encoding="utf-8")
+
+def main():
+    db = SessionLocal()
+    try:
+        db.execute(text(SQL))
+        db.commit()
+        print("SUCCESS: table 'document_meta' ensured.")
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: failed to create table: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# scripts/create_product_vector_indexes.py
+"""
+Create one partial HNSW index per product on chunk_embeddings:
+
+    CREATE INDEX idx_chunk_embeddings_hnsw_p<id>
+        ON chunk_embeddings USING hnsw (embedding vector_l2_ops)
+        WHERE product_id = <id>
+
+A query filtered with `ce.product_id = <id>` and ordered by `embedding <-> q`
+can then walk a graph that only contains that product's vectors; /search's
+product-scoped query starts with exactly that (search._product_knn_sql).
+Products below --min-rows are skipped: the btree on product_id plus an exact
+scan is cheaper than maintaining a graph for a handful of rows.
+
+The operator class must match the /search operator: with VECTOR_METRIC=ip
+(`<#>`, unit vectors) the indexes are built with vector_ip_ops and named
+idx_chunk_embeddings_hnsw_ip_p<id>. --global also builds one unfiltered index.
+
+Run after scripts/add_product_id_columns.py. Safe to re-run.
+"""
+import argparse
+
+from sqlalchemy import text
+from app.db import SessionLocal
+from app.embedding_store import VECTOR_METRIC
+
+SQL_COUNTS = """
+SELECT product_id, COUNT(*) AS n
+FROM chunk_embeddings
+WHERE product_id IS NOT NULL
+GROUP BY product_id
+ORDER BY product_id
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description="Create per-product partial HNSW indexes")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Skip products with fewer vectors")
+    parser.add_argument("--m", type=int, default=16, help="HNSW m")
+    parser.add_argument("--ef-construction", type=int, default=64, dest="ef_construction")
+    parser.add_argument("--metric", choices=("l2", "ip"), default=VECTOR_METRIC,
+                        help="Operator class to build (defaults to VECTOR_METRIC)")
+    parser.add_argument("--global", action="store_true", dest="global_index",
+                        help="Also build one index over all products")
+    args = parser.parse_args()
+    ops = "vector_ip_ops" if args.metric == "ip" else "vector_l2_ops"
+    prefix = "idx_chunk_embeddings_hnsw_ip" if args.metric == "ip" else "idx_chunk_embeddings_hnsw"
+    with_sql = f"WITH (m = {int(args.m)}, ef_construction = {int(args.ef_construction)})"
+
+    db = SessionLocal()
+    try:
+        counts = db.execute(text(SQL_COUNTS)).fetchall()
+        created = 0
+        if args.global_index:
+            db.execute(text(f"CREATE INDEX IF NOT EXISTS {prefix} ON chunk_embeddings USING hnsw (embedding {ops}) {with_sql}"))
+            db.commit()
+            created += 1
+            print(f"ensured {prefix}")
+        for product_id, n in counts:
+            if n < args.min_rows:
+                print(f"skip product_id={product_id} rows={n} (< {args.min_rows})")
+                continue
+            pid = int(product_id)
+            db.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {prefix}_p{pid} "
+                f"ON chunk_embeddings USING hnsw (embedding {ops}) "
+                f"{with_sql} "
+                f"WHERE product_id = {pid}"
+            ))
+            db.commit()
+            created += 1
+            print(f"ensured {prefix}_p{pid} rows={n}")
+        print(f"SUCCESS: {created} partial index(es) ensured.")
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: failed to create indexes: {e}")
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+
+import psycopg
+import pytest
+
+from app.admission import AdmissionLimiter, CancelScope, Overloaded, TTLCache
+from app.routers import search
+
+
+def test_limiter_queues_fifo_then_sheds():
+    lim = AdmissionLimiter("test-fifo", max_concurrent=1, max_queue=2, queue_timeout=1.0)
+    order = []
+
+    async def worker(i):
+        await lim.acquire()
+        order.append(i)
+        await asyncio.sleep(0.01)
+        lim.release()
+
+    async def main():
+        await lim.acquire()  # hold the only slot
+        tasks = [asyncio.ensure_future(worker(i)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        assert lim.stats()["waiting"] == 2
+        with pytest.raises(Overloaded) as ei:
+            await lim.acquire()  # queue full -> immediate shed
+        assert ei.value.reason == "shed"
+        assert ei.value.retry_after_header == "1"
+        lim.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == [0, 1]
+    assert lim.stats()["active"] == 0 and lim.stats()["waiting"] == 0
+
+
+def test_limiter_queue_timeout_gives_back_nothing():
+    lim = AdmissionLimiter("test-timeout", max_concurrent=1, max_queue=4, queue_timeout=0.05)
+
+    async def main():
+        await lim.acquire()
+        with pytest.raises(Overloaded) as ei:
+            await lim.acquire()
+        assert ei.value.reason == "timeout"
+        lim.release()
+
+    asyncio.run(main())
+    assert lim.stats()["active"] == 0 and lim.stats()["waiting"] == 0
+    assert lim.stats()["timeouts"] == 1
+
+
+def test_limiter_hands_slots_across_threads_and_loops():
+    lim = AdmissionLimiter("test-threads", max_concurrent=2, max_queue=16, queue_timeout=2.0)
+    peak = []
+    lock = threading.Lock()
+    running = [0]
+
+    async def one():
+        await lim.acquire()
+        try:
+            with lock:
+                running[0] += 1
+                peak.append(running[0])
+            await asyncio.sleep(0.01)
+            with lock:
+                running[0] -= 1
+        finally:
+            lim.release()
+
+    threads = [threading.Thread(target=lambda: asyncio.run(one())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(peak) == 8 and max(peak) <= 2
+    assert lim.stats()["active"] == 0
+
+
+def test_cancel_scope_cancels_attached_connection():
+    class Conn:
+        cancelled = 0
+
+        def cancel(self):
+            self.cancelled += 1
+
+    scope, conn = CancelScope(), Conn()
+    assert scope.attach(conn) is True
+    scope.cancel()
+    assert conn.cancelled == 1 and scope.cancelled
+    assert scope.attach(Conn()) is False
+
+
+def test_ttl_cache_expires_and_evicts(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.admission.time.monotonic", lambda: now[0])
+    cache = TTLCache("test", max_items=2, ttl=10)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("a") is None
+    now[0] += 5
+    assert cache.get("b") == (2, 5.0)
+    now[0] += 6
+    assert cache.get("c") is None
+
+
+# -----------------------------
+# /search: shedding and degraded mode
+# -----------------------------
+def _hold(lim):
+    asyncio.run(lim.acquire())
+
+
+def test_search_sheds_with_503_and_retry_after(client, monkeypatch):
+    lim = AdmissionLimiter("test-route", max_concurrent=1, max_queue=0, queue_timeout=0.1, retry_after=2.5)
+    monkeypatch.setattr(search, "SEARCH_LIMITER", lim)
+    monkeypatch.setattr(search, "SEARCH_CACHE", TTLCache("test-route", 8, 60))
+    _hold(lim)
+
+    r = client.post("/search", json={"text": "propeller"})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "3"
+
+    payload = search.SearchIn(text="propeller")
+    search.SEARCH_CACHE.put(search._payload_key(payload), {"query": "propeller", "results": [{"chunk_id": 1}]})
+    r = client.post("/search", json={"text": "propeller"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["results"] == [{"chunk_id": 1}]
+    assert body["degraded"]["source"] == "cache" and body["degraded"]["reason"] == "shed"
+    lim.release()
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+        if "set_config" in sql:
+            return
+        if "<->" in sql:
+            raise psycopg.errors.QueryCanceled("canceling statement due to statement timeout")
+        self.rows = [{"chunk_id": 7, "dist": 0.5, "document_id": 1, "start_page": 2,
+                      "source_url": "http://x/doc.pdf", "preview": "replace the propeller"}]
+
+    def fetchall(self):
+        return self.rows
+
+
+class _FakeConn:
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_statement_timeout_falls_back_to_lexical(client, monkeypatch):
+    conns = []
+
+    def fake_conn():
+        conns.append(_FakeConn())
+        return conns[-1]
+
+    monkeypatch.setattr(search, "_get_conn", fake_conn)
+    monkeypatch.setattr(search, "embed_one", lambda text: [0.1, 0.2])
+    monkeypatch.setattr(search, "SEARCH_CACHE", TTLCache("test-lexical", 8, 60))
+
+    r = client.post("/search", json={"text": "propeller", "top_k": 3})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["degraded"] == {"reason": "statement_timeout", "source": "lexical"}
+    assert [row["chunk_id"] for row in body["results"]] == [7]
+    assert body["results"][0]["page_url"] == "http://x/doc.pdf#page=2"
+    # both attempts set a transaction-local statement_timeout first
+    assert all("set_config" in c.statements[0] for c in conns) and len(conns) == 2
+    assert "websearch_to_tsquery" in conns[1].statements[1]
+    assert len(search.SEARCH_CACHE) == 0  # degraded answers are not cached
+
+
+def test_follower_reissues_when_its_leader_was_cancelled(monkeypatch):
+    from fastapi import HTTPException
+
+    from app import deadline
+
+    payload = search.SearchIn(text="propeller")
+    key = search._flight_key(payload, 5000)
+    assert key != search._flight_key(payload, 200)  # tighter budgets run on their own
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def fake_search(payload, scope):
+        calls.append(scope)
+        if len(calls) == 1:
+            started.set()
+            release.wait(2)
+            raise HTTPException(status_code=499, detail="client closed request")
+        return {"results": [{"chunk_id": 1}]}
+
+    monkeypatch.setattr(search, "_semantic_search", fake_search)
+    out = {}
+
+    def leader():
+        try:
+            search.run_search(payload, leader_scope, 5000)
+        except HTTPException as e:
+            out["leader"] = e.status_code
+
+    def follower():
+        out["follower"] = search.run_search(payload, CancelScope(), 5000)
+
+    leader_scope = CancelScope()
+    lt = threading.Thread(target=leader)
+    lt.start()
+    assert started.wait(2)
+    ft = threading.Thread(target=follower)
+    ft.start()
+    while search.SEARCH_FLIGHT.followers(key) == 0:
+        time.sleep(0.001)
+    # the leader's client goes away, but a follower still wants the answer
+    dl = deadline.Deadline()
+    search._cancel_unless_shared(leader_scope, dl, key)
+    assert not leader_scope.cancelled and not dl.cancelled
+    leader_scope.cancel()  # the late-joiner race: cancelled anyway
+    release.set()
+    lt.join(2)
+    ft.join(2)
+    assert out == {"leader": 499, "follower": {"results": [{"chunk_id": 1}]}}
+    assert len(calls) == 2
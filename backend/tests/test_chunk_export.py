@@ -0,0 +1,93 @@
+import gzip
+import json
+from datetime import datetime, timezone
+
+from app.chunk_export import Checkpoint, _export_files, _export_jsonl, _key, iter_chunk_batches
+
+ROWS = [
+    {"id": i, "document_id": 1, "section_path": f"S{i // 3}", "level": 1, "start_page": 1, "end_page": 2,
+     "chunk_index": i % 3, "content": f"text {i}", "created_at": datetime(2025, 1, 1, tzinfo=timezone.utc)}
+    for i in range(10)
+]
+
+
+def _batches(fail_after=None, source=ROWS):
+    def batches(after):
+        rows = [r for r in source if after is None or tuple(_key(r)) > tuple(after)]
+        for n, i in enumerate(range(0, len(rows), 4)):
+            if fail_after is not None and n == fail_after:
+                raise RuntimeError("connection lost")
+            yield rows[i:i + 4]
+    return batches
+
+
+def test_jsonl_resume_after_crash(tmp_path):
+    ckpt = Checkpoint(tmp_path)
+    try:
+        _export_jsonl(_batches(fail_after=1), tmp_path, ckpt, None)
+    except RuntimeError:
+        pass
+    with open(tmp_path / "chunks.jsonl.gz", "ab") as f:
+        f.write(b"\x1f\x8b half a member")  # torn write after the last checkpoint
+
+    state = ckpt.load("jsonl")
+    assert state["rows"] == 4
+    out = _export_jsonl(_batches(), tmp_path, ckpt, state)
+    assert out["resumed_from"] == 4 and out["rows"] == 10
+
+    with gzip.open(tmp_path / "chunks.jsonl.gz", "rt", encoding="utf-8") as f:
+        ids = [json.loads(line)["chunk_id"] for line in f]
+    assert ids == list(range(10))
+
+
+def test_files_export_writes_index(tmp_path):
+    out = _export_files(_batches(), tmp_path, Checkpoint(tmp_path), None, workers=3)
+    assert out["files_written"] == 10
+    index = json.loads((tmp_path / "chunks.json").read_text(encoding="utf-8"))
+    assert [e["chunk_id"] for e in index] == list(range(10))
+    assert (tmp_path / "0001__S0__ci_0.txt").read_text(encoding="utf-8").endswith("text 0")
+    assert not (tmp_path / "chunks.index.jsonl").exists()
+
+
+def test_resume_across_chunks_without_a_section(tmp_path):
+    rows = [dict(r, section_path=None) if r["id"] < 6 else r for r in ROWS]
+    rows.sort(key=_key)  # the export query's order: NULL sections as ''
+    ckpt = Checkpoint(tmp_path)
+    try:
+        _export_jsonl(_batches(fail_after=1, source=rows), tmp_path, ckpt, None)
+    except RuntimeError:
+        pass
+    state = ckpt.load("jsonl")
+    assert state["last_key"] == ["", rows[3]["chunk_index"]]
+    out = _export_jsonl(_batches(source=rows), tmp_path, ckpt, state)
+    assert out["rows"] == 10
+    with gzip.open(tmp_path / "chunks.jsonl.gz", "rt", encoding="utf-8") as f:
+        ids = [json.loads(line)["chunk_id"] for line in f]
+    assert ids == [r["id"] for r in rows]
+
+    # a checkpoint from before the fix stored null for the section
+    cur = _Cursor()
+    list(iter_chunk_batches(_Conn(cur), 1, 4, after=(None, 2)))
+    assert "COALESCE(section_path, '')" in cur.sql and cur.params == (1, "", 2)
+
+
+class _Cursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.sql, self.params = sql, params
+
+    def fetchmany(self, n):
+        return []
+
+
+class _Conn:
+    def __init__(self, cur):
+        self._cur = cur
+
+    def cursor(self, **kwargs):
+        return self._cur
@@ -0,0 +1,108 @@
+import random
+
+from app.chunking import PAGE_SEP, PageBuffer
+from app.toc_utils import compute_toc_ranges, leaf_ranges
+
+
+def test_section_slice_matches_join():
+    rng = random.Random(0)
+    for _ in range(100):
+        pages = sorted(rng.sample(range(1, 40), rng.randint(0, 25)))
+        page_map = {p: "x" * rng.randint(0, 5) + f"p{p}" for p in pages}
+        buf = PageBuffer(page_map)
+        for _ in range(20):
+            a = rng.randint(0, 41)
+            b = rng.randint(a - 2, 42)
+            expected = "\n\n".join(page_map[p] for p in range(a, b + 1) if p in page_map)
+            assert buf.section(a, b) == expected
+
+
+def test_leaf_ranges_trim_parents_before_first_child():
+    entries = [
+        (1, "Maintenance", 10, 1),
+        (2, "Battery", 10, 2),
+        (3, "Storage", 12, 3),
+        (2, "Propellers", 15, 4),
+        (1, "Specs", 20, 5),
+    ]
+    out = leaf_ranges(compute_toc_ranges(entries, 25))
+    # "Maintenance" starts on the same page as its first child -> nothing of its own
+    assert [(r.title, r.start, r.end) for r in out] == [
+        ("Battery", 10, 11),
+        ("Storage", 12, 14),
+        ("Propellers", 15, 19),
+        ("Specs", 20, 25),
+    ]
+
+
+def test_paragraph_strategy_matches_original_splitter():
+    from app.chunking import get_chunker, split_by_paragraphs
+
+    pages = {1: "Alpha one.\n\nAlpha two.", 2: "B" * 50, 3: "Gamma."}
+    buf = PageBuffer(pages)
+    chunker = get_chunker("paragraph", max_chars=20)
+    got = list(chunker.iter_chunks(buf.iter_section(1, 3)))
+    assert got == split_by_paragraphs(buf.section(1, 3).strip(), max_chars=20)
+
+
+def test_token_strategy_budget_overlap_and_words():
+    from app.chunking import RegexTokenizer, TokenChunker
+
+    tok = RegexTokenizer()
+    sentences = [f"Step {i} check the propeller and battery." for i in range(40)]
+    pages = [" ".join(sentences[:25]), " ".join(sentences[25:]) + " " + "word " * 50]
+    chunker = TokenChunker(max_tokens=30, overlap_tokens=10, tokenizer=tok)
+    chunks = list(chunker.iter_chunks(pages))
+
+    assert len(chunks) > 5
+    assert all(tok.count(c) <= 30 for c in chunks)
+    # consecutive chunks share the trailing sentence
+    assert chunks[1].startswith(chunks[0].rsplit(". ", 1)[-1])
+    # the over-long run of words is cut on word boundaries
+    assert {w for c in chunks for w in c.split() if w.startswith("wo")} == {"word"}
+    assert "Step 39 check" in "".join(chunks)
+
+
+def test_unknown_strategy_rejected():
+    import pytest
+    from app.chunking import get_chunker
+
+    with pytest.raises(ValueError):
+        get_chunker("nope")
+
+
+def test_streaming_sections_match_full_buffer_and_window_stays_small():
+    from app.chunking import iter_sections_streaming
+
+    rng = random.Random(1)
+    for _ in range(50):
+        page_count = rng.randint(1, 80)
+        entries, page = [], 1
+        for i in range(rng.randint(1, 30)):
+            page = min(page_count, page + rng.choice([0, 1, 2, 4]))
+            entries.append((rng.randint(1, 4), f"T{i}", page, i + 1))
+        page_map = {p: f"page {p}" for p in range(1, page_count + 1) if rng.random() > 0.1}
+        ranges = leaf_ranges(compute_toc_ranges(entries, page_count))
+        buf = PageBuffer(page_map)
+
+        seen = {}
+        widest = max((r.end - r.start + 1 for r in ranges), default=0)
+        for r, window in iter_sections_streaming(ranges, sorted(page_map.items())):
+            seen[r.order_index] = window.section(r.start, r.end)
+            assert PAGE_SEP.join(window.iter_section(r.start, r.end)) == seen[r.order_index]
+            assert len(window) <= widest + 1
+        assert seen == {r.order_index: buf.section(r.start, r.end) for r in ranges}
+
+
+def test_route_path_chunks_match_the_full_buffer():
+    from app.chunking import get_chunker, iter_sections_streaming
+
+    entries = [(1, "A", 1, 1), (2, "A.1", 2, 2), (2, "A.2", 5, 3), (1, "B", 9, 4), (2, "B.1", 12, 5)]
+    page_map = {p: f"Page {p} first.\n\nPage {p} second." for p in range(1, 16) if p != 6}
+    ranges = compute_toc_ranges(entries, 15)
+    buf = PageBuffer(page_map)
+    for name in ("paragraph", "token"):
+        chunker = get_chunker(name, max_chars=40, max_tokens=12, overlap_tokens=2)
+        got = {r.order_index: list(chunker.chunk_section(window, r.start, r.end))
+               for r, window in iter_sections_streaming(ranges, sorted(page_map.items()))}
+        assert got == {r.order_index: list(chunker.chunk_section(buf, r.start, r.end)) for r in ranges}
@@ -0,0 +1,129 @@
+import psycopg
+import pytest
+
+from app.embedding_store import fetch_texts
+from app.routers import chunks
+
+
+class _Conn:
+    def __init__(self):
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_bulk_embed_reports_per_id_status(client, monkeypatch):
+    conn = _Conn()
+    upserts = []
+    embed_calls = []
+    monkeypatch.setattr(chunks, "_get_conn", lambda: conn)
+    monkeypatch.setattr(chunks, "fetch_texts", lambda c, ids: {1: "alpha", 2: "  ", 3: "gamma", 5: "eps"})
+    monkeypatch.setattr(chunks, "embed_texts", lambda texts: embed_calls.append(list(texts)) or [[0.0]] * len(texts))
+    monkeypatch.setattr(chunks, "bulk_upsert_embeddings", lambda c, ids, vecs, model: upserts.append(list(ids)))
+
+    r = client.post("/admin/chunks/embed", json={"id_from": 1, "id_to": 5, "batch_size": 2})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert [x["status"] for x in body["results"]] == ["embedded", "empty", "embedded", "not_found", "embedded"]
+    assert body["counts"] == {"embedded": 3, "empty": 1, "not_found": 1}
+    assert embed_calls == [["alpha", "gamma"], ["eps"]]
+    assert upserts == [[1, 3], [5]]
+    assert conn.commits == 2
+
+
+def test_bulk_embed_requires_ids(client):
+    assert client.post("/admin/chunks/embed", json={}).status_code == 400
+
+
+class _Cursor:
+    def __init__(self):
+        self.calls = []
+        self.rowcount = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.calls.append((sql, params))
+
+
+class _WriteConn(_Conn):
+    def __init__(self):
+        super().__init__()
+        self.cur = _Cursor()
+
+    def cursor(self):
+        return self.cur
+
+
+def test_single_chunk_embed_uses_the_bulk_write_path(client, monkeypatch):
+    conn = _WriteConn()
+    monkeypatch.setattr(chunks, "_get_conn", lambda: conn)
+    monkeypatch.setattr(chunks, "_fetch_chunk_text", lambda c, cid: "alpha")
+    monkeypatch.setattr(chunks, "embed_one", lambda text: [0.5] * 1536)
+
+    assert client.post("/admin/chunks/7/embed").status_code == 200
+    sql, params = conn.cur.calls[0]
+    assert "unnest(" in sql and params[1] == [7] and conn.commits == 1
+
+    # wrong-dimension vectors are refused before anything is written
+    conn.cur.calls.clear()
+    monkeypatch.setattr(chunks, "embed_one", lambda text: [0.5] * 3)
+    with pytest.raises(RuntimeError, match="Refusing to save embedding of length 3"):
+        client.post("/admin/chunks/7/embed")
+    assert conn.cur.calls == []
+
+
+class _TextConn:
+    """document_chunks with `content` and, if has_text, a legacy `text` column."""
+
+    def __init__(self, has_text=True):
+        self.has_text = has_text
+        self.content = {1: "alpha", 2: "", 3: None}
+        self.text = {2: "beta", 3: ""}
+        self.savepoints = 0
+
+    def cursor(self):
+        return self
+
+    def transaction(self):
+        self.savepoints += 1
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        ids = params[0]
+        if "SELECT id, text" in sql:
+            if not self.has_text:
+                raise psycopg.errors.UndefinedColumn('column "text" does not exist')
+            self.rows = [{"id": i, "content": self.text.get(i)} for i in ids]
+        else:
+            self.rows = [{"id": i, "content": self.content[i]} for i in ids if i in self.content]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_fetch_texts_falls_back_to_the_text_column():
+    conn = _TextConn()
+    assert fetch_texts(conn, [1, 2, 3, 4]) == {1: "alpha", 2: "beta", 3: None}
+    assert conn.savepoints == 1
+
+    conn = _TextConn(has_text=False)
+    assert fetch_texts(conn, [1, 2, 3, 4]) == {1: "alpha", 2: "", 3: None}
@@ -0,0 +1,202 @@
+import pytest
+
+from app import embeddings
+from app.admission import TTLCache
+from app.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.routers import search
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+class FaultyEmbedder:
+    """Fault-injecting fake: raises or 'takes' `delay` seconds (on the fake clock) per call."""
+
+    name = "faulty"
+    dim = 4
+
+    def __init__(self, clock, fail=False, delay=0.0):
+        self.clock = clock
+        self.fail = fail
+        self.delay = delay
+        self.calls = 0
+
+    def embed_texts(self, texts):
+        self.calls += 1
+        self.clock.t += self.delay
+        if self.fail:
+            raise RuntimeError("provider 500")
+        return [[0.5, 0.5, 0.5, 0.5] for _ in texts]
+
+
+def _ok():
+    return "ok"
+
+
+def _boom():
+    raise RuntimeError("boom")
+
+
+def test_opens_on_error_rate_then_half_open_probe_closes():
+    clock = Clock()
+    br = CircuitBreaker("t-errors", window=4, min_calls=4, failure_rate=0.5, open_for_s=5, clock=clock)
+    br.call(_ok)
+    br.call(_ok)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            br.call(_boom)
+    assert br.state == "open"
+    with pytest.raises(CircuitOpen):
+        br.call(_ok)
+
+    clock.t += 5
+    assert br.state == "half_open"
+    assert br.call(_ok) == "ok"
+    assert br.state == "closed"
+    assert br.stats()["rejected"] == 1
+
+
+def test_ignored_errors_only_count_when_the_call_was_slow():
+    clock = Clock()
+    br = CircuitBreaker("t-ignore", window=2, min_calls=2, failure_rate=1.0, slow_call_s=0.2,
+                        ignore=(TimeoutError,), clock=clock)
+
+    def gave_up(after):
+        def fn():
+            clock.t += after
+            raise TimeoutError("caller's deadline")
+        return fn
+
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            br.call(gave_up(0.01))
+    assert br.state == "closed" and br.stats()["error"] == 0
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            br.call(gave_up(0.5))  # the dependency itself was slow
+    assert br.state == "open"
+
+
+def test_slow_calls_count_as_failures_and_failed_probe_reopens():
+    clock = Clock()
+    br = CircuitBreaker("t-slow", window=3, min_calls=3, failure_rate=0.6, slow_call_s=0.2, open_for_s=5, clock=clock)
+
+    def slow():
+        clock.t += 0.5
+        return "late"
+
+    assert br.call(slow) == "late"  # the result still comes back
+    br.call(_ok)
+    br.call(slow)
+    assert br.state == "open"
+
+    clock.t += 5
+    with pytest.raises(RuntimeError):
+        br.call(_boom)  # failed probe
+    assert br.state == "open"
+    with pytest.raises(CircuitOpen):
+        br.call(_ok)
+
+
+def test_half_open_lets_one_probe_through():
+    clock = Clock()
+    br = CircuitBreaker("t-probe", window=1, min_calls=1, open_for_s=1, clock=clock)
+    with pytest.raises(RuntimeError):
+        br.call(_boom)
+    clock.t += 1
+
+    def probe():
+        with pytest.raises(CircuitOpen):
+            br.call(_ok)  # a concurrent caller while the probe is out
+        return "probed"
+
+    assert br.call(probe) == "probed"
+    assert br.state == "closed"
+
+
+# -----------------------------
+# /search with a failing embedder
+# -----------------------------
+class _Cursor:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.log.append(sql)
+
+    def fetchall(self):
+        return [{"chunk_id": 3, "dist": 0.4, "document_id": 1, "preview": "battery swelling"}]
+
+
+class _Conn:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return _Cursor(self.log)
+
+    def cancel(self):
+        pass
+
+
+@pytest.fixture
+def faulty(monkeypatch):
+    clock = Clock()
+    emb = FaultyEmbedder(clock, fail=True)
+    log = []
+    monkeypatch.setattr(embeddings, "get_embedder", lambda: emb)
+    monkeypatch.setattr(embeddings, "EMBED_BREAKER",
+                        CircuitBreaker("t-search", window=2, min_calls=2, failure_rate=0.5,
+                                       slow_call_s=1.0, open_for_s=30, clock=clock))
+    monkeypatch.setattr(search, "_get_conn", lambda: _Conn(log))
+    monkeypatch.setattr(search, "SEARCH_CACHE", TTLCache("t-search", 8, 60))
+    return emb, clock, log
+
+
+def test_search_degrades_to_lexical_and_stops_calling_a_dead_embedder(client, faulty):
+    emb, clock, log = faulty
+    reasons = []
+    for i in range(4):
+        r = client.post("/search", json={"text": f"battery {i}"})
+        assert r.status_code == 200
+        body = r.json()
+        assert [row["chunk_id"] for row in body["results"]] == [3]
+        reasons.append(body["degraded"]["reason"])
+
+    assert reasons == ["embedder_error", "embedder_error", "embedder_open", "embedder_open"]
+    assert emb.calls == 2  # breaker open: no more provider calls
+    assert all("websearch_to_tsquery" in s for s in log if "set_config" not in s)
+    assert embeddings.EMBED_BREAKER.state == "open"
+
+    # provider recovers: after open_for_s the probe succeeds and vector search is back
+    emb.fail = False
+    clock.t += 30
+    r = client.post("/search", json={"text": "battery again"})
+    assert r.status_code == 200 and r.json()["degraded"] is None
+    assert embeddings.EMBED_BREAKER.state == "closed"
+
+
+def test_slow_embedder_trips_breaker(client, faulty):
+    emb, clock, _ = faulty
+    emb.fail, emb.delay = False, 2.0
+    for i in range(2):
+        assert client.post("/search", json={"text": f"slow {i}"}).json()["degraded"] is None
+    body = client.post("/search", json={"text": "slow 3"}).json()
+    assert body["degraded"] == {"reason": "embedder_open", "source": "lexical"}
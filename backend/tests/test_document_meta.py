@@ -0,0 +1,54 @@
+import os
+
+import fitz
+
+from app import document_meta as dm
+
+
+class _Conn:
+    def commit(self):
+        pass
+
+
+def _make_pdf(path, pages=3):
+    pdf = fitz.open()
+    for i in range(pages):
+        pdf.new_page().insert_text((72, 72), f"page {i + 1}")
+    pdf.set_toc([[1, "Intro ", 1], [2, "Details", 2]])
+    pdf.save(str(path))
+    pdf.close()
+
+
+def test_read_pdf_meta(tmp_path):
+    path = tmp_path / "m.pdf"
+    _make_pdf(path)
+    meta = dm.read_pdf_meta(str(path))
+    assert meta["page_count"] == 3
+    assert meta["toc"] == [[1, "Intro", 1], [2, "Details", 2]]
+    assert meta["file_size"] == path.stat().st_size
+    assert len(meta["sha256"]) == 64
+
+
+def test_ensure_meta_reads_file_once_and_refreshes_on_change(tmp_path, monkeypatch):
+    path = tmp_path / "m.pdf"
+    _make_pdf(path)
+    store = {}
+    opens = []
+    real_read = dm.read_pdf_meta
+    monkeypatch.setattr(dm, "get_meta", lambda conn, doc_id: store.get(doc_id))
+    monkeypatch.setattr(dm, "save_meta", lambda conn, doc_id, meta: store.__setitem__(doc_id, dict(meta)))
+    monkeypatch.setattr(dm, "read_pdf_meta", lambda p, pdf=None: opens.append(p) or real_read(p, pdf=pdf))
+
+    dm.ensure_meta(_Conn(), 7, str(path))
+    dm.ensure_meta(_Conn(), 7, str(path))
+    assert len(opens) == 1
+
+    _make_pdf(path, pages=5)
+    os.utime(path, (1, 1))  # guarantee a different mtime
+    assert dm.ensure_meta(_Conn(), 7, str(path))["page_count"] == 5
+    assert len(opens) == 2
+
+    # file gone from this host: the stored row is still served
+    path.unlink()
+    assert dm.ensure_meta(_Conn(), 7, str(path))["page_count"] == 5
+    assert len(opens) == 2
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+from app import embed_backfill as bf
+
+
+class _Conn:
+    autocommit = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        pass
+
+
+def _install(monkeypatch, chunks, written, slow_ids=()):
+    def fetch_pending(conn, model, after_id, limit):
+        return [(cid, f"text {cid}") for cid in chunks if cid > after_id and cid not in written][:limit]
+
+    lock = threading.Lock()
+
+    def upsert(conn, ids, vecs, model):
+        with lock:
+            written.update(ids)
+        return len(ids)
+
+    def embed(texts):
+        if any(t in {f"text {i}" for i in slow_ids} for t in texts):
+            time.sleep(0.05)  # force out-of-order completion
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(bf, "fetch_pending", fetch_pending)
+    monkeypatch.setattr(bf, "bulk_upsert_embeddings", upsert)
+    monkeypatch.setattr(bf, "embed_texts", embed)
+
+
+def test_backfill_embeds_everything_and_checkpoints_watermark(monkeypatch, tmp_path):
+    chunks = list(range(1, 101))
+    written = set()
+    _install(monkeypatch, chunks, written, slow_ids={5})
+    ckpt = tmp_path / "ckpt.json"
+
+    stats = bf.run_backfill(_Conn, batch_size=10, concurrency=4, checkpoint=ckpt)
+
+    assert written == set(chunks)
+    assert stats["embedded"] == 100 and stats["batches"] == 10
+    assert json.loads(ckpt.read_text())["watermark"] == 100
+
+
+def test_resume_starts_after_watermark(monkeypatch, tmp_path):
+    chunks = list(range(1, 51))
+    written = set()
+    _install(monkeypatch, chunks, written)
+    ckpt = tmp_path / "ckpt.json"
+    ckpt.write_text(json.dumps({"model": bf.get_embedder().name, "watermark": 30}))
+
+    stats = bf.run_backfill(_Conn, batch_size=8, concurrency=2, checkpoint=ckpt, resume=True)
+
+    assert stats["resumed_from"] == 30
+    assert written == set(range(31, 51))
@@ -0,0 +1,49 @@
+import pytest
+
+from app import embeddings
+from app.embeddings import FakeEmbedder, ProcessPoolEmbedder
+
+TEXTS = [f"chunk {i} about gimbal calibration" for i in range(9)]
+
+
+@pytest.fixture
+def pooled():
+    emb = ProcessPoolEmbedder(FakeEmbedder, workers=2, min_batch=4)
+    yield emb
+    emb.shutdown(wait=True)
+
+
+def test_pool_matches_inline_bit_for_bit(pooled):
+    assert pooled.name == FakeEmbedder.name and pooled.dim == 1536
+    assert pooled.embed_texts(TEXTS) == FakeEmbedder().embed_texts(TEXTS)
+    assert pooled._pool is not None
+
+
+def test_small_batches_stay_inline(pooled):
+    assert pooled.embed_texts(TEXTS[:2]) == FakeEmbedder().embed_texts(TEXTS[:2])
+    assert pooled.embed_texts([]) == []
+    assert pooled._pool is None  # never spawned
+
+
+def test_pickled_transfer_gives_the_same_vectors():
+    emb = ProcessPoolEmbedder(FakeEmbedder, workers=2, min_batch=1, shared_memory=False)
+    try:
+        assert emb.embed_texts(TEXTS[:3]) == FakeEmbedder().embed_texts(TEXTS[:3])
+    finally:
+        emb.shutdown(wait=True)
+
+
+def test_get_embedder_pools_cpu_providers(monkeypatch):
+    monkeypatch.setenv("EMB_PROVIDER", "fake")
+    monkeypatch.delenv("EMBED_WORKERS", raising=False)
+    assert isinstance(embeddings.get_embedder(), FakeEmbedder)
+
+    monkeypatch.setenv("EMBED_WORKERS", "2")
+    try:
+        emb = embeddings.get_embedder()
+        assert isinstance(emb, ProcessPoolEmbedder) and emb.workers == 2
+        assert embeddings.get_embedder() is emb  # one persistent pool per provider
+        monkeypatch.setenv("EMBED_WORKERS", "3")
+        assert embeddings.get_embedder() is not emb
+    finally:
+        embeddings.shutdown_embed_pools(wait=True)
@@ -0,0 +1,76 @@
+import math
+from functools import partial
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app import embeddings  # noqa: E402
+from app.embedder_tfidf import TfidfConfig, TfidfEmbedder, fit_texts  # noqa: E402
+
+CORPUS = [
+    "gimbal stabilizer for mirrorless cameras with three axis motors",
+    "drone battery charging hub with balance leads",
+    "tripod head quick release plate aluminium",
+    "wireless lavalier microphone kit with charging case",
+    "camera cage for cinema rigs with cold shoe mounts",
+]
+
+
+def _model(**kw):
+    return fit_texts(CORPUS, TfidfConfig(n_features=2 ** 12, **kw))
+
+
+def test_vectors_are_normalised_and_deterministic():
+    m = _model()
+    a, b = m.embed_texts(["gimbal motors", "gimbal motors"])
+    assert len(a) == m.dim == 1536
+    assert math.isclose(sum(x * x for x in a), 1.0, rel_tol=1e-5)
+    assert a == b
+    assert m.embed_texts([""])[0] == [0.0] * 1536
+
+
+def test_query_lands_nearest_its_source_text():
+    m = _model()
+    docs = m.embed_array(CORPUS)
+    for i, q in enumerate(["three axis gimbal", "balance leads drone", "microphone charging case"]):
+        target = [0, 1, 3][i]
+        sims = docs @ m.embed_array([q])[0]
+        assert int(np.argmax(sims)) == target, q
+
+
+def test_save_load_round_trip(tmp_path):
+    m = _model(char_ngrams=0)
+    path = str(tmp_path / "model.npz")
+    m.save(path)
+    loaded = TfidfEmbedder.load(path)
+    assert loaded.name == m.name and loaded.name.startswith("tfidf-1536-")
+    assert loaded.n_docs == len(CORPUS)
+    assert np.allclose(loaded.embed_array(CORPUS), m.embed_array(CORPUS))
+    assert _model().name != m.name  # different settings, different model name
+
+    with pytest.raises(RuntimeError):
+        TfidfEmbedder.load(str(tmp_path / "missing.npz"))
+
+
+def test_get_embedder_selects_tfidf(tmp_path, monkeypatch):
+    path = str(tmp_path / "model.npz")
+    _model().save(path)
+    monkeypatch.setenv("EMB_PROVIDER", "tfidf")
+    monkeypatch.setenv("TFIDF_MODEL_PATH", path)
+    emb = embeddings.get_embedder()
+    assert isinstance(emb, TfidfEmbedder)
+    assert emb.name.startswith("tfidf-1536-")
+    assert embeddings.get_embedder() is emb  # cached until the file changes
+
+
+def test_tfidf_runs_in_the_process_pool(tmp_path):
+    path = str(tmp_path / "model.npz")
+    m = _model()
+    m.save(path)
+    pooled = embeddings.ProcessPoolEmbedder(partial(TfidfEmbedder.load, path), workers=2, min_batch=1)
+    try:
+        assert pooled.name == m.name
+        assert np.allclose(np.array(pooled.embed_texts(CORPUS)), m.embed_array(CORPUS))
+    finally:
+        pooled.shutdown(wait=True)
@@ -0,0 +1,212 @@
+import threading
+import time
+
+import pytest
+
+from app import deadline, embeddings
+from app.admission import TTLCache
+from app.circuit_breaker import CircuitBreaker
+from app.hedging import Hedger
+from app.routers import search
+
+
+def _wait_cancelled(seconds):
+    """Stand-in for a slow upstream call that honours cancellation."""
+    dl = deadline.current()
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < seconds:
+        dl.check()
+        time.sleep(0.005)
+    return "slow"
+
+
+def test_child_deadline_inherits_expiry_and_cancel():
+    parent = deadline.Deadline.after(10)
+    child = parent.child()
+    fired = []
+    child.on_cancel(lambda: fired.append(1))
+    assert abs(child.remaining() - parent.remaining()) < 0.01
+    child.cancel()
+    assert child.cancelled and not parent.cancelled
+    other = parent.child()
+    parent.cancel()
+    assert other.cancelled and fired == [1]
+    with pytest.raises(deadline.Cancelled):
+        other.check()
+
+    with deadline.bound(5):
+        with deadline.bound(60) as inner:  # never outlives the outer budget
+            assert inner.remaining() <= 5
+
+
+def test_deadline_bounds_the_call_and_cancels_it():
+    h = Hedger("t-deadline")
+    seen = []
+
+    def slow():
+        try:
+            return _wait_cancelled(5)
+        except deadline.Cancelled:
+            seen.append("cancelled")
+            raise
+
+    t0 = time.monotonic()
+    with deadline.bound(0.05):
+        with pytest.raises(deadline.DeadlineExceeded):
+            h.call(slow)
+    assert time.monotonic() - t0 < 1
+    time.sleep(0.05)
+    assert seen == ["cancelled"]
+
+
+def test_hedge_fires_after_percentile_and_loser_is_cancelled():
+    h = Hedger("t-hedge", enabled=True, percentile=95, min_samples=5)
+    for _ in range(10):
+        h.observe(0.02)
+    assert h.hedge_delay() == pytest.approx(0.02)
+
+    calls = []
+    lock = threading.Lock()
+
+    def flaky():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        return _wait_cancelled(5) if first else "fast"
+
+    t0 = time.monotonic()
+    with deadline.bound(2):
+        assert h.call(flaky) == "fast"
+    assert time.monotonic() - t0 < 1
+    stats = h.stats()
+    assert stats["hedge_win"] == 1 and stats["primary_cancelled"] == 1
+
+
+def test_errors_propagate_without_hedging():
+    h = Hedger("t-errors")
+
+    def boom():
+        raise ValueError("bad input")
+
+    with deadline.bound(1):
+        with pytest.raises(ValueError):
+            h.call(boom)
+    with pytest.raises(ValueError):
+        h.call(boom)  # no deadline: runs inline
+
+
+class _Conn:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return [{"chunk_id": 9, "dist": 0.3, "document_id": 1, "preview": "gimbal"}]
+
+    def cancel(self):
+        pass
+
+
+def test_search_request_deadline_reaches_the_embedder(client, monkeypatch):
+    class StalledEmbedder:
+        name = "stalled"
+        dim = 4
+
+        def embed_texts(self, texts):
+            return [_wait_cancelled(5)]
+
+    monkeypatch.setattr(embeddings, "get_embedder", lambda: StalledEmbedder())
+    monkeypatch.setattr(embeddings, "EMBED_BREAKER", CircuitBreaker("t-deadline-search", ignore=(deadline.Cancelled,)))
+    monkeypatch.setattr(search, "_get_conn", lambda: _Conn())
+    monkeypatch.setattr(search, "SEARCH_CACHE", TTLCache("t-deadline", 8, 60))
+
+    t0 = time.monotonic()
+    r = client.post("/search", json={"text": "gimbal"}, headers={"X-Request-Deadline-Ms": "100"})
+    assert time.monotonic() - t0 < 2
+    assert r.status_code == 200
+    assert r.json()["degraded"] == {"reason": "embedder_deadline", "source": "lexical"}
+
+    assert client.post("/search", json={"text": "gimbal"}, headers={"X-Request-Deadline-Ms": "soon"}).status_code == 400
+
+
+class _SlowEmbedder:
+    name = "slow-cancellable"
+    dim = 4
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def embed_texts(self, texts):
+        _wait_cancelled(self.seconds)
+        return [[1.0, 0.0, 0.0, 0.0] for _ in texts]
+
+
+def test_short_client_deadlines_do_not_open_the_breaker(monkeypatch):
+    br = CircuitBreaker("t-short-deadline", min_calls=5, slow_call_s=1.0, ignore=embeddings.EMBED_BREAKER.ignore)
+    monkeypatch.setattr(embeddings, "get_embedder", lambda: _SlowEmbedder(0.05))
+    monkeypatch.setattr(embeddings, "EMBED_BREAKER", br)
+    for i in range(6):
+        with deadline.bound(0.001):
+            with pytest.raises(deadline.DeadlineExceeded):
+                embeddings.embed_one(f"q{i}")
+    assert br.state == "closed"
+    with deadline.bound(5):  # a caller with a normal budget still gets the embedder
+        assert embeddings.embed_one("next") == [1.0, 0.0, 0.0, 0.0]
+
+
+def test_follower_outlives_a_cancelled_embed_leader(monkeypatch):
+    monkeypatch.setattr(embeddings, "get_embedder", lambda: _SlowEmbedder(0.3))
+    monkeypatch.setattr(embeddings, "EMBED_BREAKER", CircuitBreaker("t-follower", ignore=(deadline.Cancelled,)))
+    got = {}
+
+    def leader():
+        with deadline.bound(5) as dl:
+            threading.Timer(0.1, dl.cancel).start()
+            try:
+                embeddings.embed_one("shared text")
+            except deadline.Cancelled:
+                got["leader"] = "cancelled"
+
+    def follower():
+        with deadline.bound(5):
+            got["follower"] = embeddings.embed_one("shared text")
+
+    t1 = threading.Thread(target=leader)
+    t1.start()
+    time.sleep(0.03)
+    t2 = threading.Thread(target=follower)
+    t2.start()
+    t1.join(5)
+    t2.join(5)
+    assert embeddings.EMBED_FLIGHT.stats()["followers"] >= 1
+    assert got == {"leader": "cancelled", "follower": [1.0, 0.0, 0.0, 0.0]}
+
+
+class _CancelledEmbedder:
+    name = "always-cancelled"
+    dim = 4
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_texts(self, texts):
+        self.calls += 1
+        raise deadline.Cancelled("cancelled")
+
+
+def test_embed_retries_a_shared_cancel_only_once(monkeypatch):
+    emb = _CancelledEmbedder()
+    monkeypatch.setattr(embeddings, "get_embedder", lambda: emb)
+    monkeypatch.setattr(embeddings, "EMBED_BREAKER", CircuitBreaker("t-retry-once", ignore=(deadline.Cancelled,)))
+    assert deadline.current() is None  # no ambient deadline to stop a retry loop
+    with pytest.raises(deadline.Cancelled):
+        embeddings.embed_one("never embeds")
+    assert emb.calls == 2
@@ -0,0 +1,54 @@
+import json
+
+from app.logging_utils import log_kv, setup_logger, shutdown_logging
+
+
+def test_json_lines_are_valid_and_structured(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.setenv("LOG_FORMAT", "json")
+
+    log = setup_logger("test-json")
+    assert setup_logger("test-json") is log  # built once
+    log_kv(log, stage="parse-pages", doc_id=1, note='has "quotes"')
+    log.info("plain message")
+    shutdown_logging()  # drain the background writer
+
+    lines = (tmp_path / "test-json.log").read_text(encoding="utf-8").splitlines()
+    docs = [json.loads(ln) for ln in lines]
+    assert docs[0]["stage"] == "parse-pages"
+    assert docs[0]["doc_id"] == 1
+    assert docs[0]["note"] == 'has "quotes"'
+    assert docs[0]["lg"] == "test-json"
+    assert docs[1]["msg"] == "plain message"
+
+
+def test_rotation(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.setenv("LOG_FORMAT", "plain")
+    monkeypatch.setenv("LOG_MAX_BYTES", "200")
+    monkeypatch.setenv("LOG_BACKUP_COUNT", "2")
+
+    log = setup_logger("test-rotate")
+    for i in range(50):
+        log_kv(log, i=i, pad="x" * 20)
+    shutdown_logging()
+
+    assert (tmp_path / "test-rotate.log").exists()
+    assert (tmp_path / "test-rotate.log.1").exists()
+    assert not (tmp_path / "test-rotate.log.3").exists()
+
+
+def test_tracebacks_land_in_the_exc_field(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    monkeypatch.setenv("LOG_FORMAT", "json")
+
+    log = setup_logger("test-exc")
+    try:
+        raise ValueError("bad page 7")
+    except ValueError:
+        log.exception("parse failed for %s", "doc 1")
+    shutdown_logging()
+
+    doc = json.loads((tmp_path / "test-exc.log").read_text(encoding="utf-8"))
+    assert doc["msg"] == "parse failed for doc 1"
+    assert doc["exc"].startswith("Traceback") and "ValueError: bad page 7" in doc["exc"]
@@ -0,0 +1,31 @@
+from app.metrics import Counter, Histogram, Registry
+
+
+def test_counter_and_histogram_exposition():
+    reg = Registry()
+    c = Counter("t_requests_total", "Requests.", labels=("route",), registry=reg)
+    h = Histogram("t_latency_seconds", "Latency.", labels=("route",), buckets=(0.1, 1.0), registry=reg)
+
+    c.inc(route="/a")
+    c.inc(2, route="/a")
+    h.observe(0.05, route="/a")
+    h.observe(0.5, route="/a")
+    h.observe(5.0, route="/a")
+
+    text = reg.render()
+    assert "# TYPE t_requests_total counter" in text
+    assert 't_requests_total{route="/a"} 3' in text
+    assert 't_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 't_latency_seconds_count{route="/a"} 3' in text
+    assert h.count(route="/a") == 3
+
+
+def test_metrics_endpoint_reports_route_templates(client):
+    assert client.get("/ping").status_code == 200
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'app_http_requests_total{method="GET",route="/ping",status="200"}' in resp.text
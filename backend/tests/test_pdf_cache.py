@@ -0,0 +1,54 @@
+import os
+
+import fitz
+
+from app.pdf_cache import PdfCache
+
+
+def _pdf(path, pages=1):
+    doc = fitz.open()
+    for _ in range(pages):
+        doc.new_page()
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_hit_reuses_handle_and_count_eviction(tmp_path):
+    cache = PdfCache(max_docs=2)
+    a, b, c = (_pdf(tmp_path / f"{n}.pdf") for n in "abc")
+
+    with cache.open(a) as d1:
+        pass
+    with cache.open(a) as d2:
+        assert d2 is d1
+    with cache.open(b), cache.open(c):
+        pass
+
+    assert cache.stats()["docs"] == 2
+    assert d1.is_closed  # least recently used went first
+
+
+def test_memory_budget_and_leased_entries(tmp_path):
+    a = _pdf(tmp_path / "a.pdf")
+    cache = PdfCache(max_docs=10, max_bytes=os.path.getsize(a) - 1)
+    with cache.open(a) as doc:
+        assert not doc.is_closed  # evicted on insert (over budget) but still leased
+        assert doc.page_count == 1
+    assert doc.is_closed
+    assert cache.stats() == {"docs": 0, "bytes": 0, "max_docs": 10, "max_bytes": os.path.getsize(a) - 1}
+
+
+def test_rewritten_file_gets_new_handle_and_close_all(tmp_path):
+    cache = PdfCache()
+    path = tmp_path / "a.pdf"
+    _pdf(path)
+    with cache.open(str(path)) as old:
+        pass
+    _pdf(path, pages=3)
+    os.utime(path, ns=(1, 1))
+    with cache.open(str(path)) as new:
+        assert new is not old and new.page_count == 3
+
+    cache.close_all()
+    assert old.is_closed and new.is_closed and cache.stats()["docs"] == 0
@@ -0,0 +1,72 @@
+import pytest
+
+from app import embedding_store
+from app.routers import search
+
+
+class _Cursor:
+    def __init__(self):
+        self.calls = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.calls.append((sql, params))
+
+
+class _Conn:
+    def __init__(self):
+        self.cur = _Cursor()
+
+    def cursor(self):
+        return self.cur
+
+
+@pytest.fixture
+def two_stage(monkeypatch):
+    monkeypatch.setattr(embedding_store, "PREFIX_DIMS", 2)
+    monkeypatch.setattr(search, "PREFIX_DIMS", 2)
+    monkeypatch.setattr(search, "SEARCH_TWO_STAGE", True)
+    monkeypatch.setattr(search, "SEARCH_PREFIX_CANDIDATES", 300)
+
+
+def test_prefix_is_truncated_and_renormalised():
+    assert embedding_store.prefix_vector([3.0, 4.0, 12.0], 2) == [0.6, 0.8]
+
+
+def test_writes_fill_the_prefix_column(two_stage):
+    conn = _Conn()
+    vec = [0.0, 2.0] + [1.0] * 1534
+    embedding_store.bulk_upsert_embeddings(conn, [5], [vec], "fake-1536")
+    sql, (model, ids, literals, prefixes) = conn.cur.calls[0]
+    assert "embedding_prefix" in sql and ids == [5]
+    assert prefixes == ["[0.0,1.0]"]
+    assert len(literals[0].split(",")) == 1536
+
+
+def test_two_stage_query_reranks_prefix_candidates(two_stage):
+    payload = search.SearchIn(text="gimbal", product_id=3)
+    q = [0.0, 3.0, 4.0]
+    sql, params = search._build_search_sql(payload, search._vector_sql(q), search._query_prefix_sql(q))
+    stage1, stage2 = sql.split("rank_by AS (")
+    assert "ORDER BY (ce.embedding_prefix <-> ARRAY[0.0,1.0]::float8[]::vector)" in stage1
+    assert "LIMIT 300" in stage1
+    assert "FROM candidates k" in stage2 and "ce.embedding <->" in stage2
+    # filter params belong to stage 1, the LIKE boost to stage 2
+    assert params == (3, 60, ["Dummy PDF file"], "%gimbal%", 5, 0)
+
+    cur = _Cursor()
+    search._set_candidate_search(cur)
+    assert cur.calls == [("SELECT set_config('hnsw.ef_search', %s, true)", ("300",))]
+
+
+def test_single_stage_sql_is_unchanged_when_disabled():
+    payload = search.SearchIn(text="gimbal")
+    assert search._query_prefix_sql([1.0, 0.0]) is None
+    sql, _ = search._build_search_sql(payload, search._vector_sql([1.0, 0.0]))
+    assert "candidates" not in sql and "embedding_prefix" not in sql
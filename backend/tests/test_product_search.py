@@ -0,0 +1,42 @@
+from app.routers import search
+
+
+class _Cursor:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params=None):
+        self.calls.append((sql, params))
+
+
+def test_product_scope_is_an_innermost_knn_over_one_product(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_PRODUCT_CANDIDATES", 150)
+    payload = search.SearchIn(text="gimbal", product_id=7, top_k=5)
+    sql, params = search._build_search_sql(payload, search._vector_sql([1.0, 0.0]))
+
+    knn, rest = sql.split("rank_by AS (")
+    # only the product predicate (inlined, so it matches the partial index) + ORDER BY distance LIMIT
+    assert "product_knn AS (" in knn
+    assert "FROM chunk_embeddings ce\n      WHERE ce.product_id = 7\n" in knn
+    assert "ORDER BY (ce.embedding <-> ARRAY[1.0,0.0]::float8[]::vector)\n      LIMIT 150" in knn
+    assert "document_chunks" not in knn
+    # the other filters and the diversity window only see the candidates
+    assert "FROM product_knn k" in rest and "product_id" not in rest
+    assert params == ("%gimbal%", 60, ["Dummy PDF file"], 5, 0)
+
+    cur = _Cursor()
+    search._set_candidate_search(cur, payload)
+    assert cur.calls == [("SELECT set_config('hnsw.ef_search', %s, true)", ("150",))]
+
+
+def test_deep_pages_widen_the_product_candidates(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_PRODUCT_CANDIDATES", 50)
+    payload = search.SearchIn(text="gimbal", product_id=7, top_k=20, offset=100)
+    sql, _ = search._build_search_sql(payload, search._vector_sql([1.0, 0.0]))
+    assert "LIMIT 120\n" in sql
+
+    unscoped, _ = search._build_search_sql(search.SearchIn(text="gimbal"), search._vector_sql([1.0, 0.0]))
+    assert "product_knn" not in unscoped
+    cur = _Cursor()
+    search._set_candidate_search(cur, search.SearchIn(text="gimbal"))
+    assert cur.calls == []
@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.rerank import from_vector_send, mmr  # noqa: E402
+from app.routers import search  # noqa: E402
+
+# a near-duplicate pair close to the query and one distinct, slightly less relevant chunk
+QUERY = [1.0, 0.0, 0.0]
+VECTORS = np.array([
+    [0.95, 0.31, 0.0],
+    [0.95, 0.30, 0.01],
+    [0.90, -0.10, 0.42],
+], dtype=np.float32)
+
+
+def _vector_send(vec):
+    return struct.pack(">hh", len(vec), 0) + struct.pack(f">{len(vec)}f", *vec)
+
+
+def test_mmr_prefers_a_distinct_candidate_over_a_near_duplicate():
+    assert mmr(QUERY, VECTORS, 2, lam=1.0) == [1, 0]  # relevance order
+    assert mmr(QUERY, VECTORS, 2, lam=0.5) == [1, 2]
+    assert mmr(QUERY, VECTORS, 10, lam=0.5) == [1, 2, 0]
+    assert mmr(QUERY, VECTORS[:0], 3) == []
+
+
+def test_mmr_boost_and_group_cap():
+    assert mmr(QUERY, VECTORS, 1, lam=1.0, boost=[0.0, 0.0, 0.2]) == [2]
+    groups = [("doc1", "a"), ("doc1", "a"), ("doc2", "")]
+    assert mmr(QUERY, VECTORS, 3, lam=1.0, groups=groups, max_per_group=1) == [1, 2]
+    assert mmr(QUERY, VECTORS, 3, lam=1.0, groups=groups, max_per_group=2) == [1, 0, 2]
+
+
+def test_from_vector_send_round_trip():
+    blobs = [_vector_send(v) for v in VECTORS.tolist()]
+    assert np.allclose(from_vector_send(blobs), VECTORS)
+    assert from_vector_send([memoryview(blobs[0])]).shape == (1, 3)
+
+
+def test_mmr_query_is_a_bounded_candidate_pool(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_MMR_POOL", 50)
+    payload = search.SearchIn(text="gimbal", product_id=3, diversity="mmr", top_k=10, offset=45)
+    div = search._diversity(payload)
+    assert div == {"mode": "mmr", "lambda": search.SEARCH_MMR_LAMBDA, "pool": 55, "max_per_section": None}
+    sql, params = search._build_query(payload, [0.0, 3.0, 4.0], div)
+    assert "ROW_NUMBER" not in sql and "vector_send(ce.embedding)" in sql
+    assert sql.endswith("ORDER BY (ce.embedding <-> ARRAY[0.0,3.0,4.0]::float8[]::vector)\n    LIMIT %s::int")
+    assert "WHERE ce.product_id = 3\n" in sql  # product scope: innermost k-NN (see test_product_search)
+    # the LIKE boost is in the SELECT list, ahead of the filter params
+    assert params == ("%gimbal%", 60, ["Dummy PDF file"], 55)
+
+
+def test_section_mode_cap_and_mmr_rerank(monkeypatch):
+    payload = search.SearchIn(text="gimbal", max_per_section=3)
+    sql, _ = search._build_query(payload, [1.0, 0.0], search._diversity(payload))
+    assert "WHERE rn <= 3" in sql
+
+    payload = search.SearchIn(text="gimbal", diversity="mmr", mmr_lambda=0.5, top_k=1, offset=1)
+    rows = [{"chunk_id": i, "document_id": 1, "section_path": None, "lexical_hit": 0,
+             "embedding": _vector_send(v)} for i, v in enumerate(VECTORS.tolist())]
+    picked = search._mmr_rerank(payload, QUERY, rows, search._diversity(payload))
+    assert [r["chunk_id"] for r in picked] == [2]
+
+
+def test_candidate_pool_and_page_depth_are_capped(monkeypatch, client):
+    monkeypatch.setattr(search, "SEARCH_MMR_POOL", 5000)
+    monkeypatch.setattr(search, "SEARCH_PRODUCT_CANDIDATES", 5000)
+    payload = search.SearchIn(text="gimbal", product_id=3, diversity="mmr", top_k=50, offset=950)
+    assert search._diversity(payload)["pool"] == search.MAX_CANDIDATES
+    assert search._product_candidates(payload) == search.MAX_CANDIDATES
+
+    with pytest.raises(ValueError):
+        search.SearchIn(text="gimbal", top_k=50, offset=951)
+    r = client.post("/search", json={"text": "gimbal", "offset": 10**9})
+    assert r.status_code == 422
+
+    rows = [{"chunk_id": i} for i in range(50)]
+    assert search._response(payload, rows, {})["next_offset"] is None
@@ -0,0 +1,96 @@
+import psycopg
+
+from app.routers import search
+from app.routers.search import _summarize_plan
+
+
+def test_summarize_plan_finds_indexes_and_seq_scans():
+    plan = {
+        "Plan": {
+            "Node Type": "Limit",
+            "Shared Hit Blocks": 12,
+            "Shared Read Blocks": 3,
+            "Plans": [
+                {
+                    "Node Type": "Nested Loop",
+                    "Plans": [
+                        {"Node Type": "Index Scan", "Index Name": "idx_ce_hnsw"},
+                        {"Node Type": "Seq Scan", "Relation Name": "documents"},
+                    ],
+                }
+            ],
+        },
+        "Planning Time": 0.5,
+        "Execution Time": 4.25,
+    }
+
+    out = _summarize_plan(plan)
+
+    assert out["uses_index"] is True
+    assert out["indexes"] == ["idx_ce_hnsw"]
+    assert out["seq_scans"] == ["documents"]
+    assert out["node_types"] == ["Limit", "Nested Loop", "Index Scan", "Seq Scan"]
+    assert out["shared_hit_blocks"] == 12
+    assert out["execution_time_ms"] == 4.25
+
+
+def test_summarize_plan_empty():
+    out = _summarize_plan({})
+    assert out["uses_index"] is False
+    assert out["node_types"] == []
+
+
+class _Cursor:
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.calls.append((sql, params))
+        if self.fail_on and sql.startswith(self.fail_on):
+            raise psycopg.errors.QueryCanceled("canceling statement due to statement timeout")
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+def test_explain_runs_under_a_statement_timeout(client, monkeypatch):
+    cur = _Cursor(fail_on="EXPLAIN")
+    monkeypatch.setattr(search, "embed_one", lambda text: [0.1, 0.2])
+    monkeypatch.setattr(search, "_get_conn", lambda: cur)
+    monkeypatch.setattr(search, "SEARCH_EXPLAIN_TIMEOUT_MS", 1500)
+
+    r = client.post("/search/_explain", json={"text": "gimbal"})
+    assert r.status_code == 504
+    assert cur.calls[0] == ("SELECT set_config('statement_timeout', %s, true)", ("1500ms",))
+
+
+
+def test_explain_maps_embedder_failures_like_search(client, monkeypatch):
+    from app import deadline
+    from app.circuit_breaker import CircuitOpen
+
+    cur = _Cursor()
+    monkeypatch.setattr(search, "_get_conn", lambda: cur)
+    for exc, status in [(CircuitOpen("embedder", 5.0), 503), (RuntimeError("embedder HTTP 502"), 503),
+                        (deadline.DeadlineExceeded("deadline exceeded"), 504)]:
+        def embed(text, exc=exc):
+            raise exc
+
+        monkeypatch.setattr(search, "embed_one", embed)
+        r = client.post("/search/_explain", json={"text": "gimbal"})
+        assert r.status_code == status
+        assert ("Retry-After" in r.headers) == (status == 503)
+    assert cur.calls == []  # no query without a query vector
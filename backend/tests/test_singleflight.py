@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_threads_share_one_call():
+    sf = SingleFlight("test-threads")
+    calls = []
+    gate = threading.Event()
+
+    def work(x):
+        calls.append(x)
+        gate.wait(1)
+        return {"x": x}
+
+    with ThreadPoolExecutor(8) as ex:
+        futs = [ex.submit(sf.do, "k", work, 1) for _ in range(8)]
+        time.sleep(0.1)
+        gate.set()
+        results = [f.result() for f in futs]
+
+    assert calls == [1]
+    assert all(r is results[0] for r in results)
+    assert sf.stats() == {"in_flight": 0, "leaders": 1, "followers": 7}
+    assert sf.do("k", work, 2) == {"x": 2}  # no caching after completion
+
+
+def test_errors_fan_out_to_followers():
+    sf = SingleFlight("test-errors")
+    gate = threading.Event()
+
+    def boom():
+        gate.wait(1)
+        raise ValueError("nope")
+
+    with ThreadPoolExecutor(3) as ex:
+        futs = [ex.submit(sf.do, "k", boom) for _ in range(3)]
+        time.sleep(0.1)
+        gate.set()
+        for f in futs:
+            with pytest.raises(ValueError):
+                f.result()
+    assert sf.in_flight() == 0
+
+
+def test_asyncio_tasks_and_threads_share_one_call():
+    sf = SingleFlight("test-async")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 42
+
+    async def main():
+        leader = asyncio.create_task(sf.do_async("k", work))
+        await asyncio.sleep(0.01)
+        followers = [sf.do_async("k", work) for _ in range(5)]
+        in_thread = asyncio.get_running_loop().run_in_executor(None, sf.do, "k", lambda: -1)
+        return await asyncio.gather(leader, *followers, in_thread)
+
+    assert asyncio.run(main()) == [42] * 7
+    assert calls == [1]
@@ -0,0 +1,39 @@
+import random
+
+from app.toc_utils import compute_toc_ranges
+from tools.bench_toc import legacy_ranges
+
+
+def test_matches_legacy_nested_scan_on_random_tocs():
+    rng = random.Random(0)
+    for _ in range(200):
+        n = rng.randint(1, 60)
+        entries = []
+        page = 1
+        for i in range(n):
+            page += rng.choice([0, 0, 1, 2])
+            entries.append((rng.randint(1, 5), f"T{i}", page, i + 1))
+        page_count = page + rng.randint(0, 3)
+
+        got = [tuple(r) for r in compute_toc_ranges(entries, page_count)]
+        assert got == legacy_ranges(entries, page_count)
+
+
+def test_ranges_and_paths():
+    entries = [
+        (1, "Maintenance", 10, 1),
+        (2, "Battery", 10, 2),
+        (3, "Storage", 12, 3),
+        (2, "Propellers", 15, 4),
+        (1, "Specs", 20, 5),
+    ]
+    out = compute_toc_ranges(entries, 25)
+    assert [(r.start, r.end) for r in out] == [(10, 19), (10, 14), (12, 14), (15, 19), (20, 25)]
+    assert out[2].path == "Maintenance > Battery > Storage"
+    assert out[3].path == "Maintenance > Propellers"
+
+
+def test_skipped_levels_are_padded():
+    out = compute_toc_ranges([(1, "A", 1, 1), (3, "C", 2, 2)], 3)
+    assert out[1].path == "A > C"
+    assert out[0].end == 3
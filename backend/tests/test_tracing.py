@@ -0,0 +1,74 @@
+import asyncio
+
+from starlette.concurrency import run_in_threadpool
+
+from app.timing import RING, get_trace, reset_request_id, set_request_id, span, timed_block, traced
+
+
+def test_nested_spans_share_trace_and_link_parents():
+    RING.clear()
+    token = set_request_id("req-nested")
+    try:
+        with span("outer") as outer:
+            with timed_block("inner-stage") as inner:
+                pass
+    finally:
+        reset_request_id(token)
+
+    spans = {s["name"]: s for s in get_trace("req-nested")}
+    assert set(spans) == {"outer", "inner-stage"}
+    assert spans["inner-stage"]["parent_id"] == outer.span_id
+    assert spans["outer"]["parent_id"] is None
+    assert inner.duration_ms is not None
+
+
+def test_context_follows_async_tasks_and_threadpool():
+    RING.clear()
+
+    @traced("async.child")
+    async def child():
+        await asyncio.sleep(0)
+
+    def sync_work():
+        with span("thread.child"):
+            pass
+
+    async def main():
+        token = set_request_id("req-async")
+        try:
+            with span("root"):
+                await asyncio.gather(child(), child())
+                await run_in_threadpool(sync_work)
+        finally:
+            reset_request_id(token)
+
+    asyncio.run(main())
+
+    spans = get_trace("req-async")
+    root = next(s for s in spans if s["name"] == "root")
+    children = [s for s in spans if s["name"] != "root"]
+    assert sorted(s["name"] for s in children) == ["async.child", "async.child", "thread.child"]
+    assert all(s["parent_id"] == root["span_id"] for s in children)
+
+
+def test_error_status_recorded():
+    RING.clear()
+    try:
+        with span("boom"):
+            raise ValueError("bad")
+    except ValueError:
+        pass
+    (s,) = RING.spans()
+    assert s["status"] == "error"
+    assert "ValueError" in s["attrs"]["error"]
+
+
+def test_request_id_header_and_admin_endpoint(client):
+    resp = client.get("/ping", headers={"X-Request-ID": "abc123"})
+    assert resp.headers["X-Request-ID"] == "abc123"
+
+    trace = client.get("/admin/traces/abc123").json()
+    assert trace["spans"][0]["name"] == "GET /ping"
+
+    listing = client.get("/admin/traces").json()
+    assert any(t["trace_id"] == "abc123" for t in listing["traces"])
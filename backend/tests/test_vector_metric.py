@@ -0,0 +1,84 @@
+import math
+
+import pytest
+
+from app import embedding_store
+from app.routers import search
+
+
+class _Cursor:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.calls = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.calls.append((sql, params))
+        self.rowcount = len(params[0]) if "UPDATE chunk_embeddings" in sql else 0
+
+    def fetchall(self):
+        return self.rows
+
+
+class _Conn:
+    def __init__(self, cur):
+        self.cur = cur
+
+    def cursor(self):
+        return self.cur
+
+
+def _norm(v):
+    return math.sqrt(sum(x * x for x in v))
+
+
+@pytest.fixture
+def ip(monkeypatch):
+    monkeypatch.setattr(embedding_store, "VECTOR_METRIC", "ip")
+    monkeypatch.setattr(search, "VECTOR_METRIC", "ip")
+
+
+def test_vectors_are_unit_length_on_write_only_in_ip_mode(ip, monkeypatch):
+    vec = [3.0, 4.0] + [0.0] * 1534
+    lit = embedding_store.vector_literal(vec)
+    assert lit.startswith("[0.6,0.8,0.0")
+    assert embedding_store.storage_vector([0.0] * 3) == [0.0] * 3
+
+    cur = _Cursor()
+    embedding_store.bulk_upsert_embeddings(_Conn(cur), [7], [vec], "fake-1536")
+    stored = [float(x) for x in cur.calls[0][1][2][0].strip("[]").split(",")]
+    assert _norm(stored) == pytest.approx(1.0)
+
+    monkeypatch.setattr(embedding_store, "VECTOR_METRIC", "l2")
+    assert embedding_store.vector_literal(vec).startswith("[3.0,4.0,")
+
+
+def test_ip_mode_ranks_by_inner_product_and_scores_cosine(ip):
+    payload = search.SearchIn(text="gimbal")
+    qarr = search._vector_sql([2.0, 0.0])
+    assert qarr.startswith("ARRAY[1.0,0.0]")
+    sql, _ = search._build_search_sql(payload, qarr)
+    assert "<#>" in sql and "<->" not in sql
+
+    rows = search._postprocess_rows(payload, [{"chunk_id": 1, "dist": -0.8}], "ip")
+    assert rows[0]["score"] == pytest.approx(0.8)
+    # lexical (degraded) rows keep the 1/(1+dist) score
+    assert search._postprocess_rows(payload, [{"chunk_id": 1, "dist": 1.0}])[0]["score"] == 0.5
+
+
+def test_renormalize_fixes_rows_and_skips_zero_vectors():
+    cur = _Cursor(rows=[{"chunk_id": 4, "norm": 2.0, "embedding": "[0,2]"},
+                        {"chunk_id": 9, "norm": 0.0, "embedding": "[0,0]"}])
+    conn = _Conn(cur)
+    rows = embedding_store.find_unnormalized(conn, after_id=0, limit=10)
+    assert rows == [(4, 2.0, [0.0, 2.0]), (9, 0.0, [0.0, 0.0])]
+
+    assert embedding_store.renormalize(conn, rows) == 1
+    ids, literals = cur.calls[-1][1]
+    assert ids == [4] and literals == ["[0.0,1.0]"]
@@ -0,0 +1,119 @@
+# tools/bench_chunk_build.py
+"""
+Offline micro-benchmark for building /chunk-toc section text (no DB needed).
+
+Compares, over a synthetic page_map + balanced TOC:
+  join   -> per section "\\n\\n".join(page_map[p] for p in range(start, end + 1))  (old path)
+  slice  -> app.chunking.PageBuffer: one buffer, each section is a slice
+  leaf   -> PageBuffer + app.toc_utils.leaf_ranges (parents keep only their own pages)
+  stream-join -> iter_sections_streaming, each section re-joined from the PageWindow's pages
+  stream      -> what /chunk-toc runs: iter_sections_streaming + the paragraph chunker's
+                 chunk_section(window, ...), i.e. one read of the window's text buffer
+  (the stream modes include paragraph chunking, so compare them with each other)
+
+Reports best-of-N wall time, Python peak allocation and total characters produced
+(the duplicated text parents carry in the non-leaf modes).
+
+Usage (from backend/):
+    python -m tools.bench_chunk_build --pages 400 --depth 4 --fanout 4
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from app.chunking import PAGE_SEP, PageBuffer, get_chunker, iter_sections_streaming
+from app.toc_utils import compute_toc_ranges, leaf_ranges
+from tools.bench_ingest import WORDS, build_toc
+
+
+def make_pages(pages: int, chars: int, seed: int) -> Dict[int, str]:
+    rng = random.Random(seed)
+    out = {}
+    for p in range(1, pages + 1):
+        words: List[str] = []
+        n = 0
+        while n < chars:
+            w = rng.choice(WORDS)
+            words.append(w)
+            n += len(w) + 1
+        out[p] = " ".join(words)
+    return out
+
+
+def mode_join(page_map, ranges) -> int:
+    total = 0
+    for r in ranges:
+        total += len("\n\n".join(page_map[p] for p in range(r.start, r.end + 1) if p in page_map).strip())
+    return total
+
+
+def mode_slice(page_map, ranges) -> int:
+    buf = PageBuffer(page_map)
+    return sum(len(buf.section(r.start, r.end).strip()) for r in ranges)
+
+
+def mode_leaf(page_map, ranges) -> int:
+    buf = PageBuffer(page_map)
+    return sum(len(buf.section(r.start, r.end).strip()) for r in leaf_ranges(ranges))
+
+
+def mode_stream_join(page_map, ranges) -> int:
+    chunker = get_chunker("paragraph")
+    return sum(len(c) for r, window in iter_sections_streaming(ranges, sorted(page_map.items()))
+               for c in chunker.chunk_text(PAGE_SEP.join(window.iter_section(r.start, r.end))))
+
+
+def mode_stream(page_map, ranges) -> int:
+    chunker = get_chunker("paragraph")
+    return sum(len(c) for r, window in iter_sections_streaming(ranges, sorted(page_map.items()))
+               for c in chunker.chunk_section(window, r.start, r.end))
+
+
+def measure(fn: Callable[[], int], repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    chars = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chars = fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"best_ms": round(best * 1000.0, 2), "py_peak_mb": round(peak / (1024 * 1024), 2), "chars": chars}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark section text assembly for /chunk-toc")
+    p.add_argument("--pages", type=int, default=400)
+    p.add_argument("--chars", type=int, default=3000, help="Characters per page")
+    p.add_argument("--depth", type=int, default=4)
+    p.add_argument("--fanout", type=int, default=4)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    page_map = make_pages(args.pages, args.chars, args.seed)
+    toc = build_toc(args.pages, args.depth, args.fanout)
+    entries = [(lvl, title, page, i + 1) for i, (lvl, title, page) in enumerate(toc)]
+    ranges = compute_toc_ranges(entries, args.pages)
+    print(f"pages={args.pages} toc_entries={len(ranges)}")
+
+    results = {}
+    for name, fn in (("join", mode_join), ("slice", mode_slice), ("leaf", mode_leaf),
+                     ("stream-join", mode_stream_join), ("stream", mode_stream)):
+        results[name] = measure(lambda fn=fn: fn(page_map, ranges), args.repeat)
+        print(json.dumps({"mode": name, **results[name]}))
+
+    if results["slice"]["best_ms"]:
+        print(f"join/slice speedup: {results['join']['best_ms'] / results['slice']['best_ms']:.1f}x")
+    if results["stream"]["best_ms"]:
+        print(f"stream-join/stream speedup: {results['stream-join']['best_ms'] / results['stream']['best_ms']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+# tools/bench_chunkers.py
+"""
+Offline throughput benchmark for the /chunk-toc chunk strategies (app/chunking.py).
+
+Feeds the same synthetic section (N pages of sentence text) to every strategy and
+reports chunks/sec, MB/sec, token stats per chunk (tiktoken if installed, else the
+regex approximation) and Python peak allocation.
+
+Usage (from backend/):
+    python -m tools.bench_chunkers --pages 500 --max-tokens 400 --overlap 50
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List
+
+from app.chunking import PageBuffer, get_chunker, get_tokenizer
+from tools.synth_corpus import _paragraph
+
+
+def make_pages(pages: int, seed: int) -> Dict[int, str]:
+    rng = random.Random(seed)
+    return {p: "\n\n".join(_paragraph(rng) for _ in range(rng.randint(4, 8))) for p in range(1, pages + 1)}
+
+
+def run(name: str, buf: PageBuffer, pages: int, args) -> Dict:
+    chunker = get_chunker(name, max_chars=args.max_chars, max_tokens=args.max_tokens, overlap_tokens=args.overlap)
+    best = float("inf")
+    chunks: List[str] = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        chunks = list(chunker.iter_chunks(buf.iter_section(1, pages)))
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    for _ in chunker.iter_chunks(buf.iter_section(1, pages)):
+        pass  # streaming consumer: chunks are dropped as they are produced
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    tok = get_tokenizer()
+    counts = [tok.count(c) for c in chunks] or [0]
+    return {
+        "strategy": chunker.name,
+        "chunks": len(chunks),
+        "best_s": round(best, 4),
+        "chunks_per_s": round(len(chunks) / best, 1) if best else None,
+        "mb_per_s": round(len(buf) / (1024 * 1024) / best, 2) if best else None,
+        "tokens_mean": round(statistics.fmean(counts), 1),
+        "tokens_max": max(counts),
+        "over_budget": sum(1 for c in counts if c > args.max_tokens),
+        "py_peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark chunk strategies (chunks/sec)")
+    p.add_argument("--pages", type=int, default=500)
+    p.add_argument("--max-chars", type=int, default=2000, dest="max_chars")
+    p.add_argument("--max-tokens", type=int, default=400, dest="max_tokens")
+    p.add_argument("--overlap", type=int, default=50)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args()
+
+    buf = PageBuffer(make_pages(args.pages, args.seed))
+    print(f"pages={args.pages} chars={len(buf)} tokenizer={get_tokenizer().name}")
+    for name in ("paragraph", "token"):
+        print(json.dumps(run(name, buf, args.pages, args)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
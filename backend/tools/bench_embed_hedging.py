@@ -0,0 +1,178 @@
+# tools/bench_embed_hedging.py
+"""
+Query-embedding tail latency with and without hedging, against a local stub of
+the OpenAI /embeddings endpoint with injected jitter (no network, no API key).
+
+The stub answers after `--base-ms` + uniform(0, --jitter-ms), and with probability
+--tail-p after --tail-ms instead (a stalled upstream). Each mode runs --requests
+embed calls through the real OpenAIEmbedder + Hedger under a --deadline-ms
+request deadline, from --concurrency client threads, and reports:
+
+  p50/p95/p99/max latency, deadline misses, and upstream requests per call
+  (hedging trades a few % extra upstream calls for the tail)
+
+Usage (from backend/):
+    python -m tools.bench_embed_hedging
+    python -m tools.bench_embed_hedging --tail-p 0.02 --tail-ms 800 --percentile 90 --requests 2000
+
+Results are written to tools/out/bench_embed_hedging_<ts>.json.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app import deadline
+from app.embedder_openai import EMBED_DIM, OpenAIEmbedder
+from app.hedging import Hedger
+from tools.bench_search import percentile
+
+
+class StubState:
+    def __init__(self, base_ms: float, jitter_ms: float, tail_p: float, tail_ms: float, seed: int) -> None:
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self.tail_p = tail_p
+        self.tail_ms = tail_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.vector = json.dumps([1.0 / EMBED_DIM ** 0.5] * EMBED_DIM)
+
+    def delay_s(self) -> float:
+        with self.lock:
+            self.requests += 1
+            if self.rng.random() < self.tail_p:
+                return self.tail_ms / 1000.0
+            return (self.base_ms + self.rng.random() * self.jitter_ms) / 1000.0
+
+
+def start_stub(state: StubState) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:  # noqa: N802
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", "0"))) or b"{}")
+            time.sleep(state.delay_s())
+            n = len(body.get("input") or [])
+            data = ",".join(f'{{"index": {i}, "embedding": {state.vector}}}' for i in range(n))
+            out = f'{{"data": [{data}]}}'.encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client cancelled (lost hedge / deadline)
+
+        def log_message(self, *a) -> None:
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address) -> None:
+            pass  # connections reset by cancelled clients
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_mode(hedge: bool, args, state: StubState) -> Dict[str, Any]:
+    emb = OpenAIEmbedder()
+    hedger = Hedger(f"bench-{'on' if hedge else 'off'}-{time.monotonic_ns()}", enabled=hedge,
+                    percentile=args.percentile, max_hedges=args.max_hedges,
+                    min_samples=args.min_samples, pool_size=args.concurrency * (1 + args.max_hedges))
+    for i in range(args.warmup):  # fill the latency window
+        with deadline.bound(args.deadline_ms / 1000.0):
+            hedger.call(emb.embed_texts, [f"warmup {i}"])
+
+    lat_ms: List[float] = []
+    misses = 0
+    lock = threading.Lock()
+    before = state.requests
+
+    def one(i: int) -> None:
+        nonlocal misses
+        t0 = time.perf_counter()
+        try:
+            with deadline.bound(args.deadline_ms / 1000.0):
+                hedger.call(emb.embed_texts, [f"query {i}"])
+            ok = True
+        except deadline.DeadlineExceeded:
+            ok = False
+        dt = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            lat_ms.append(dt)
+            misses += int(not ok)
+
+    with ThreadPoolExecutor(args.concurrency) as ex:
+        list(ex.map(one, range(args.requests)))
+    upstream = state.requests - before
+    return {
+        "hedging": hedge,
+        "requests": args.requests,
+        "p50_ms": round(percentile(lat_ms, 50), 1),
+        "p95_ms": round(percentile(lat_ms, 95), 1),
+        "p99_ms": round(percentile(lat_ms, 99), 1),
+        "max_ms": round(max(lat_ms), 1),
+        "deadline_misses": misses,
+        "upstream_per_call": round(upstream / args.requests, 3),
+        "hedger": hedger.stats(),
+    }
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="p99 of query embedding with/without hedging vs a jittery stub")
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--warmup", type=int, default=50)
+    p.add_argument("--base-ms", type=float, default=20.0, dest="base_ms")
+    p.add_argument("--jitter-ms", type=float, default=10.0, dest="jitter_ms")
+    p.add_argument("--tail-p", type=float, default=0.03, dest="tail_p", help="Share of stalled upstream calls")
+    p.add_argument("--tail-ms", type=float, default=400.0, dest="tail_ms")
+    p.add_argument("--deadline-ms", type=float, default=1000.0, dest="deadline_ms")
+    p.add_argument("--percentile", type=float, default=95.0, help="Hedge after this latency percentile")
+    p.add_argument("--max-hedges", type=int, default=1, dest="max_hedges")
+    p.add_argument("--min-samples", type=int, default=20, dest="min_samples")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    state = StubState(args.base_ms, args.jitter_ms, args.tail_p, args.tail_ms, args.seed)
+    server = start_stub(state)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    try:
+        results = [run_mode(False, args, state), run_mode(True, args, state)]
+    finally:
+        server.shutdown()
+
+    for r in results:
+        print(f"hedging={'on ' if r['hedging'] else 'off'} p50={r['p50_ms']}ms p95={r['p95_ms']}ms "
+              f"p99={r['p99_ms']}ms max={r['max_ms']}ms misses={r['deadline_misses']} "
+              f"upstream/call={r['upstream_per_call']}")
+    off, on = results
+    if off["p99_ms"]:
+        print(f"p99 improvement: {off['p99_ms']} -> {on['p99_ms']} ms "
+              f"({(1 - on['p99_ms'] / off['p99_ms']) * 100:.1f}%)")
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    out = Path(args.out or os.path.join("tools", "out", f"bench_embed_hedging_{ts}.json"))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"tool": "bench_embed_hedging", "args": vars(args), "results": results}, indent=2),
+                   encoding="utf-8")
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
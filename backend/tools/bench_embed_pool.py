@@ -0,0 +1,129 @@
+# tools/bench_embed_pool.py
+"""
+Scaling of ProcessPoolEmbedder (app/embeddings.py) for the CPU-bound providers.
+
+For every --workers value (0 = inline on the calling thread) and transfer mode
+(shm = shared-memory float64 block, pickle = pickled lists back from the workers),
+embeds --texts synthetic chunks in --batch-size batches and reports:
+
+  texts/s, speedup and parallel efficiency vs inline
+  probe p50/p99: latency (from wake-up to done, GIL wait included) of a ~1 ms
+  pure-Python task run every 2 ms on another thread meanwhile, i.e. what a
+  concurrent /search in the same API worker sees while embed_document runs
+  (inline, the bulk call holds the GIL)
+
+tfidf is fitted in memory on the same synthetic corpus (tools/bench_embedders.py).
+
+Usage (from backend/):
+    python -m tools.bench_embed_pool
+    python -m tools.bench_embed_pool --provider tfidf --texts 20000 --workers 0,1,2,4,8
+
+Results are written to tools/out/bench_embed_pool_<ts>.json.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.embeddings import FakeEmbedder, ProcessPoolEmbedder
+from tools.bench_embedders import synth_corpus
+from tools.bench_search import percentile
+
+
+def _probe_task() -> None:
+    x = 0
+    for i in range(20000):
+        x += i * i
+
+
+def run(emb, texts: List[str], batch_size: int) -> Dict[str, Any]:
+    emb.embed_texts(texts[:batch_size])  # warm up (spawns the pool)
+    probe_ms: List[float] = []
+    stop = threading.Event()
+
+    def probe() -> None:
+        while not stop.is_set():
+            wake = time.perf_counter() + 0.002
+            time.sleep(0.002)
+            _probe_task()
+            probe_ms.append((time.perf_counter() - wake) * 1000.0)
+
+    th = threading.Thread(target=probe, daemon=True)
+    th.start()
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        emb.embed_texts(texts[i:i + batch_size])
+    wall = time.perf_counter() - t0
+    stop.set()
+    th.join()
+    return {
+        "wall_s": round(wall, 3),
+        "texts_per_s": round(len(texts) / wall, 1),
+        "probe_p50_ms": round(percentile(probe_ms, 50) or 0.0, 2),
+        "probe_p99_ms": round(percentile(probe_ms, 99) or 0.0, 2),
+    }
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Throughput scaling of the embedding process pool")
+    p.add_argument("--provider", choices=("fake", "tfidf"), default="fake")
+    p.add_argument("--texts", type=int, default=2000)
+    p.add_argument("--batch-size", type=int, default=256, dest="batch_size")
+    p.add_argument("--workers", default="0,1,2,4")
+    p.add_argument("--transfer", default="shm,pickle", help="Result transfer modes to compare")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    texts = synth_corpus(args.texts, 50, args.seed)
+    print(f"provider={args.provider} texts={len(texts)} batch={args.batch_size} cpus={os.cpu_count()}")
+    t0 = time.perf_counter()
+    _probe_task()
+    idle_probe_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.provider == "tfidf":
+            from app.embedder_tfidf import TfidfEmbedder, fit_texts
+
+            path = os.path.join(tmp, "model.npz")
+            fit_texts(texts).save(path)
+            factory = partial(TfidfEmbedder.load, path)
+        else:
+            factory = FakeEmbedder
+
+        results = []
+        inline_tps = None
+        for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+            for mode in (["inline"] if w == 0 else [m.strip() for m in args.transfer.split(",") if m.strip()]):
+                emb = factory() if w == 0 else ProcessPoolEmbedder(factory, w, min_batch=1,
+                                                                   shared_memory=mode == "shm")
+                try:
+                    r = {"workers": w, "transfer": mode, **run(emb, texts, args.batch_size)}
+                finally:
+                    if w:
+                        emb.shutdown()
+                if w == 0:
+                    inline_tps = r["texts_per_s"]
+                if inline_tps:
+                    r["speedup"] = round(r["texts_per_s"] / inline_tps, 2)
+                    r["efficiency"] = round(r["speedup"] / max(w, 1), 2)
+                print(f"workers={w} transfer={mode:6} {r['texts_per_s']:>9} texts/s "
+                      f"speedup={r.get('speedup')} probe p50={r['probe_p50_ms']}ms p99={r['probe_p99_ms']}ms")
+                results.append(r)
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    out = Path(args.out or os.path.join("tools", "out", f"bench_embed_pool_{ts}.json"))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"tool": "bench_embed_pool", "args": vars(args), "idle_probe_ms": idle_probe_ms,
+                               "results": results}, indent=2), encoding="utf-8")
+    print(f"idle probe {idle_probe_ms}ms; wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
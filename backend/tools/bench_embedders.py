@@ -0,0 +1,175 @@
+# tools/bench_embedders.py
+"""
+Throughput and retrieval quality of the offline embedders (fake vs tfidf).
+
+Corpus: document_chunks (--source db, first --docs chunks) or a synthetic topical
+corpus (--source synth: --topics vocabularies of made-up words plus shared filler),
+so it also runs without a database.
+
+Quality: for --queries sampled chunks, the query is a shuffled subset of --query-words
+of the chunk's own words, with --typo of them misspelt (two letters swapped). Each
+query is ranked against every chunk by cosine (numpy, brute force) and we report
+recall@1, recall@10 and MRR of the source chunk. FakeEmbedder maps any changed text
+to an unrelated vector, so it sits at ~chance level; that is the baseline.
+
+Throughput: texts/s for embed_texts() over --throughput-docs chunks in --batch-size
+batches; tfidf once per --workers value (0 = inline, N = ProcessPoolEmbedder with N
+processes; see tools/bench_embed_pool.py for the full scaling run).
+
+Usage (from backend/):
+    python -m tools.bench_embedders --source synth --docs 20000
+    python -m tools.bench_embedders --source db --docs 50000 --workers 1,2,4,8
+
+Results are written to tools/out/bench_embedders_<ts>.json.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from app.embedder_tfidf import TfidfConfig, TfidfEmbedder, fit_texts, iter_chunk_texts  # noqa: E402
+from app.embeddings import FakeEmbedder, ProcessPoolEmbedder  # noqa: E402
+
+_SYLLABLES = ("ka", "lo", "mi", "ren", "tu", "sa", "vor", "ne", "di", "pal", "qu", "est", "ob", "ri", "zan", "fe")
+
+
+def synth_corpus(n_docs: int, topics: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+    filler = [word() for _ in range(200)]
+    vocab = [[word() for _ in range(150)] for _ in range(topics)]
+    docs = []
+    for i in range(n_docs):
+        topic = vocab[i % topics]
+        words = [rng.choice(topic) if rng.random() < 0.6 else rng.choice(filler) for _ in range(rng.randint(60, 160))]
+        docs.append(" ".join(words))
+    return docs
+
+
+def db_corpus(n_docs: int) -> List[str]:
+    from app.routers.documents import get_conn
+
+    with get_conn() as conn:
+        return [t for t in iter_chunk_texts(conn, limit=n_docs) if t.strip()]
+
+
+def make_queries(docs: List[str], n: int, words: int, typo: float, seed: int) -> List[Tuple[int, str]]:
+    rng = random.Random(seed + 1)
+    out = []
+    for idx in rng.sample(range(len(docs)), min(n, len(docs))):
+        toks = docs[idx].split()
+        picked = rng.sample(toks, min(words, len(toks)))
+        for j, t in enumerate(picked):
+            if len(t) > 3 and rng.random() < typo:
+                k = rng.randrange(len(t) - 1)
+                picked[j] = t[:k] + t[k + 1] + t[k] + t[k + 2:]
+        out.append((idx, " ".join(picked)))
+    return out
+
+
+def embed_all(emb, texts: List[str], batch_size: int) -> np.ndarray:
+    parts = [np.asarray(emb.embed_texts(texts[i:i + batch_size]), dtype=np.float32)
+             for i in range(0, len(texts), batch_size)]
+    return np.vstack(parts)
+
+
+def quality(emb, docs: List[str], queries: List[Tuple[int, str]], batch_size: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    D = embed_all(emb, docs, batch_size)
+    Q = embed_all(emb, [q for _, q in queries], batch_size)
+    truth = np.array([i for i, _ in queries])
+    sims = Q @ D.T
+    true_sim = sims[np.arange(len(queries)), truth]
+    ranks = (sims > true_sim[:, None]).sum(axis=1) + 1  # 1 = source chunk ranked first
+    return {
+        "recall_at_1": round(float((ranks <= 1).mean()), 4),
+        "recall_at_10": round(float((ranks <= 10).mean()), 4),
+        "mrr": round(float((1.0 / ranks).mean()), 4),
+        "wall_s": round(time.perf_counter() - t0, 2),
+    }
+
+
+def throughput(emb, texts: List[str], batch_size: int) -> Dict[str, Any]:
+    emb.embed_texts(texts[:batch_size])  # warm up (spawns the pool, if any)
+    t0 = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        emb.embed_texts(texts[i:i + batch_size])
+    wall = time.perf_counter() - t0
+    return {"texts": len(texts), "wall_s": round(wall, 3), "texts_per_s": round(len(texts) / wall, 1)}
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Throughput + retrieval quality of offline embedders")
+    p.add_argument("--source", choices=("synth", "db"), default="synth")
+    p.add_argument("--docs", type=int, default=5000)
+    p.add_argument("--topics", type=int, default=50)
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--query-words", type=int, default=8, dest="query_words")
+    p.add_argument("--typo", type=float, default=0.1)
+    p.add_argument("--throughput-docs", type=int, default=2000, dest="throughput_docs")
+    p.add_argument("--batch-size", type=int, default=512, dest="batch_size")
+    p.add_argument("--workers", default="0,2,4", help="tfidf worker counts to time (0 = inline)")
+    p.add_argument("--skip-fake", action="store_true", dest="skip_fake", help="FakeEmbedder is slow; skip it")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    docs = synth_corpus(args.docs, args.topics, args.seed) if args.source == "synth" else db_corpus(args.docs)
+    queries = make_queries(docs, args.queries, args.query_words, args.typo, args.seed)
+    sample = docs[:args.throughput_docs]
+    print(f"corpus={len(docs)} ({args.source}) queries={len(queries)}")
+
+    t0 = time.perf_counter()
+    tfidf = fit_texts(docs, TfidfConfig())
+    fit_s = round(time.perf_counter() - t0, 2)
+    results: Dict[str, Any] = {"tfidf": {"model": tfidf.name, "fit_s": fit_s,
+                                         "quality": quality(tfidf, docs, queries, args.batch_size)}}
+    print(f"tfidf  fit={fit_s}s quality={results['tfidf']['quality']}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.npz")
+        tfidf.save(path)
+        runs = []
+        for w in [int(x) for x in args.workers.split(",") if x.strip()]:
+            emb = ProcessPoolEmbedder(partial(TfidfEmbedder.load, path), w, min_batch=1) if w else tfidf
+            r = {"workers": w, **throughput(emb, sample, args.batch_size)}
+            if w:
+                emb.shutdown()
+            print(f"tfidf  workers={w} {r['texts_per_s']} texts/s")
+            runs.append(r)
+        results["tfidf"]["throughput"] = runs
+
+    if not args.skip_fake:
+        fake = FakeEmbedder()
+        fake_docs = docs[:min(len(docs), 2000)]  # ~1 ms per text
+        fake_queries = [(i, q) for i, q in queries if i < len(fake_docs)]
+        results["fake"] = {
+            "quality": quality(fake, fake_docs, fake_queries, args.batch_size) if fake_queries else None,
+            "throughput": throughput(fake, sample[:500], args.batch_size),
+        }
+        print(f"fake   {results['fake']['throughput']['texts_per_s']} texts/s quality={results['fake']['quality']}")
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    out = Path(args.out or os.path.join("tools", "out", f"bench_embedders_{ts}.json"))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"tool": "bench_embedders", "args": vars(args), "results": results}, indent=2),
+                   encoding="utf-8")
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,295 @@
+# tools/bench_ingest.py
+"""
+Ingestion throughput benchmark for every /admin/documents stage:
+
+    store-toc -> parse-pages -> chunk-toc -> export-chunks -> embed
+
+Generates a PDF with PyMuPDF (configurable page count, TOC depth and fan-out),
+registers it in `documents`, runs each stage in-process and records per stage:
+wall time, Python peak allocation (tracemalloc), process max RSS, rows written
+and DB statements (execute = 1, executemany = 1 per parameter set) / connects.
+
+Regression gate (CI-style): --baseline <json> --threshold 0.25 exits 1 when a
+stage's wall_ms, py_peak_mb or db_statements grows by more than 25%.
+
+Usage (from backend/):
+    python -m tools.bench_ingest --pages 200 --depth 3 --fanout 4
+    python -m tools.bench_ingest --pages 200 --save-baseline tools/out/bench_ingest_baseline.json
+    python -m tools.bench_ingest --pages 200 --baseline tools/out/bench_ingest_baseline.json --threshold 0.25
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+import fitz  # noqa: E402
+import psycopg  # noqa: E402
+
+from app.metrics import DB_CONNECTIONS  # noqa: E402
+from app.routers import documents as docs  # noqa: E402
+
+WORDS = (
+    "inspect the propeller blades for cracks and replace the battery when swollen "
+    "calibrate the compass away from metal structures update firmware before flight "
+    "check gimbal damping balls clean the vision sensors tighten the arm locks"
+).split()
+
+COMPARED = ("wall_ms", "py_peak_mb", "db_statements")
+
+
+# -----------------------------
+# PDF generation
+# -----------------------------
+def build_toc(pages: int, depth: int, fanout: int) -> List[List[Any]]:
+    """Balanced TOC: `fanout` children per node down to `depth`, spread over `pages`."""
+    toc: List[List[Any]] = []
+
+    def walk(level: int, prefix: str, start: int, end: int) -> None:
+        n = fanout if level > 1 else max(1, min(fanout * 2, end - start + 1))
+        span_len = max(1, (end - start + 1) // n)
+        for i in range(n):
+            s = start + i * span_len
+            if s > end:
+                break
+            e = end if i == n - 1 else min(end, s + span_len - 1)
+            title = f"{prefix}{i + 1}"
+            toc.append([level, f"Section {title}", s])
+            if level < depth and e > s:
+                walk(level + 1, f"{title}.", s, e)
+
+    walk(1, "", 1, pages)
+    return toc
+
+
+def make_pdf(path: Path, pages: int, depth: int, fanout: int, seed: int) -> int:
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for p in range(pages):
+        page = pdf.new_page()
+        text = "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(60)) for _ in range(6))
+        page.insert_textbox(fitz.Rect(50, 50, 545, 790), f"Page {p + 1}\n\n{text}", fontsize=8)
+    toc = build_toc(pages, depth, fanout)
+    pdf.set_toc(toc)
+    pdf.save(str(path))
+    pdf.close()
+    return len(toc)
+
+
+# -----------------------------
+# Instrumentation
+# -----------------------------
+class _StatementCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    @contextmanager
+    def patched(self):
+        orig_exec = psycopg.Cursor.execute
+        orig_many = psycopg.Cursor.executemany
+        counter = self
+
+        def execute(self, *a, **kw):
+            counter.count += 1
+            return orig_exec(self, *a, **kw)
+
+        def executemany(self, query, params_seq, *a, **kw):
+            params_seq = list(params_seq)
+            counter.count += len(params_seq)
+            return orig_many(self, query, params_seq, *a, **kw)
+
+        psycopg.Cursor.execute = execute
+        psycopg.Cursor.executemany = executemany
+        try:
+            yield self
+        finally:
+            psycopg.Cursor.execute = orig_exec
+            psycopg.Cursor.executemany = orig_many
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def _count_rows(doc_id: int) -> Dict[str, int]:
+    with docs.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT
+              (SELECT COUNT(*) FROM document_toc   WHERE document_id = %(d)s),
+              (SELECT COUNT(*) FROM document_pages WHERE document_id = %(d)s),
+              (SELECT COUNT(*) FROM document_chunks WHERE document_id = %(d)s),
+              (SELECT COUNT(*) FROM chunk_embeddings ce
+                 JOIN document_chunks c ON c.id = ce.chunk_id WHERE c.document_id = %(d)s)
+            """,
+            {"d": doc_id},
+        )
+        toc, pages, chunks, embs = cur.fetchone()
+    return {"document_toc": toc, "document_pages": pages, "document_chunks": chunks, "chunk_embeddings": embs}
+
+
+def run_stage(name: str, fn: Callable[[], Any], table: str, doc_id: int, use_tracemalloc: bool) -> Dict[str, Any]:
+    before = _count_rows(doc_id)
+    connects_before = DB_CONNECTIONS.value(module="documents")
+    counter = _StatementCounter()
+    if use_tracemalloc:
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    with counter.patched():
+        result = fn()
+    wall_ms = (time.perf_counter() - t0) * 1000.0
+    py_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if use_tracemalloc else None
+    after = _count_rows(doc_id)
+
+    out = {
+        "stage": name,
+        "wall_ms": round(wall_ms, 1),
+        "py_peak_mb": round(py_peak, 2) if py_peak is not None else None,
+        "max_rss_mb": _max_rss_mb(),
+        "rows_table": table,
+        "rows_written": after.get(table, 0) if table else None,
+        "rows_delta": (after.get(table, 0) - before.get(table, 0)) if table else None,
+        "db_statements": counter.count,
+        "db_connects": int(DB_CONNECTIONS.value(module="documents") - connects_before),
+    }
+    if name == "export-chunks" and isinstance(result, dict):
+        out["files_written"] = result.get("files_written")
+    print(json.dumps(out))
+    return out
+
+
+# -----------------------------
+# Setup / teardown
+# -----------------------------
+def register(pdf_path: Path, tag: str) -> Tuple[int, int]:
+    with docs.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO products (brand, model) VALUES (%s, %s) RETURNING id", (f"bench-ingest-{tag}", "m1"))
+        pid = cur.fetchone()[0]
+        cur.execute(
+            """
+            INSERT INTO documents (product_id, title, source_url, type, uploaded_at, local_path)
+            VALUES (%s, %s, %s, 'pdf', NOW(), %s) RETURNING id
+            """,
+            (pid, f"bench ingest {tag}", f"bench://{tag}.pdf", str(pdf_path)),
+        )
+        doc_id = cur.fetchone()[0]
+        conn.commit()
+    return pid, doc_id
+
+
+def cleanup(doc_id: int, product_id: int) -> None:
+    with docs.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM chunk_embeddings WHERE chunk_id IN (SELECT id FROM document_chunks WHERE document_id = %s)",
+            (doc_id,),
+        )
+        cur.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        conn.commit()
+
+
+def check_regressions(stages: List[Dict[str, Any]], baseline_path: str, threshold: float) -> List[str]:
+    base = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    base_by_stage = {s["stage"]: s for s in base.get("stages", [])}
+    failures = []
+    for s in stages:
+        b = base_by_stage.get(s["stage"])
+        if not b:
+            continue
+        for key in COMPARED:
+            cur, ref = s.get(key), b.get(key)
+            if cur is None or not ref:
+                continue
+            if cur > ref * (1.0 + threshold):
+                failures.append(f"{s['stage']}.{key}: {ref} -> {cur} (+{(cur - ref) / ref * 100:.1f}% > {threshold * 100:.0f}%)")
+    return failures
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark every documents ingestion stage")
+    p.add_argument("--pages", type=int, default=100)
+    p.add_argument("--depth", type=int, default=3, help="TOC depth")
+    p.add_argument("--fanout", type=int, default=4, help="Children per TOC node")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--max-chars", type=int, default=2000, dest="max_chars")
+    p.add_argument("--batch-size", type=int, default=32, dest="batch_size")
+    p.add_argument("--skip-embed", action="store_true", dest="skip_embed")
+    p.add_argument("--no-tracemalloc", action="store_true", dest="no_tracemalloc")
+    p.add_argument("--keep", action="store_true", help="Keep DB rows + workdir")
+    p.add_argument("--out", default=None)
+    p.add_argument("--baseline", default=None, help="Baseline JSON to gate against")
+    p.add_argument("--threshold", type=float, default=0.25, help="Allowed relative growth vs baseline")
+    p.add_argument("--save-baseline", default=None, dest="save_baseline")
+    args = p.parse_args()
+
+    use_tm = not args.no_tracemalloc
+    if use_tm:
+        tracemalloc.start()
+
+    tag = time.strftime("%Y%m%d%H%M%S")
+    workdir = Path(tempfile.mkdtemp(prefix="bench_ingest_"))
+    pdf_path = workdir / "bench.pdf"
+    toc_len = make_pdf(pdf_path, args.pages, args.depth, args.fanout, args.seed)
+    print(f"PDF: {pdf_path} pages={args.pages} toc_entries={toc_len}")
+
+    out_path = Path(args.out or os.path.join("tools", "out", f"bench_ingest_{tag}.json")).resolve()
+    save_baseline = Path(args.save_baseline).resolve() if args.save_baseline else None
+    baseline = str(Path(args.baseline).resolve()) if args.baseline else None
+
+    product_id, doc_id = register(pdf_path, tag)
+    cwd = os.getcwd()
+    stages: List[Dict[str, Any]] = []
+    try:
+        os.chdir(workdir)  # export-chunks writes under ./storage/chunks
+        stages.append(run_stage("store-toc", lambda: docs.store_document_toc(doc_id), "document_toc", doc_id, use_tm))
+        stages.append(run_stage("parse-pages", lambda: docs.parse_pages(doc_id), "document_pages", doc_id, use_tm))
+        stages.append(run_stage("chunk-toc", lambda: docs.chunk_by_toc(doc_id, max_chars=args.max_chars),
+                                "document_chunks", doc_id, use_tm))
+        stages.append(run_stage("export-chunks", lambda: docs.export_chunks_to_files(doc_id), "", doc_id, use_tm))
+        if not args.skip_embed:
+            stages.append(run_stage("embed", lambda: docs.embed_document(doc_id, batch_size=args.batch_size),
+                                    "chunk_embeddings", doc_id, use_tm))
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            cleanup(doc_id, product_id)
+
+    result = {
+        "tool": "bench_ingest",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "toc_entries": toc_len,
+        "stages": stages,
+    }
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"Wrote {out_path}")
+    if save_baseline:
+        save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        save_baseline.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        print(f"Saved baseline {save_baseline}")
+
+    if baseline:
+        failures = check_regressions(stages, baseline, args.threshold)
+        if failures:
+            print("REGRESSIONS:")
+            for f in failures:
+                print(f"  - {f}")
+            return 1
+        print(f"OK: no stage regressed more than {args.threshold * 100:.0f}% vs {baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
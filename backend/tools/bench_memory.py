@@ -0,0 +1,182 @@
+# tools/bench_memory.py
+"""
+Memory benchmark for the streaming /chunk-toc and /embed paths.
+
+For each --pages size it loads a synthetic document straight into the DB
+(documents + document_meta + document_toc + document_pages, no PDF needed), then
+runs every stage in a FRESH child process and reports:
+
+  rss_base_mb   max RSS after imports, before the stage
+  rss_peak_mb   max RSS after the stage
+  rss_delta_mb  what the stage itself added
+  py_peak_mb    tracemalloc peak during the stage
+
+Pass criterion (exit 1 otherwise): rss_delta_mb at the largest size is at most
+--max-growth x the delta at the smallest size (+ --slack-mb of allocator noise).
+Chunking runs with leaf_only by default: a non-leaf parent section necessarily
+holds its whole page span, so use --no-leaf to see that cost.
+
+Usage (from backend/):
+    python -m tools.bench_memory --pages 250,1000,2000
+    python -m tools.bench_memory --pages 250,2000 --no-leaf --skip-embed
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from app.routers import documents as docs  # noqa: E402
+from app.toc_utils import compute_toc_ranges  # noqa: E402
+from tools.bench_ingest import WORDS, build_toc  # noqa: E402
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def load_document(pages: int, chars: int, seed: int, tag: str) -> Dict[str, int]:
+    rng = random.Random(seed)
+    toc = build_toc(pages, depth=3, fanout=4)
+    entries = [(lvl, title, page, i + 1) for i, (lvl, title, page) in enumerate(toc)]
+    with docs.get_conn() as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO products (brand, model) VALUES (%s, %s) RETURNING id", (f"bench-memory-{tag}", str(pages)))
+        pid = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO documents (product_id, title, source_url, type, uploaded_at) "
+            "VALUES (%s, %s, %s, 'pdf', NOW()) RETURNING id",
+            (pid, f"bench memory {pages}p", f"bench://memory/{tag}/{pages}.pdf"),
+        )
+        doc_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO document_meta (document_id, local_path, page_count, toc, sha256, file_size, file_mtime) "
+            "VALUES (%s, %s, %s, '[]'::jsonb, 'synthetic', 0, 0)",
+            (doc_id, f"bench://memory/{pages}.pdf", pages),
+        )
+        with cur.copy("COPY document_toc (document_id, level, title, page_from, page_to, order_index, raw_path) FROM STDIN") as cp:
+            for r in compute_toc_ranges(entries, pages):
+                cp.write_row((doc_id, r.level, r.title, r.start, r.end, r.order_index, r.path))
+        with cur.copy("COPY document_pages (document_id, page_number, content) FROM STDIN") as cp:
+            for p in range(1, pages + 1):
+                words: List[str] = []
+                n = 0
+                while n < chars:
+                    w = rng.choice(WORDS)
+                    words.append(w)
+                    n += len(w) + 1
+                    if rng.random() < 0.02:
+                        words[-1] += ".\n\n"
+                cp.write_row((doc_id, p, " ".join(words)))
+        conn.commit()
+    return {"product_id": pid, "doc_id": doc_id}
+
+
+def cleanup(product_id: int, doc_id: int) -> None:
+    with docs.get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM chunk_embeddings WHERE chunk_id IN (SELECT id FROM document_chunks WHERE document_id = %s)",
+            (doc_id,),
+        )
+        cur.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        conn.commit()
+
+
+def child(stage: str, doc_id: int, leaf_only: bool, batch_size: int) -> None:
+    """Runs inside a fresh interpreter; prints one JSON line."""
+    base = _max_rss_mb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    if stage == "chunk":
+        out = docs.chunk_by_toc(doc_id, leaf_only=leaf_only)
+        rows = out.get("chunks_created")
+    else:
+        out = docs.embed_document(doc_id, batch_size=batch_size)
+        rows = out.get("embedded")
+    wall = time.perf_counter() - t0
+    py_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    peak = _max_rss_mb()
+    print(json.dumps({
+        "stage": stage,
+        "rows": rows,
+        "wall_s": round(wall, 2),
+        "rss_base_mb": round(base, 1),
+        "rss_peak_mb": round(peak, 1),
+        "rss_delta_mb": round(peak - base, 1),
+        "py_peak_mb": round(py_peak, 2),
+    }))
+
+
+def run_child(stage: str, doc_id: int, args) -> Dict[str, Any]:
+    cmd = [sys.executable, "-m", "tools.bench_memory", "--child", stage, "--doc-id", str(doc_id),
+           "--batch-size", str(args.batch_size)]
+    if args.no_leaf:
+        cmd.append("--no-leaf")
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, env=os.environ.copy())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Peak-memory benchmark for streaming chunk/embed")
+    p.add_argument("--pages", default="250,1000,2000", help="Comma list of document sizes")
+    p.add_argument("--chars", type=int, default=3000, help="Characters per page")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--batch-size", type=int, default=32, dest="batch_size")
+    p.add_argument("--no-leaf", action="store_true", dest="no_leaf")
+    p.add_argument("--skip-embed", action="store_true", dest="skip_embed")
+    p.add_argument("--max-growth", type=float, default=1.5, dest="max_growth")
+    p.add_argument("--slack-mb", type=float, default=8.0, dest="slack_mb")
+    p.add_argument("--out", default=None)
+    p.add_argument("--child", choices=("chunk", "embed"), default=None, help=argparse.SUPPRESS)
+    p.add_argument("--doc-id", type=int, default=None, dest="doc_id", help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        child(args.child, args.doc_id, not args.no_leaf, args.batch_size)
+        return 0
+
+    tag = time.strftime("%Y%m%d%H%M%S")
+    stages = ["chunk"] + ([] if args.skip_embed else ["embed"])
+    results: List[Dict[str, Any]] = []
+    for pages in [int(x) for x in args.pages.split(",") if x.strip()]:
+        ids = load_document(pages, args.chars, args.seed, tag)
+        try:
+            for stage in stages:
+                r = {"pages": pages, **run_child(stage, ids["doc_id"], args)}
+                print(json.dumps(r))
+                results.append(r)
+        finally:
+            cleanup(ids["product_id"], ids["doc_id"])
+
+    failures = []
+    for stage in stages:
+        rs = sorted((r for r in results if r["stage"] == stage), key=lambda r: r["pages"])
+        if len(rs) < 2:
+            continue
+        small, large = rs[0], rs[-1]
+        limit = small["rss_delta_mb"] * args.max_growth + args.slack_mb
+        verdict = "OK" if large["rss_delta_mb"] <= limit else "GROWS"
+        print(f"{stage}: {small['pages']}p -> {small['rss_delta_mb']} MB, {large['pages']}p -> "
+              f"{large['rss_delta_mb']} MB (limit {limit:.1f} MB) {verdict}")
+        if verdict != "OK":
+            failures.append(stage)
+
+    out = Path(args.out or os.path.join("tools", "out", f"bench_memory_{tag}.json"))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"tool": "bench_memory", "args": vars(args), "results": results}, indent=2), encoding="utf-8")
+    print(f"Wrote {out}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+# tools/bench_prefix_search.py
+"""
+Latency / recall trade-off of two-stage retrieval (truncated prefix -> full rerank).
+
+Offline sweep (numpy, no index): for every --prefixes d and --candidates C,
+  stage 1  inner product against the unit-normalised first d dims of every vector,
+           keep the C best
+  stage 2  full 1536-dim inner product on those C, keep the --top-k best
+and report per-query latency next to the exact full scan, recall@k of the
+two-stage result against the exact one and, for synth, hit@k: how often the
+query's source chunk is in the top k (full scan vs two-stage).
+
+  --source synth  tfidf vectors of a synthetic corpus, queries = word subsets of
+                  chunks (tools/bench_embedders.py)
+  --source db     vectors from chunk_embeddings; each query is a stored vector
+                  (its own chunk excluded from the answers)
+
+--sql additionally runs run_search() for --sql-queries texts with SEARCH_TWO_STAGE
+off and on (needs EMBED_PREFIX_DIMS and scripts/add_embedding_prefix_column.py) and
+reports p50/p95 latency and how many top-k chunk ids the two modes share.
+
+Usage (from backend/):
+    python -m tools.bench_prefix_search --docs 20000
+    python -m tools.bench_prefix_search --source db --docs 100000 --prefixes 128,256,512
+    EMBED_PREFIX_DIMS=256 python -m tools.bench_prefix_search --source db --sql
+
+Results are written to tools/out/bench_prefix_search_<ts>.json.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from tools.bench_search import percentile  # noqa: E402
+
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return np.divide(m, norms, out=np.zeros_like(m), where=norms > 0)
+
+
+def synth_vectors(n_docs: int, n_queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray, List[int], List[int]]:
+    """(docs, queries, excluded doc per query, source doc per query)"""
+    from app.embedder_tfidf import fit_texts
+    from tools.bench_embedders import make_queries, synth_corpus
+
+    docs = synth_corpus(n_docs, max(50, n_docs // 20), seed)
+    queries = make_queries(docs, n_queries, 8, 0.1, seed)
+    model = fit_texts(docs)
+    return (model.embed_array(docs), model.embed_array([q for _, q in queries]),
+            [-1] * len(queries), [i for i, _ in queries])
+
+
+def db_vectors(n_docs: int, n_queries: int, seed: int) -> Tuple[np.ndarray, np.ndarray, List[int], List[int]]:
+    from app.routers.documents import get_conn
+
+    with get_conn() as conn, conn.cursor(name="bench_prefix_search") as cur:
+        cur.itersize = 2000
+        cur.execute("SELECT embedding::text AS e FROM chunk_embeddings ORDER BY chunk_id LIMIT %s", (n_docs,))
+        rows = [np.array(json.loads(r["e"] if isinstance(r, dict) else r[0]), dtype=np.float32) for r in cur]
+    if not rows:
+        raise SystemExit("chunk_embeddings is empty")
+    D = _unit(np.vstack(rows))
+    picks = random.Random(seed).sample(range(len(D)), min(n_queries, len(D)))
+    return D, D[picks], picks, []
+
+
+def exact_topk(D: np.ndarray, q: np.ndarray, k: int, exclude: int) -> np.ndarray:
+    sims = D @ q
+    if exclude >= 0:
+        sims[exclude] = -np.inf
+    top = np.argpartition(-sims, k)[:k]
+    return top[np.argsort(-sims[top])]
+
+
+def two_stage_topk(P: np.ndarray, D: np.ndarray, qp: np.ndarray, q: np.ndarray, c: int, k: int,
+                   exclude: int) -> np.ndarray:
+    sims = P @ qp
+    if exclude >= 0:
+        sims[exclude] = -np.inf
+    cand = np.argpartition(-sims, c)[:c]
+    full = D[cand] @ q
+    top = np.argpartition(-full, k)[:k]
+    return cand[top[np.argsort(-full[top])]]
+
+
+def _hit_rate(results: List[Any], sources: List[int]) -> float:
+    return round(float(np.mean([s in set(r) for r, s in zip(results, sources)])), 4)
+
+
+def sweep(D: np.ndarray, Q: np.ndarray, excl: List[int], sources: List[int], prefixes: List[int],
+          candidates: List[int], k: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    exact = [exact_topk(D, q, k, e).tolist() for q, e in zip(Q, excl)]
+    full_ms = (time.perf_counter() - t0) * 1000.0 / len(Q)
+    truth = [set(t) for t in exact]
+    out: Dict[str, Any] = {"full_scan_ms_per_query": round(full_ms, 3)}
+    if sources:
+        out[f"full_scan_hit_at_{k}"] = _hit_rate(exact, sources)
+    runs = []
+    for d in prefixes:
+        P = _unit(np.ascontiguousarray(D[:, :d]))
+        QP = _unit(np.ascontiguousarray(Q[:, :d]))
+        for c in candidates:
+            c = min(c, len(D) - 1)
+            t0 = time.perf_counter()
+            got = [two_stage_topk(P, D, qp, q, c, k, e) for qp, q, e in zip(QP, Q, excl)]
+            ms = (time.perf_counter() - t0) * 1000.0 / len(Q)
+            recall = float(np.mean([len(t & set(g.tolist())) / k for t, g in zip(truth, got)]))
+            r = {"prefix_dims": d, "candidates": c, "ms_per_query": round(ms, 3),
+                 "speedup": round(full_ms / ms, 2), f"recall_at_{k}": round(recall, 4)}
+            if sources:
+                r[f"hit_at_{k}"] = _hit_rate([g.tolist() for g in got], sources)
+            print(f"d={d:>4} C={c:>4}  {r['ms_per_query']:>8} ms/q  x{r['speedup']:<5} "
+                  f"recall@{k}={r[f'recall_at_{k}']}" + (f" hit@{k}={r[f'hit_at_{k}']}" if sources else ""))
+            runs.append(r)
+    out["runs"] = runs
+    return out
+
+
+def sql_compare(n_queries: int, k: int, seed: int) -> Dict[str, Any]:
+    from app.routers import search
+    from tools.bench_embedders import db_corpus, make_queries
+
+    if not search.PREFIX_DIMS:
+        raise SystemExit("--sql needs EMBED_PREFIX_DIMS (and the embedding_prefix column)")
+    texts = [q for _, q in make_queries(db_corpus(2000), n_queries, 6, 0.0, seed)]
+    out: Dict[str, Any] = {}
+    ids: Dict[bool, List[List[int]]] = {}
+    for two_stage in (False, True):
+        search.SEARCH_TWO_STAGE = two_stage
+        lat, ids[two_stage] = [], []
+        for t in texts:
+            t0 = time.perf_counter()
+            res = search.run_search(search.SearchIn(text=t, top_k=k))
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            ids[two_stage].append([r["chunk_id"] for r in res["results"]])
+        out["two_stage" if two_stage else "full"] = {"p50_ms": round(percentile(lat, 50), 2),
+                                                     "p95_ms": round(percentile(lat, 95), 2)}
+    overlap = [len(set(a) & set(b)) / max(1, len(a)) for a, b in zip(ids[False], ids[True])]
+    out["overlap_at_k"] = round(sum(overlap) / max(1, len(overlap)), 4)
+    out["prefix_dims"] = search.PREFIX_DIMS
+    out["candidates"] = search.SEARCH_PREFIX_CANDIDATES
+    print(f"sql: full {out['full']}  two-stage {out['two_stage']}  overlap@{k}={out['overlap_at_k']}")
+    return out
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Two-stage (prefix -> full rerank) latency/recall sweep")
+    p.add_argument("--source", choices=("synth", "db"), default="synth")
+    p.add_argument("--docs", type=int, default=10000)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--prefixes", default="64,128,256,512,768")
+    p.add_argument("--candidates", default="100,200,400")
+    p.add_argument("--top-k", type=int, default=10, dest="top_k")
+    p.add_argument("--sql", action="store_true", help="Also compare run_search() with SEARCH_TWO_STAGE off/on")
+    p.add_argument("--sql-queries", type=int, default=100, dest="sql_queries")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    load = synth_vectors if args.source == "synth" else db_vectors
+    D, Q, excl, sources = load(args.docs, args.queries, args.seed)
+    D, Q = np.ascontiguousarray(D, dtype=np.float32), np.ascontiguousarray(Q, dtype=np.float32)
+    print(f"vectors={len(D)} ({args.source}) queries={len(Q)} top_k={args.top_k}")
+    results: Dict[str, Any] = sweep(D, Q, excl, sources, [int(x) for x in args.prefixes.split(",")],
+                                    [int(x) for x in args.candidates.split(",")], args.top_k)
+    print(f"full scan {results['full_scan_ms_per_query']} ms/q"
+          + (f" hit@{args.top_k}={results[f'full_scan_hit_at_{args.top_k}']}" if sources else ""))
+    if args.sql:
+        results["sql"] = sql_compare(args.sql_queries, args.top_k, args.seed)
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    out = Path(args.out or os.path.join("tools", "out", f"bench_prefix_search_{ts}.json"))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"tool": "bench_prefix_search", "args": vars(args), "results": results}, indent=2),
+                   encoding="utf-8")
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+# tools/bench_product_filter.py
+"""
+Benchmark product-scoped /search against many products of uneven size.
+
+Seeds N synthetic products whose chunk counts follow a Zipf-like curve (one huge
+catalog, a long tail of tiny ones), builds the per-product partial HNSW indexes
+(same names/operator class as scripts/create_product_vector_indexes.py) for the
+seeded products with >= --index-min-rows chunks, then runs the in-process
+run_search() with and without product_id and reports latency + buffers read.
+
+The plan is checked, not just timed: for every filtered run, EXPLAIN of the
+/search query must use that product's partial index (or, for products below
+--index-min-rows, must not seq-scan chunk_embeddings). Any miss exits with 1.
+
+Usage (from backend/):
+    python -m tools.bench_product_filter --products 40 --total-chunks 20000
+    python -m tools.bench_product_filter --keep      # leave the data for EXPLAIN poking
+
+Run scripts/add_product_id_columns.py first.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from app.embedding_store import VECTOR_METRIC  # noqa: E402
+from app.embeddings import EMBED_DIM  # noqa: E402
+from app.routers.documents import get_conn  # noqa: E402
+from app.routers.search import SearchIn, run_search, search_explain  # noqa: E402
+
+WORDS = (
+    "propeller battery gimbal firmware calibration motor sensor compass "
+    "controller antenna warranty inspection landing gear charger hub arm "
+    "frame camera lens storage cable vibration torque screw"
+).split()
+
+
+def _zipf_sizes(n_products: int, total: int, s: float) -> list:
+    weights = [1.0 / (rank ** s) for rank in range(1, n_products + 1)]
+    wsum = sum(weights)
+    return [max(1, int(total * w / wsum)) for w in weights]
+
+
+def _rand_unit_vec(rng: random.Random) -> str:
+    v = [rng.random() * 2.0 - 1.0 for _ in range(EMBED_DIM)]
+    norm = math.sqrt(sum(x * x for x in v)) or 1.0
+    return "[" + ",".join(f"{x / norm:.6f}" for x in v) + "]"
+
+
+def seed(conn, tag: str, sizes: list, rng: random.Random) -> list:
+    """Insert products/documents/chunks/embeddings; returns [(product_id, n_chunks)]."""
+    out = []
+    with conn.cursor() as cur:
+        for i, n in enumerate(sizes):
+            cur.execute(
+                "INSERT INTO products (brand, model) VALUES (%s, %s) RETURNING id",
+                (f"bench-{tag}", f"p{i:04d}"),
+            )
+            pid = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO documents (product_id, title, source_url, type, uploaded_at)
+                VALUES (%s, %s, %s, 'pdf', NOW()) RETURNING id
+                """,
+                (pid, f"bench manual {i}", f"bench://{tag}/{i}"),
+            )
+            doc_id = cur.fetchone()[0]
+
+            with cur.copy(
+                "COPY document_chunks (document_id, product_id, section_path, level, "
+                "start_page, end_page, chunk_index, content) FROM STDIN"
+            ) as cp:
+                for ci in range(n):
+                    text = " ".join(rng.choice(WORDS) for _ in range(40))
+                    cp.write_row((doc_id, pid, f"Section {ci // 4}", 1, 1, 1, ci % 4, text))
+
+            cur.execute("SELECT id FROM document_chunks WHERE document_id = %s", (doc_id,))
+            chunk_ids = [r[0] for r in cur.fetchall()]
+            with cur.copy("COPY chunk_embeddings (chunk_id, embedding, model, product_id) FROM STDIN") as cp:
+                for cid in chunk_ids:
+                    cp.write_row((cid, _rand_unit_vec(rng), "bench-random", pid))
+            conn.commit()
+            out.append((pid, n))
+            print(f"seeded product_id={pid} chunks={n}")
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE chunk_embeddings")
+        cur.execute("ANALYZE document_chunks")
+    conn.commit()
+    return out
+
+
+def build_partial_indexes(conn, seeded: list, min_rows: int) -> dict:
+    """{product_id: index name} for the seeded products big enough to get one."""
+    ops = "vector_ip_ops" if VECTOR_METRIC == "ip" else "vector_l2_ops"
+    prefix = "idx_chunk_embeddings_hnsw_ip" if VECTOR_METRIC == "ip" else "idx_chunk_embeddings_hnsw"
+    names = {}
+    with conn.cursor() as cur:
+        for pid, n in seeded:
+            if n < min_rows:
+                continue
+            names[pid] = f"{prefix}_p{int(pid)}"
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {names[pid]} ON chunk_embeddings "
+                        f"USING hnsw (embedding {ops}) WHERE product_id = {int(pid)}")
+            conn.commit()
+            print(f"built {names[pid]} rows={n}")
+        cur.execute("ANALYZE chunk_embeddings")
+    conn.commit()
+    return names
+
+
+def cleanup(conn, tag: str, indexes: dict) -> None:
+    with conn.cursor() as cur:
+        for name in indexes.values():
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+        cur.execute(
+            """
+            DELETE FROM chunk_embeddings WHERE chunk_id IN (
+              SELECT c.id FROM document_chunks c
+              JOIN documents d ON d.id = c.document_id
+              JOIN products p  ON p.id = d.product_id
+              WHERE p.brand = %s)
+            """,
+            (f"bench-{tag}",),
+        )
+        cur.execute("DELETE FROM products WHERE brand = %s", (f"bench-{tag}",))
+    conn.commit()
+
+
+def _pct(samples: list, q: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def measure(label: str, product_id, queries: int, top_k: int, index: str = None) -> dict:
+    lat = []
+    for qi in range(queries):
+        payload = SearchIn(text=f"{WORDS[qi % len(WORDS)]} check", top_k=top_k, product_id=product_id)
+        t0 = time.perf_counter()
+        run_search(payload)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+
+    ex = search_explain(SearchIn(text="battery check", top_k=top_k, product_id=product_id))
+    summary = ex["summary"]
+    row = {
+        "label": label,
+        "product_id": product_id,
+        "p50_ms": round(statistics.median(lat), 2),
+        "p95_ms": round(_pct(lat, 0.95), 2),
+        "candidates": ex["candidates"]["before_diversity"],
+        "shared_hit_blocks": summary["shared_hit_blocks"],
+        "shared_read_blocks": summary["shared_read_blocks"],
+        "indexes": summary["indexes"],
+        "seq_scans": summary["seq_scans"],
+    }
+    if product_id is not None:
+        # the product's own graph, or at least no full scan of every product's vectors
+        row["plan_ok"] = (index in summary["indexes"]) if index else ("chunk_embeddings" not in summary["seq_scans"])
+    print(json.dumps(row))
+    return row
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark product-filtered search on uneven products")
+    p.add_argument("--products", type=int, default=40)
+    p.add_argument("--total-chunks", type=int, default=20000, dest="total_chunks")
+    p.add_argument("--zipf", type=float, default=1.1, help="Size skew exponent")
+    p.add_argument("--queries", type=int, default=20)
+    p.add_argument("--top-k", type=int, default=5, dest="top_k")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--index-min-rows", type=int, default=1000, dest="index_min_rows",
+                   help="Build a partial HNSW index for seeded products at least this big")
+    p.add_argument("--keep", action="store_true", help="Do not delete the seeded rows (and indexes)")
+    p.add_argument("--out", default=os.path.join("tools", "out", "bench_product_filter.json"))
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    tag = time.strftime("%Y%m%d%H%M%S")
+    sizes = _zipf_sizes(args.products, args.total_chunks, args.zipf)
+
+    indexes: dict = {}
+    with get_conn() as conn:
+        seeded = seed(conn, tag, sizes, rng)
+        try:
+            indexes = build_partial_indexes(conn, seeded, args.index_min_rows)
+            by_size = sorted(seeded, key=lambda t: t[1])
+            picks = [
+                ("smallest", by_size[0]),
+                ("median", by_size[len(by_size) // 2]),
+                ("largest", by_size[-1]),
+            ]
+            results = [measure("unfiltered", None, args.queries, args.top_k)]
+            for label, (pid, n) in picks:
+                r = measure(f"{label} ({n} chunks)", pid, args.queries, args.top_k, indexes.get(pid))
+                results.append(r)
+        finally:
+            if not args.keep:
+                cleanup(conn, tag, indexes)
+
+    os.makedirs(os.path.dirname(args.out), exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "sizes": sizes, "results": results}, f, indent=2)
+    print(f"Wrote {args.out}")
+    bad = [r["label"] for r in results if r.get("plan_ok") is False]
+    if bad:
+        print(f"FAIL: product-scoped plan did not use the product's index for: {', '.join(bad)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
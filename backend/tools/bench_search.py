@@ -0,0 +1,194 @@
+# tools/bench_search.py
+"""
+Drive POST /search under controlled concurrency and report QPS, latency
+percentiles and recall against a synthetic corpus (tools/synth_corpus.py).
+
+Queries are sampled deterministically from the corpus' own chunks; with the
+FakeEmbedder only the identical text maps to the identical vector, so
+recall@k = share of queries whose source chunk comes back in the top_k.
+
+Usage (from backend/, API running on --base-url):
+    python -m tools.synth_corpus --chunks 10000 --tag s10k
+    python -m tools.bench_search --tag s10k --concurrency 1,4,16 --requests 400
+    python -m tools.bench_search --tag s10k --compare tools/out/bench_search_<ts>.json
+
+Results are written to tools/out/bench_search_<tag>_<ts>.json.
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in [0, 100])."""
+    if not samples:
+        return None
+    s = sorted(samples)
+    k = max(0, min(len(s) - 1, math.ceil(q / 100.0 * len(s)) - 1))
+    return s[k]
+
+
+def sample_queries(tag: str, n: int) -> List[Tuple[int, str, int]]:
+    """[(chunk_id, text, product_id)] picked by md5 order so every run gets the same set."""
+    from app.routers.documents import get_conn
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.id, c.content, d.product_id
+            FROM document_chunks c
+            JOIN documents d ON d.id = c.document_id
+            JOIN products p  ON p.id = d.product_id
+            WHERE p.brand = %s
+            ORDER BY md5(c.id::text)
+            LIMIT %s
+            """,
+            (f"synth-{tag}", n),
+        )
+        return [(int(r[0]), r[1], int(r[2])) for r in cur.fetchall()]
+
+
+def run_level(base_url: str, queries: List[Tuple[int, str, int]], concurrency: int, requests: int,
+              top_k: int, product_scoped: bool, timeout: float) -> Dict:
+    url = f"{base_url.rstrip('/')}/search"
+    lat_ms: List[float] = []
+    hits = 0
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def worker() -> None:
+        nonlocal hits, errors
+        with httpx.Client(timeout=timeout) as client:
+            while True:
+                with counter_lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                chunk_id, text, product_id = queries[i % len(queries)]
+                payload = {"text": text, "top_k": top_k, "highlight_terms": False,
+                           "exclude_section_exact": [], "min_chars": 0}
+                if product_scoped:
+                    payload["product_id"] = product_id
+                t0 = time.perf_counter()
+                try:
+                    r = client.post(url, json=payload)
+                    ok = r.status_code == 200
+                    found = ok and any(row.get("chunk_id") == chunk_id for row in r.json().get("results", []))
+                except httpx.HTTPError:
+                    ok, found = False, False
+                dt = (time.perf_counter() - t0) * 1000.0
+                with lock:
+                    if ok:
+                        lat_ms.append(dt)
+                        hits += int(found)
+                    else:
+                        errors += 1
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        for f in [ex.submit(worker) for _ in range(concurrency)]:
+            f.result()
+    wall = time.perf_counter() - t_start
+
+    ok_n = len(lat_ms)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": ok_n,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "qps": round(ok_n / wall, 2) if wall > 0 else None,
+        "p50_ms": round(percentile(lat_ms, 50), 2) if ok_n else None,
+        "p95_ms": round(percentile(lat_ms, 95), 2) if ok_n else None,
+        "p99_ms": round(percentile(lat_ms, 99), 2) if ok_n else None,
+        "mean_ms": round(statistics.fmean(lat_ms), 2) if ok_n else None,
+        "recall_at_k": round(hits / ok_n, 4) if ok_n else None,
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict, previous_path: str) -> None:
+    prev = json.loads(Path(previous_path).read_text(encoding="utf-8"))
+    prev_by_c = {r["concurrency"]: r for r in prev.get("levels", [])}
+    print(f"\n=== vs {previous_path} ===")
+    for r in current["levels"]:
+        p = prev_by_c.get(r["concurrency"])
+        if not p:
+            continue
+        parts = []
+        for key in ("qps", "p50_ms", "p95_ms", "p99_ms", "recall_at_k"):
+            a, b = p.get(key), r.get(key)
+            if a and b is not None:
+                parts.append(f"{key} {a} -> {b} ({(b - a) / a * 100:+.1f}%)")
+        print(f"c={r['concurrency']}: " + ", ".join(parts))
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Benchmark POST /search (QPS, p50/p95/p99, recall)")
+    p.add_argument("--tag", required=True, help="Synthetic corpus tag (see tools.synth_corpus)")
+    p.add_argument("--base-url", default=os.getenv("APP_API_BASE", "http://127.0.0.1:8000"))
+    p.add_argument("--concurrency", default="1,4,16", help="Comma list of client concurrency levels")
+    p.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    p.add_argument("--queries", type=int, default=200, help="Distinct queries sampled from the corpus")
+    p.add_argument("--top-k", type=int, default=5, dest="top_k")
+    p.add_argument("--product-scoped", action="store_true", help="Send product_id with each query")
+    p.add_argument("--warmup", type=int, default=10)
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--out", default=None)
+    p.add_argument("--compare", default=None, help="Previous result JSON to diff against")
+    args = p.parse_args()
+
+    queries = sample_queries(args.tag, args.queries)
+    if not queries:
+        print(f"No chunks for corpus tag {args.tag!r}. Load it with tools.synth_corpus first.")
+        return 1
+
+    if args.warmup:
+        run_level(args.base_url, queries, 1, args.warmup, args.top_k, args.product_scoped, args.timeout)
+
+    levels = []
+    for c in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+        r = run_level(args.base_url, queries, c, args.requests, args.top_k, args.product_scoped, args.timeout)
+        print(json.dumps(r))
+        levels.append(r)
+
+    result = {
+        "tool": "bench_search",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_rev": _git_rev(),
+        "args": vars(args),
+        "levels": levels,
+    }
+    out = args.out or os.path.join("tools", "out", f"bench_search_{args.tag}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    Path(out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"Wrote {out}")
+
+    if args.compare:
+        compare(result, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,115 @@
+# tools/bench_toc.py
+"""
+Benchmark TOC range/path building: legacy nested scan vs app.toc_utils single pass.
+
+Shapes (n = --entries):
+  wide       3 levels, large fan-out (parts catalogs: chapter -> thousands of items);
+             legacy is ~linear here, expect parity
+  deep       staircases 1..D repeated (every entry scans its whole staircase)
+  worst      strictly increasing levels (legacy scan is n^2 / 2)
+
+Both implementations must produce identical ranges + paths; the tool asserts it.
+
+Usage (from backend/):
+    python -m tools.bench_toc --entries 20000
+    python -m tools.bench_toc --entries 5000 --shapes worst --depth 200
+"""
+import argparse
+import json
+import time
+from typing import List, Tuple
+
+from app.toc_utils import compute_toc_ranges
+
+Entry = Tuple[int, str, int, int]
+
+
+def legacy_ranges(entries: List[Entry], page_count: int):
+    """Verbatim copy of the original /chunk-toc steps 3 + 4 (kept for comparison)."""
+    ranges = []
+    for idx, (lvl, title, start, oi) in enumerate(entries):
+        end = page_count
+        for j in range(idx + 1, len(entries)):
+            nlvl, _, nstart, _ = entries[j]
+            if nlvl <= lvl:
+                end = max(nstart - 1, start)
+                break
+        ranges.append((lvl, title, start, end, oi))
+    paths: List[str] = []
+    stack: List[str] = []
+    for lvl, title, _, _, _ in ranges:
+        if len(stack) < lvl:
+            stack += [""] * (lvl - len(stack))
+        stack = stack[:lvl]
+        stack[lvl - 1] = title
+        paths.append(" > ".join(s for s in stack if s))
+    return [r + (p,) for r, p in zip(ranges, paths)]
+
+
+def make_toc(shape: str, n: int, depth: int) -> Tuple[List[Entry], int]:
+    entries: List[Entry] = []
+    if shape == "wide":
+        chapters = max(1, n // 2000)
+        per = max(1, n // chapters)
+        page = 1
+        for c in range(chapters):
+            entries.append((1, f"Chapter {c}", page, len(entries) + 1))
+            for i in range(per - 1):
+                lvl = 2 if i % 50 == 0 else 3
+                entries.append((lvl, f"Item {c}.{i}", page, len(entries) + 1))
+                page += 1 if i % 3 == 0 else 0
+    elif shape == "deep":
+        page = 1
+        while len(entries) < n:
+            for lvl in range(1, depth + 1):
+                entries.append((lvl, f"L{lvl}-{len(entries)}", page, len(entries) + 1))
+                page += 1
+                if len(entries) >= n:
+                    break
+    elif shape == "worst":
+        for i in range(n):
+            lvl = min(i + 1, depth) if depth else i + 1
+            entries.append((lvl, f"E{i}", i + 1, i + 1))
+    else:
+        raise ValueError(shape)
+    page_count = max(e[2] for e in entries) + 5
+    return entries, page_count
+
+
+def best_of(repeat: int, fn, *args):
+    best = None
+    out = None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        ms = (time.perf_counter() - t0) * 1000.0
+        best = ms if best is None else min(best, ms)
+    return out, best
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Legacy vs single-pass TOC range building")
+    p.add_argument("--entries", type=int, default=20000)
+    p.add_argument("--depth", type=int, default=64, help="Depth for deep/worst shapes (0 = unbounded for worst)")
+    p.add_argument("--shapes", default="wide,deep,worst")
+    p.add_argument("--repeat", type=int, default=3, help="Report the best of N runs")
+    p.add_argument("--skip-legacy-over", type=int, default=50000, dest="skip_legacy_over",
+                   help="Skip the legacy run when n exceeds this (it is quadratic)")
+    args = p.parse_args()
+
+    for shape in [s.strip() for s in args.shapes.split(",") if s.strip()]:
+        entries, page_count = make_toc(shape, args.entries, args.depth)
+
+        new, new_ms = best_of(args.repeat, compute_toc_ranges, entries, page_count)
+
+        row = {"shape": shape, "entries": len(entries), "single_pass_ms": round(new_ms, 2)}
+        if len(entries) <= args.skip_legacy_over:
+            old, old_ms = best_of(args.repeat, legacy_ranges, entries, page_count)
+            assert [tuple(r) for r in new] == old, f"{shape}: outputs differ"
+            row.update({"legacy_ms": round(old_ms, 2), "speedup": round(old_ms / new_ms, 1) if new_ms else None})
+        print(json.dumps(row))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,39 @@
+# tools/embed_backfill.py
+"""
+Embed every chunk that has no embedding (or one from another model) across all
+documents. See app/embed_backfill.py for the pipeline + checkpoint semantics.
+
+Usage (from backend/):
+    python -m tools.embed_backfill --concurrency 8 --batch-size 64
+    python -m tools.embed_backfill --resume                       # after a crash
+    python -m tools.embed_backfill --max-chunks 5000 --concurrency 1   # compare chunks_per_s vs 8
+"""
+import argparse
+import json
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from app.embed_backfill import run_backfill  # noqa: E402
+from app.routers.documents import get_conn  # noqa: E402
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Corpus-wide embedding backfill")
+    p.add_argument("--batch-size", type=int, default=64, dest="batch_size")
+    p.add_argument("--concurrency", type=int, default=4, help="Batches embedded in parallel")
+    p.add_argument("--max-chunks", type=int, default=None, dest="max_chunks")
+    p.add_argument("--checkpoint", default="tools/out/embed_backfill.checkpoint.json")
+    p.add_argument("--resume", action="store_true", help="Continue from the checkpoint watermark")
+    args = p.parse_args()
+
+    stats = run_backfill(get_conn, batch_size=args.batch_size, concurrency=args.concurrency,
+                         checkpoint=Path(args.checkpoint), resume=args.resume, max_chunks=args.max_chunks)
+    print(json.dumps({"concurrency": args.concurrency, **stats}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
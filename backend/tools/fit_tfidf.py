@@ -0,0 +1,61 @@
+# tools/fit_tfidf.py
+"""
+Fit the offline TF-IDF embedder (app/embedder_tfidf.py) from document_chunks and
+write the model used by EMB_PROVIDER=tfidf.
+
+Re-fitting changes the model name (tfidf-1536-<hash>), so existing tfidf rows in
+chunk_embeddings count as stale for tools.embed_backfill.
+
+Usage (from backend/):
+    python -m tools.fit_tfidf
+    python -m tools.fit_tfidf --n-features 1048576 --char-ngrams 0 --out storage/tfidf/words_only.npz
+    EMB_PROVIDER=tfidf python -m tools.embed_backfill
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from app.embedder_tfidf import DEFAULT_MODEL_PATH, TfidfConfig, fit_from_db  # noqa: E402
+from app.routers.documents import get_conn  # noqa: E402
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Fit the hashed TF-IDF embedder from document_chunks")
+    p.add_argument("--out", default=os.getenv("TFIDF_MODEL_PATH", DEFAULT_MODEL_PATH))
+    p.add_argument("--n-features", type=int, default=2 ** 18, dest="n_features", help="Hash buckets (power of 2)")
+    p.add_argument("--char-ngrams", type=int, default=3, dest="char_ngrams", help="0 disables char n-grams")
+    p.add_argument("--no-bigrams", action="store_true", dest="no_bigrams")
+    p.add_argument("--nnz", type=int, default=4, help="Output dims per bucket in the projection")
+    p.add_argument("--seed", type=int, default=1536)
+    p.add_argument("--batch-size", type=int, default=2000, dest="batch_size")
+    p.add_argument("--limit", type=int, default=None, help="Fit on the first N chunks only")
+    args = p.parse_args()
+
+    cfg = TfidfConfig(n_features=args.n_features, char_ngrams=args.char_ngrams,
+                      bigrams=not args.no_bigrams, nnz=args.nnz, seed=args.seed)
+    t0 = time.perf_counter()
+    with get_conn() as conn:
+        model = fit_from_db(conn, cfg, batch_size=args.batch_size, limit=args.limit)
+    if model.n_docs == 0:
+        print("document_chunks is empty; nothing to fit")
+        return 1
+    model.save(args.out)
+    print(json.dumps({
+        "model": model.name,
+        "path": args.out,
+        "chunks": model.n_docs,
+        "buckets_used": int((model.idf < model.idf.max()).sum()),
+        "fit_s": round(time.perf_counter() - t0, 2),
+        **cfg.to_dict(),
+    }))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
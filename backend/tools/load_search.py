@@ -0,0 +1,181 @@
+# tools/load_search.py
+"""
+Open-loop load test for POST /search admission control.
+
+Requests arrive at a fixed --rate for --duration seconds whether or not earlier ones
+have finished (a closed loop would slow down with the server and hide the queueing).
+Each response is classified as
+
+  ok        200, full semantic answer
+  cache     200, degraded: last good answer for the same payload (shed under load)
+  lexical   200, degraded: full-text fallback (statement_timeout hit)
+  503       shed, must carry Retry-After
+  timeout   client gave up after --client-timeout (server cancels the query)
+  error     anything else
+
+and the tool prints count + p50/p95/p99 latency per class, plus the peak
+active/waiting seen on GET /search/_admission while the test runs.
+
+--hot 0.5 sends half the requests from a set of --hot-queries repeated payloads, so
+the degraded cache has something to serve.
+
+Demo (from backend/), comparing a tight limit with an effectively unbounded one:
+    SEARCH_MAX_CONCURRENT=4 SEARCH_MAX_QUEUE=8 uvicorn app.main:app --port 8000
+    python -m tools.load_search --rate 200 --duration 20
+    SEARCH_MAX_CONCURRENT=100000 SEARCH_MAX_QUEUE=100000 uvicorn app.main:app --port 8000
+    python -m tools.load_search --rate 200 --duration 20 --compare tools/out/load_search_<ts>.json
+
+Results are written to tools/out/load_search_<ts>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from tools.bench_ingest import WORDS  # noqa: E402
+from tools.bench_search import percentile  # noqa: E402
+
+CLASSES = ("ok", "cache", "lexical", "503", "timeout", "error")
+
+
+def make_queries(n: int, rng: random.Random) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) for _ in range(n)]
+
+
+def classify(r: httpx.Response) -> str:
+    if r.status_code == 503:
+        return "503" if r.headers.get("Retry-After") else "error"
+    if r.status_code != 200:
+        return "error"
+    degraded = r.json().get("degraded")
+    if not degraded:
+        return "ok"
+    return "cache" if degraded.get("source") == "cache" else "lexical"
+
+
+async def _one(client: httpx.AsyncClient, url: str, text: str, top_k: int, samples: Dict[str, List[float]]) -> None:
+    t0 = time.perf_counter()
+    try:
+        r = await client.post(url, json={"text": text, "top_k": top_k})
+        cls = classify(r)
+    except httpx.TimeoutException:
+        cls = "timeout"
+    except httpx.HTTPError:
+        cls = "error"
+    samples[cls].append((time.perf_counter() - t0) * 1000.0)
+
+
+async def _watch_admission(client: httpx.AsyncClient, url: str, peak: Dict[str, int], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            lim = (await client.get(url)).json().get("limiter", {})
+            peak["active"] = max(peak["active"], int(lim.get("active", 0)))
+            peak["waiting"] = max(peak["waiting"], int(lim.get("waiting", 0)))
+        except (httpx.HTTPError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    hot = make_queries(args.hot_queries, rng)
+    base = args.base_url.rstrip("/")
+    samples: Dict[str, List[float]] = {c: [] for c in CLASSES}
+    peak = {"active": 0, "waiting": 0}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+
+    async with httpx.AsyncClient(timeout=args.client_timeout, limits=limits) as client, \
+            httpx.AsyncClient(timeout=2.0) as probe:
+        # warm the cache with the hot set before the spike
+        for text in hot:
+            await _one(client, f"{base}/search", text, args.top_k, {c: [] for c in CLASSES})
+
+        stop = asyncio.Event()
+        watcher = asyncio.ensure_future(_watch_admission(probe, f"{base}/search/_admission", peak, stop))
+        tasks = []
+        interval = 1.0 / args.rate
+        t_start = time.perf_counter()
+        n = int(args.rate * args.duration)
+        for i in range(n):
+            delay = t_start + i * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = rng.choice(hot) if hot and rng.random() < args.hot else " ".join(make_queries(1, rng))
+            tasks.append(asyncio.ensure_future(_one(client, f"{base}/search", text, args.top_k, samples)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - t_start
+        stop.set()
+        await watcher
+
+    classes = {}
+    for c in CLASSES:
+        s = samples[c]
+        classes[c] = {
+            "n": len(s),
+            "p50_ms": round(percentile(s, 50), 1) if s else None,
+            "p95_ms": round(percentile(s, 95), 1) if s else None,
+            "p99_ms": round(percentile(s, 99), 1) if s else None,
+        }
+    answered = sum(classes[c]["n"] for c in ("ok", "cache", "lexical"))
+    return {
+        "requests": n,
+        "wall_s": round(wall, 2),
+        "offered_rps": args.rate,
+        "answered_rps": round(answered / wall, 1) if wall > 0 else None,
+        "classes": classes,
+        "peak_active": peak["active"],
+        "peak_waiting": peak["waiting"],
+    }
+
+
+def print_summary(res: Dict[str, Any], label: str = "") -> None:
+    print(f"{label}requests={res['requests']} wall={res['wall_s']}s offered={res['offered_rps']}/s "
+          f"answered={res['answered_rps']}/s peak active={res['peak_active']} waiting={res['peak_waiting']}")
+    for c, v in res["classes"].items():
+        if v["n"]:
+            print(f"  {c:8s} n={v['n']:6d}  p50={v['p50_ms']}ms  p95={v['p95_ms']}ms  p99={v['p99_ms']}ms")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Open-loop load test for /search admission control")
+    p.add_argument("--base-url", default=os.getenv("APP_API_BASE", "http://127.0.0.1:8000"))
+    p.add_argument("--rate", type=float, default=100.0, help="Requests per second (open loop)")
+    p.add_argument("--duration", type=float, default=10.0, help="Seconds of load")
+    p.add_argument("--top-k", type=int, default=5, dest="top_k")
+    p.add_argument("--hot", type=float, default=0.5, help="Share of requests drawn from the hot set")
+    p.add_argument("--hot-queries", type=int, default=20, dest="hot_queries")
+    p.add_argument("--client-timeout", type=float, default=10.0, dest="client_timeout")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default=None)
+    p.add_argument("--compare", default=None, help="Previous result JSON to print next to this one")
+    args = p.parse_args()
+
+    res = asyncio.run(run(args))
+    print_summary(res)
+    prev: Optional[Dict[str, Any]] = None
+    if args.compare:
+        prev = json.loads(Path(args.compare).read_text(encoding="utf-8"))["result"]
+        print_summary(prev, label=f"[{args.compare}] ")
+
+    ts = time.strftime("%Y%m%d_%H%M%S")
+    out = Path(args.out or os.path.join("tools", "out", f"load_search_{ts}.json"))
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"tool": "load_search", "args": vars(args), "result": res}, indent=2), encoding="utf-8")
+    print(f"Wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
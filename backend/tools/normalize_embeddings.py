@@ -0,0 +1,59 @@
+# tools/normalize_embeddings.py
+"""
+Validation pass for VECTOR_METRIC=ip: find chunk_embeddings rows whose norm is
+not 1 (written before the switch, or by a provider that does not normalise)
+and rewrite them at unit length, one UPDATE + commit per batch.
+
+Zero vectors cannot be normalised; they are counted and left alone.
+Run it after setting VECTOR_METRIC=ip and before relying on <#> ranking. It is
+safe to re-run: a clean table is a single read pass.
+
+Usage (from backend/):
+    python -m tools.normalize_embeddings --dry-run
+    python -m tools.normalize_embeddings --batch-size 1000 --tolerance 1e-5
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from app.embedding_store import NORM_TOLERANCE, find_unnormalized, renormalize  # noqa: E402
+from app.routers.documents import get_conn  # noqa: E402
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Find and fix non-unit vectors in chunk_embeddings")
+    p.add_argument("--batch-size", type=int, default=500, dest="batch_size")
+    p.add_argument("--tolerance", type=float, default=NORM_TOLERANCE, help="Allowed |norm - 1|")
+    p.add_argument("--dry-run", action="store_true", dest="dry_run", help="Report only")
+    args = p.parse_args()
+
+    t0 = time.perf_counter()
+    stats = {"found": 0, "fixed": 0, "zero": 0, "min_norm": None, "max_norm": None}
+    last_id = 0
+    with get_conn() as conn:
+        while True:
+            rows = find_unnormalized(conn, last_id, args.batch_size, args.tolerance)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            norms = [norm for _, norm, _ in rows]
+            stats["found"] += len(rows)
+            stats["zero"] += sum(1 for n in norms if n == 0.0)
+            stats["min_norm"] = min([n for n in (stats["min_norm"],) if n is not None] + norms)
+            stats["max_norm"] = max([n for n in (stats["max_norm"],) if n is not None] + norms)
+            if not args.dry_run:
+                stats["fixed"] += renormalize(conn, rows)
+                conn.commit()
+            print(f"checked up to chunk_id={last_id} found={stats['found']} fixed={stats['fixed']}", flush=True)
+    print(json.dumps({**stats, "dry_run": args.dry_run, "tolerance": args.tolerance,
+                      "elapsed_s": round(time.perf_counter() - t0, 2)}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
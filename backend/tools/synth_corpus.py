@@ -0,0 +1,218 @@
+# tools/synth_corpus.py
+"""
+Deterministic synthetic manuals for benchmarks.
+
+Generates products -> documents (manuals) -> TOC (3 levels) -> pages -> chunks,
+embeds chunks with the deterministic FakeEmbedder and bulk-loads everything
+into the DATABASE_URL Postgres (pgvector) with COPY. The same --seed always
+produces the same text, TOC and vectors, so runs are comparable.
+
+Every row hangs off products with brand = 'synth-<tag>', so a corpus can be
+dropped again with --drop <tag>.
+
+Usage (from backend/):
+    python -m tools.synth_corpus --chunks 1000 --tag s1k
+    python -m tools.synth_corpus --chunks 100000 --tag s100k --workers 8
+    python -m tools.synth_corpus --drop s1k
+"""
+import argparse
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+PARTS = (
+    "propeller battery gimbal motor compass IMU antenna landing-gear charger "
+    "controller arm frame camera lens vision-sensor ESC firmware hub cable fan"
+).split()
+VERBS = "inspect replace tighten calibrate clean update check charge remove install".split()
+ADJ = "loose damaged worn bent cracked swollen dirty outdated misaligned overheated".split()
+CHAPTERS = (
+    "Safety Overview;Product Profile;Preparation;Flight Operations;Camera and Gimbal;"
+    "Intelligent Battery;Remote Controller;Maintenance;Troubleshooting;Specifications;"
+    "After-sales Service;Appendix"
+).split(";")
+
+
+@dataclass
+class SynthManual:
+    title: str
+    toc: List[Tuple[int, str, int]] = field(default_factory=list)   # (level, title, page)
+    pages: List[str] = field(default_factory=list)                  # index 0 -> page 1
+    # (section_path, level, start_page, end_page, chunk_index, content)
+    chunks: List[Tuple[str, int, int, int, int, str]] = field(default_factory=list)
+
+
+def _sentence(rng: random.Random) -> str:
+    part = rng.choice(PARTS)
+    return (
+        f"{rng.choice(VERBS).capitalize()} the {part} if it is {rng.choice(ADJ)}; "
+        f"{rng.choice(VERBS)} the {rng.choice(PARTS)} before each flight and record the {part} status."
+    )
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(2, 4)))
+
+
+def generate_manual(rng: random.Random, idx: int, sections_per_chapter: int = 4,
+                    subsections: int = 3, max_chars: int = 1200) -> SynthManual:
+    """One manual: 12 chapters x N sections x M subsections, 1-2 pages per leaf."""
+    from app.chunking import split_by_paragraphs  # same splitter as /chunk-toc
+
+    m = SynthManual(title=f"Synthetic Manual {idx:05d}")
+    for ch in CHAPTERS:
+        m.toc.append((1, ch, len(m.pages) + 1))
+        for s in range(1, sections_per_chapter + 1):
+            sec = f"{ch} {s}"
+            m.toc.append((2, sec, len(m.pages) + 1))
+            for ss in range(1, subsections + 1):
+                sub = f"{rng.choice(PARTS).title()} {rng.choice(VERBS)} {s}.{ss}"
+                start = len(m.pages) + 1
+                m.toc.append((3, sub, start))
+                for _ in range(rng.randint(1, 2)):
+                    m.pages.append("\n\n".join(_paragraph(rng) for _ in range(rng.randint(3, 5))))
+                end = len(m.pages)
+                text = "\n\n".join(m.pages[start - 1:end])
+                path = f"{ch} > {sec} > {sub}"
+                for ci, piece in enumerate(split_by_paragraphs(text, max_chars=max_chars)):
+                    m.chunks.append((path, 3, start, end, ci, piece))
+    return m
+
+
+def iter_manuals(seed: int, target_chunks: int) -> Iterator[SynthManual]:
+    rng = random.Random(seed)
+    total = 0
+    i = 0
+    while total < target_chunks:
+        m = generate_manual(rng, i)
+        total += len(m.chunks)
+        i += 1
+        yield m
+
+
+def _embed_batch(texts: List[str]) -> List[str]:
+    from app.embeddings import FakeEmbedder
+    vecs = FakeEmbedder().embed_texts(texts)
+    return ["[" + ",".join(repr(x) for x in v) + "]" for v in vecs]
+
+
+def load(tag: str, seed: int, target_chunks: int, manuals_per_product: int, workers: int,
+         embed_batch: int = 64) -> dict:
+    from app.routers.documents import get_conn
+
+    t0 = time.perf_counter()
+    stats = {"tag": tag, "seed": seed, "products": 0, "documents": 0, "pages": 0, "chunks": 0}
+    pool = Pool(processes=workers) if workers > 1 else None
+    try:
+        with get_conn() as conn, conn.cursor() as cur:
+            product_id = None
+            for mi, m in enumerate(iter_manuals(seed, target_chunks)):
+                if mi % manuals_per_product == 0:
+                    cur.execute(
+                        "INSERT INTO products (brand, model) VALUES (%s, %s) RETURNING id",
+                        (f"synth-{tag}", f"model-{mi // manuals_per_product:05d}"),
+                    )
+                    product_id = cur.fetchone()[0]
+                    stats["products"] += 1
+
+                cur.execute(
+                    """
+                    INSERT INTO documents (product_id, title, source_url, type, uploaded_at)
+                    VALUES (%s, %s, %s, 'pdf', NOW()) RETURNING id
+                    """,
+                    (product_id, m.title, f"synth://{tag}/{mi}.pdf"),
+                )
+                doc_id = cur.fetchone()[0]
+
+                with cur.copy("COPY document_toc (document_id, level, title, page_from, order_index) FROM STDIN") as cp:
+                    for oi, (lvl, title, page) in enumerate(m.toc, start=1):
+                        cp.write_row((doc_id, lvl, title, page, oi))
+                with cur.copy("COPY document_pages (document_id, page_number, content) FROM STDIN") as cp:
+                    for pn, text in enumerate(m.pages, start=1):
+                        cp.write_row((doc_id, pn, text))
+                with cur.copy(
+                    "COPY document_chunks (document_id, product_id, section_path, level, start_page, "
+                    "end_page, chunk_index, content) FROM STDIN"
+                ) as cp:
+                    for (path, lvl, sp, ep, ci, content) in m.chunks:
+                        cp.write_row((doc_id, product_id, path, lvl, sp, ep, ci, content))
+
+                cur.execute(
+                    "SELECT id, content FROM document_chunks WHERE document_id = %s ORDER BY id",
+                    (doc_id,),
+                )
+                rows = cur.fetchall()
+                batches = [[r[1] for r in rows[i:i + embed_batch]] for i in range(0, len(rows), embed_batch)]
+                vec_batches = pool.map(_embed_batch, batches) if pool else [_embed_batch(b) for b in batches]
+                with cur.copy("COPY chunk_embeddings (chunk_id, embedding, model, product_id) FROM STDIN") as cp:
+                    flat = (v for b in vec_batches for v in b)
+                    for (cid, _), vec in zip(rows, flat):
+                        cp.write_row((cid, vec, "fake-1536", product_id))
+                conn.commit()
+
+                stats["documents"] += 1
+                stats["pages"] += len(m.pages)
+                stats["chunks"] += len(m.chunks)
+                print(f"[{tag}] doc={doc_id} chunks={stats['chunks']}/{target_chunks}", flush=True)
+
+            cur.execute("ANALYZE document_chunks")
+            cur.execute("ANALYZE chunk_embeddings")
+            conn.commit()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+
+def drop(tag: str) -> None:
+    from app.routers.documents import get_conn
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM chunk_embeddings WHERE chunk_id IN (
+              SELECT c.id FROM document_chunks c
+              JOIN documents d ON d.id = c.document_id
+              JOIN products p  ON p.id = d.product_id
+              WHERE p.brand = %s)
+            """,
+            (f"synth-{tag}",),
+        )
+        cur.execute("DELETE FROM products WHERE brand = %s", (f"synth-{tag}",))
+        conn.commit()
+    print(f"dropped synth-{tag}")
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Generate + load a deterministic synthetic manual corpus")
+    p.add_argument("--chunks", type=int, default=1000, help="Target chunk count (1000/10000/100000/1000000)")
+    p.add_argument("--tag", default=None, help="Corpus tag (default: s<chunks>)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--manuals-per-product", type=int, default=2, dest="manuals_per_product")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Embedding processes")
+    p.add_argument("--drop", metavar="TAG", help="Delete a previously loaded corpus and exit")
+    args = p.parse_args()
+
+    if args.drop:
+        drop(args.drop)
+        return 0
+
+    tag = args.tag or f"s{args.chunks}"
+    stats = load(tag, args.seed, args.chunks, args.manuals_per_product, args.workers)
+    print(stats)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())